@@ -12,6 +12,8 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import create_async_engine
 from pydantic import BaseModel
 
+from app.services.dashboard_cache import STOCK, invalidate as invalidate_dashboard
+
 log = logging.getLogger("uvicorn.error")
 API_PREFIX = "/api"
 
@@ -30,6 +32,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ---- DB /ready ----
@@ -79,17 +82,21 @@ safe_include("app.routers.admin_users")
 safe_include("app.routers.inventory")
 safe_include("app.routers.sessions")
 safe_include("app.routers.admin_sessions")
+safe_include("app.routers.admin_audit")
 
 # <<< เอา compat ขึ้นมาก่อน เพื่อให้ endpoint summary ที่ไม่ต้อง auth ชนะ
 safe_include("app.routers.stock_ui_compat")
 
 # ของเดิมที่อาจซ้ำ path
 safe_include("app.routers.dashboard")
+safe_include("app.routers.notifications")
 
 safe_include("app.routers.quotations")
+safe_include("app.routers.sales_quotations")
 safe_include("app.routers.purchases")
 safe_include("app.routers.quotation_pdf")
 safe_include("app.routers.quote_catalog")
+safe_include("app.routers.import_jobs")
 safe_include("app.routers.shim")
 safe_include("app.routers.shim_admin")
 safe_include("app.routers.debug")
@@ -424,6 +431,7 @@ async def stock_log_receive(body: LogRecvBody, user=Depends(_current_user_dep)):
     """)
     async with _engine.begin() as conn:
         await conn.execute(sql, body.dict())
+    invalidate_dashboard(STOCK)
     return {"ok": True}
 
 @app.post(f"{API_PREFIX}/stock/log-issue")
@@ -462,6 +470,7 @@ async def stock_log_issue(body: LogIssueBody, user=Depends(_current_user_dep)):
             "sku": body.sku, "wh": body.wh, "qty": body.qty,
             "unit_cost": unit_cost, "ref": body.ref, "note": body.note
         })
+    invalidate_dashboard(STOCK)
     return {"ok": True}
 
 # ===== Reports CSV: Balance / Valuation =====
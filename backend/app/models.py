@@ -107,7 +107,8 @@ class AuditLog(Base):
     subject_id: Mapped[Optional[uuid.UUID]] = mapped_column(PG_UUID(as_uuid=True), nullable=True)
     detail: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
     ip_addr: Mapped[Optional[str]] = mapped_column(INET, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    # partition key (รายเดือน) → เป็นส่วนหนึ่งของ PK
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
 
 
 # --- Products ---
@@ -0,0 +1,114 @@
+# backend/app/routers/admin_audit.py
+from __future__ import annotations
+
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import sqlalchemy as sa
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_session
+from ..deps import require_perm
+from ..services import audit_partitions
+
+router = APIRouter(prefix="/admin/audit", tags=["admin-audit"])
+
+# ช่วงเวลาต่อ query ไม่เกินนี้ → อ่านไม่กี่ partition เสมอ
+MAX_RANGE_DAYS = int(os.getenv("AUDIT_QUERY_MAX_DAYS", "93"))
+
+
+@router.on_event("startup")
+async def _start_maintenance():
+    await audit_partitions.start()
+
+
+@router.on_event("shutdown")
+async def _stop_maintenance():
+    await audit_partitions.stop()
+
+
+def _aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+# GET /admin/audit?since=&until=&actor_id=&action=&subject_id=  (ต้องมี perm: audit:read)
+@router.get("", dependencies=[Depends(require_perm("audit:read"))])
+async def list_audit(
+    since: Optional[datetime] = Query(None, description="ค่าเริ่มต้น = until - 7 วัน"),
+    until: Optional[datetime] = Query(None, description="ไม่รวมขอบบน; ค่าเริ่มต้น = ตอนนี้"),
+    actor_id: Optional[uuid.UUID] = None,
+    action: Optional[str] = Query(None, description="ตรงตัว หรือขึ้นต้นด้วย เช่น session.*"),
+    subject_id: Optional[uuid.UUID] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    before_at: Optional[datetime] = Query(None, description="keyset: created_at ของแถวสุดท้ายหน้าก่อน"),
+    before_id: Optional[int] = Query(None, description="keyset: id ของแถวสุดท้ายหน้าก่อน"),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    audit ใหม่ → เก่า ภายในช่วง [since, until)
+    เงื่อนไข created_at เป็นค่าคงที่ → planner ตัด partition นอกช่วงทิ้ง (partition pruning)
+    """
+    until = _aware(until) if until else datetime.now(timezone.utc)
+    since = _aware(since) if since else until - timedelta(days=7)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if until - since > timedelta(days=MAX_RANGE_DAYS):
+        raise HTTPException(status_code=400, detail=f"Time range too wide (max {MAX_RANGE_DAYS} days)")
+
+    conds = ["created_at >= :since", "created_at < :until"]
+    params: dict = {"since": since, "until": until, "limit": limit}
+    if actor_id:
+        conds.append("actor_id = :actor_id")
+        params["actor_id"] = actor_id
+    if subject_id:
+        conds.append("subject_id = :subject_id")
+        params["subject_id"] = subject_id
+    if action:
+        if action.endswith("*"):
+            conds.append("action LIKE :action")
+            params["action"] = action[:-1].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        else:
+            conds.append("action = :action")
+            params["action"] = action
+    if before_at is not None and before_id is not None:
+        conds.append("(created_at, id) < (:before_at, :before_id)")
+        params.update(before_at=_aware(before_at), before_id=before_id)
+
+    rows = (await session.execute(sa.text(f"""
+        SELECT id, actor_id, action, subject_id, detail, host(ip_addr) AS ip_addr, created_at
+          FROM audit_logs
+         WHERE {" AND ".join(conds)}
+         ORDER BY created_at DESC, id DESC
+         LIMIT :limit
+    """), params)).mappings().all()
+
+    items = [
+        {**r, "actor_id": str(r["actor_id"]) if r["actor_id"] else None,
+         "subject_id": str(r["subject_id"]) if r["subject_id"] else None,
+         "created_at": r["created_at"].isoformat()}
+        for r in rows
+    ]
+    nxt = None
+    if len(rows) == limit:
+        nxt = {"before_at": items[-1]["created_at"], "before_id": items[-1]["id"]}
+    return {"since": since.isoformat(), "until": until.isoformat(), "items": items, "next": nxt}
+
+
+# GET /admin/audit/partitions  (รายการ partition + ผล maintenance ล่าสุด)
+@router.get("/partitions", dependencies=[Depends(require_perm("audit:read"))])
+async def list_partitions(session: AsyncSession = Depends(get_session)):
+    return {
+        "partitions": await audit_partitions.partitions(session),
+        "ahead_months": audit_partitions.AHEAD_MONTHS,
+        "retention_months": audit_partitions.RETENTION_MONTHS,
+        "last_run": audit_partitions.last_run or None,
+    }
+
+
+# POST /admin/audit/partitions/maintain  (รัน maintenance ทันที; ต้องมี perm: audit:manage)
+@router.post("/partitions/maintain", dependencies=[Depends(require_perm("audit:manage"))])
+async def run_maintenance():
+    return await audit_partitions.maintain_once()
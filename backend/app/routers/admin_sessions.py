@@ -7,15 +7,24 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, or_, insert
+from sqlalchemy import select, update, or_
 
 from ..database import get_session
 from ..deps import require_perm
-from ..models import User, Session as SessionModel, AuditLog
+from ..models import User, Session as SessionModel
+from ..services import audit_sink, session_gc
 from ..schemas.session import SessionOut
 
 router = APIRouter(prefix="/admin/sessions", tags=["admin-sessions"])
 
+@router.on_event("startup")
+async def _start_gc():
+    await session_gc.start()
+
+@router.on_event("shutdown")
+async def _stop_gc():
+    await session_gc.stop()
+
 def _iso(dt: Optional[datetime]) -> Optional[str]:
     return dt.isoformat() if isinstance(dt, datetime) else None
 
@@ -73,7 +82,7 @@ async def admin_revoke_session(
     await session.execute(
         update(SessionModel).where(SessionModel.id == sid_uuid).values(ended_at=now, revoked=True)
     )
-    await session.execute(insert(AuditLog).values(action="admin.session.revoke", subject_id=sid_uuid))
+    await audit_sink.record(session, "admin.session.revoke", subject_id=sid_uuid)
     await session.commit()
     return {"ok": True}
 
@@ -95,7 +104,16 @@ async def admin_revoke_user_sessions(
         .where(SessionModel.user_id == user.id, SessionModel.ended_at.is_(None), SessionModel.revoked.is_(False))
         .values(ended_at=now, revoked=True)
     )
-    await session.execute(insert(AuditLog).values(action="admin.session.revoke_all", subject_id=user.id))
+    await audit_sink.record(session, "admin.session.revoke_all", subject_id=user.id)
     await session.commit()
     return {"ok": True}
 
+# GET /admin/sessions/gc  (สถิติ session GC: จำนวนที่ปิด/ลบ ต่อรอบและสะสม)
+@router.get("/gc", dependencies=[Depends(require_perm("session:manage"))])
+async def admin_session_gc_stats():
+    return session_gc.snapshot()
+
+# POST /admin/sessions/gc  (รัน GC ทันที)
+@router.post("/gc", dependencies=[Depends(require_perm("session:manage"))])
+async def admin_session_gc_run():
+    return await session_gc.run_once()
@@ -1,4 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, insert, delete, update
 from ..database import get_session
@@ -9,16 +13,56 @@ from ..deps import require_perm
 
 router = APIRouter(prefix="/admin/users", tags=["admin-users"])
 
+# หน้าเดียว + roles ของทุกคนในหน้าใน query เดียว (เดิม 1 query ต่อ user)
+# keyset: after = id ของแถวสุดท้ายหน้าก่อน → (lower(username), id) > ของแถวนั้น; limit NULL = ทั้งหมด
+SQL_LIST_USERS = sa.text("""
+    WITH page AS (
+      SELECT id, email, username, status
+        FROM users
+       WHERE (CAST(:q AS text) IS NULL OR username ILIKE :q OR email::text ILIKE :q)
+         AND (CAST(:after AS uuid) IS NULL
+              OR (lower(username), id) > (SELECT lower(username), id FROM users WHERE id = CAST(:after AS uuid)))
+       ORDER BY lower(username), id
+       LIMIT :limit
+    )
+    SELECT p.id, p.email, p.username, p.status,
+           COALESCE(array_agg(DISTINCT r.name ORDER BY r.name) FILTER (WHERE r.name IS NOT NULL), '{}') AS roles
+      FROM page p
+      LEFT JOIN user_roles ur ON ur.user_id = p.id
+      LEFT JOIN roles r ON r.id = ur.role_id
+     GROUP BY p.id, p.email, p.username, p.status
+     ORDER BY lower(p.username), p.id
+""")
+
+def _like(q: Optional[str]) -> Optional[str]:
+    q = (q or "").strip()
+    if not q:
+        return None
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
 @router.get("", response_model=list[UserOut], dependencies=[Depends(require_perm("user:view"))])
-async def list_users(session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(User))
-    users = result.scalars().all()
-    out = []
-    for u in users:
-        roles_q = await session.execute(select(Role.name).join(UserRole, UserRole.role_id == Role.id).where(UserRole.user_id == u.id))
-        roles = sorted(set(roles_q.scalars().all()))
-        out.append(UserOut(id=str(u.id), email=u.email, username=u.username, status=u.status, roles=roles))
-    return out
+async def list_users(
+    response: Response,
+    q: Optional[str] = Query(None, description="ค้นหา username/email (บางส่วน)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="ไม่ระบุ (และไม่มี after) = ทั้งหมดแบบเดิม"),
+    after: Optional[UUID] = Query(None, description="id ของแถวสุดท้ายหน้าก่อน (ดู header X-Next-Cursor)"),
+    session: AsyncSession = Depends(get_session),
+):
+    if after is not None:
+        if limit is None:
+            limit = 200
+        # แถวของ cursor ถูกลบไปแล้ว → หาตำแหน่งต่อไม่ได้ (ไม่งั้นได้หน้าว่างเงียบ ๆ)
+        if (await session.execute(select(User.id).where(User.id == after))).scalar_one_or_none() is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = (await session.execute(SQL_LIST_USERS, {
+        "q": _like(q), "after": str(after) if after else None, "limit": limit,
+    })).mappings().all()
+    if limit is not None and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return [
+        UserOut(id=str(r["id"]), email=r["email"], username=r["username"], status=r["status"], roles=list(r["roles"]))
+        for r in rows
+    ]
 
 @router.post("", dependencies=[Depends(require_perm("user:create"))])
 async def create_user(payload: UserCreate, session: AsyncSession = Depends(get_session)):
@@ -1,24 +1,64 @@
 # backend/app/routers/auth.py
 from __future__ import annotations
 
+import asyncio
+import logging
 import uuid
 from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, or_, func, insert
+import sqlalchemy as sa
+from sqlalchemy import select, update, or_, func
 
 from ..database import get_session
 from ..schemas.auth import LoginIn, LoginOut, MeOut, ChangePasswordIn
 from ..security.password import verify_password, hash_password
 from ..security.jwtauth import create_access_token, get_current_user_and_sid
-from ..models import User, AuditLog, Session as SessionModel
+from ..models import User, Session as SessionModel
+from ..services import audit_sink
 from ..services.rbac_service import get_permissions, get_roles
 from ..deps import require_user
 
+log = logging.getLogger("uvicorn.error")
+
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# audit sink (write-behind ของ audit_logs) ผูกกับ router นี้ — auth ถูก include เสมอ
+@router.on_event("startup")
+async def _start_audit_sink():
+    await audit_sink.start()
+
+@router.on_event("shutdown")
+async def _stop_audit_sink():
+    await audit_sink.stop()   # drain คิวที่เหลือก่อนปิด
+    log.info("audit sink stopped: %s", audit_sink.snapshot())
+
+# งานหลังตรวจรหัสผ่านทั้งหมดใน statement เดียว (1 round trip):
+# เตะ session เก่า (single-device rule) → สร้าง session ใหม่ → last_login_at → audit (เฉพาะ AUDIT_MODE=inline;
+# batched เข้าคิวตอน commit ไม่ต้องไป DB) — ทุก CTE เห็น snapshot เดียวกัน จึงไม่เตะ session ที่เพิ่งสร้าง
+_LOGIN_AUDIT_CTE = """,
+    a AS (
+      INSERT INTO audit_logs (actor_id, action, ip_addr, created_at)
+      VALUES (:uid, 'login', CAST(:ip AS inet), :now)
+    )"""
+SQL_LOGIN = sa.text(f"""
+    WITH revoked AS (
+      UPDATE sessions SET ended_at = :now, revoked = TRUE
+       WHERE user_id = :uid AND ended_at IS NULL AND revoked = FALSE
+    ),
+    sess AS (
+      INSERT INTO sessions (id, user_id, ip_addr, user_agent, last_seen_at, expires_at)
+      VALUES (:sid, :uid, CAST(:ip AS inet), :ua, :now, :expires_at)
+      RETURNING id
+    ),
+    u AS (
+      UPDATE users SET last_login_at = now() WHERE id = :uid
+    ){_LOGIN_AUDIT_CTE if audit_sink.MODE == "inline" else ""}
+    SELECT id FROM sess
+""")
+
 @router.post("/login", response_model=LoginOut)
 async def login(payload: LoginIn, request: Request, session: AsyncSession = Depends(get_session)):
     # username หรือ email
@@ -26,35 +66,22 @@ async def login(payload: LoginIn, request: Request, session: AsyncSession = Depe
         select(User).where(or_(User.username == payload.username, User.email == payload.username))
     )).scalar_one_or_none()
 
-    if not user or user.status != "active" or not verify_password(payload.password, user.password_hash):
+    # bcrypt กิน CPU ~100ms → ทำใน thread ไม่บล็อก event loop ของ login อื่นที่เข้ามาพร้อมกัน
+    if not user or user.status != "active" or not await asyncio.to_thread(verify_password, payload.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     now = datetime.now(timezone.utc)
-    expires_at = now + timedelta(hours=2)
-
-    # เตะ session เก่าทุกตัวของ user นี้ (single-device rule)
-    await session.execute(
-        update(SessionModel)
-        .where(SessionModel.user_id == user.id, SessionModel.ended_at.is_(None), SessionModel.revoked.is_(False))
-        .values(ended_at=now, revoked=True)
-    )
-
-    # สร้าง session ใหม่
-    sid = uuid.uuid4()
-    await session.execute(
-        insert(SessionModel).values(
-            id=sid,
-            user_id=user.id,
-            ip_addr=(request.client.host if request.client else None),
-            user_agent=request.headers.get("user-agent"),
-            last_seen_at=now,
-            expires_at=expires_at,
-        )
-    )
-
-    # อัปเดต last_login + บันทึก audit
-    await session.execute(update(User).where(User.id == user.id).values(last_login_at=func.now()))
-    await session.execute(insert(AuditLog).values(actor_id=user.id, action="login"))
+    ip = request.client.host if request.client else None
+    sid = (await session.execute(SQL_LOGIN, {
+        "sid": uuid.uuid4(),
+        "uid": user.id,
+        "ip": ip,
+        "ua": request.headers.get("user-agent"),
+        "now": now,
+        "expires_at": now + timedelta(hours=2),
+    })).scalar_one()
+    if audit_sink.MODE != "inline":
+        await audit_sink.record(session, "login", actor_id=user.id, ip_addr=ip)
     await session.commit()
 
     token = create_access_token(str(user.id), str(sid))
@@ -90,7 +117,7 @@ async def change_password(
         raise HTTPException(status_code=400, detail="New password too short (min 8 chars)")
     new_hash = hash_password(payload.new_password)
     await session.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
-    await session.execute(insert(AuditLog).values(actor_id=user.id, action="password.change"))
+    await audit_sink.record(session, "password.change", actor_id=user.id)
     await session.commit()
     return {"ok": True}
 
@@ -102,7 +129,7 @@ async def logout(session: AsyncSession = Depends(get_session), user_sid=Depends(
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
     await session.execute(update(SessionModel).where(SessionModel.id == sid).values(ended_at=func.now(), revoked=True))
-    await session.execute(insert(AuditLog).values(action="logout"))
+    await audit_sink.record(session, "logout")
     await session.commit()
     return {"ok": True}
 
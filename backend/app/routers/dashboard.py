@@ -1,7 +1,8 @@
 # FILE: backend/app/routers/dashboard.py
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import json
+from datetime import date, datetime, time, timedelta, timezone
 from typing import Optional
 import zoneinfo
 
@@ -10,10 +11,105 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import get_db, require_perm as RP
-from ..models import Product as ProductModel
+from ..services import doc_rollup, stock_rollup
+from ..services.dashboard_cache import DOCS, PRODUCTS, STOCK, TEAMS, dashboard_cache
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+TZ = zoneinfo.ZoneInfo("Asia/Bangkok")
+
+
+def _month_range(now: datetime) -> tuple[datetime, datetime]:
+    """[ต้นเดือน, ต้นเดือนถัดไป) ตามเวลาไทย — ใช้ index created_at ได้ ต่างจาก to_char(created_at,...)"""
+    start = datetime(now.year, now.month, 1, tzinfo=TZ)
+    nxt = datetime(now.year + (now.month == 12), now.month % 12 + 1, 1, tzinfo=TZ)
+    return start, nxt
+
+
+# ===== summary: ทุกตัวเลขในคำสั่งเดียว (1 round trip) =====
+_SUMMARY_CORE = """p AS (
+      SELECT count(*) AS total_products,
+             COALESCE(sum(price_ex_vat), 0) AS total_value,
+             count(*) FILTER (WHERE created_at >= :since) AS new_products
+      FROM products
+    )
+    SELECT p.total_products, p.total_value, p.new_products,
+           (SELECT COALESCE(json_agg(json_build_object(
+                     'sku', t.sku, 'name', t.name, 'unit', t.unit, 'price_ex_vat', t.price_ex_vat::text
+                   ) ORDER BY t.price_ex_vat DESC), '[]'::json)
+              FROM (SELECT sku, name, unit, price_ex_vat FROM products
+                    ORDER BY price_ex_vat DESC LIMIT 5) t) AS top5,
+           (SELECT count(*) FROM quotations      WHERE created_at >= :a AND created_at < :b) AS quotes,
+           (SELECT count(*) FROM purchase_orders WHERE created_at >= :a AND created_at < :b) AS pos,
+           (SELECT count(*) FROM sales_orders    WHERE created_at >= :a AND created_at < :b) AS sos"""
+SQL_SUMMARY = sa.text(f"""
+    WITH {_SUMMARY_CORE},
+           (SELECT last_seq FROM quote_numbering
+             WHERE company_code=:c AND team_code=:t AND period_yyyymm=:p) AS last_seq
+    FROM p
+""")
+# ผู้ใช้ไม่มีทีม หรือ DB ยังไม่มีตาราง quote_numbering
+SQL_SUMMARY_NO_TEAM = sa.text(f"""
+    WITH {_SUMMARY_CORE},
+           NULL::int AS last_seq
+    FROM p
+""")
+
+
+async def _team_company(db: AsyncSession, user_id) -> tuple[Optional[str], str]:
+    try:
+        m = (await db.execute(sa.text("""
+            SELECT (SELECT team_code FROM team_codes WHERE user_id=:u) AS team_code,
+                   (SELECT company_code FROM company_codes WHERE user_id=:u) AS company_code
+        """), {"u": str(user_id)})).mappings().one()
+    except Exception:
+        await db.rollback()
+        return None, "SVS"
+    return m["team_code"], m["company_code"] or "SVS"
+
+
+async def _load_summary(db: AsyncSession, team_code: Optional[str], company_code: str, days: int) -> dict:
+    now = datetime.now(TZ)
+    mm = f"{now.month:02d}"
+    yyyymm = f"{now.year:04d}{mm}"
+    yy_th = (now.year + 543) % 100
+    m_start, m_end = _month_range(now)
+    params = {
+        "t": team_code, "c": company_code, "p": yyyymm, "a": m_start, "b": m_end,
+        "since": datetime.now(timezone.utc) - timedelta(days=days),
+    }
+    m = None
+    if team_code:
+        try:
+            m = (await db.execute(SQL_SUMMARY, params)).mappings().one()
+        except Exception:
+            await db.rollback()
+    if m is None:
+        m = (await db.execute(SQL_SUMMARY_NO_TEAM, params)).mappings().one()
+
+    top5 = m["top5"]
+    if isinstance(top5, str):
+        top5 = json.loads(top5)
+
+    # เลข Q ล่าสุดของทีมผู้ใช้ในเดือนนี้
+    last_quote_number: Optional[str] = None
+    last_seq = int(m["last_seq"] or 0)
+    if team_code and last_seq:
+        last_quote_number = f"Q{team_code}{yy_th:02d}{mm}{last_seq:03d}"
+
+    return {
+        "total_products": int(m["total_products"] or 0),
+        "total_value_ex_vat": float(m["total_value"] or 0),
+        "new_products_last_days": {"days": days, "count": int(m["new_products"] or 0)},
+        "top5_by_price": top5,
+        # เพิ่มทางธุรกิจ
+        "quotes_this_month": int(m["quotes"] or 0),
+        "pos_this_month": int(m["pos"] or 0),
+        "sos_this_month": int(m["sos"] or 0),
+        "last_quote_number": last_quote_number,
+        "period_yyyymm": yyyymm,
+    }
+
 
 @router.get("/summary")
 async def summary(
@@ -25,114 +121,118 @@ async def summary(
     ภาพรวม: จำนวนสินค้า, มูลค่าสินค้า, สินค้าใหม่, Top5, เอกสารเดือนนี้ (Q/PO/SO),
     และเลขใบเสนอราคาล่าสุดของทีมผู้ใช้ในเดือนนี้ (ถ้ามี mapping)
     """
-    # ===== สินค้า =====
-    total_products = int(
-        await db.scalar(sa.select(sa.func.count()).select_from(ProductModel)) or 0
+    # ตัวเลขเหมือนกันทั้งทีม/บริษัท → cache ต่อ (team, company, days) ไม่ใช่ต่อผู้ใช้
+    team_code, company_code = await dashboard_cache.get(
+        f"me:{user.id}", (TEAMS,), lambda s: _team_company(s, user.id), db, ttl=300,
+    )
+    return await dashboard_cache.get(
+        f"summary:{team_code or '-'}:{company_code}:{days}:{datetime.now(TZ):%Y%m}", (DOCS, PRODUCTS),
+        lambda s: _load_summary(s, team_code, company_code, days), db,
     )
 
-    total_value = await db.scalar(
-        sa.select(sa.func.coalesce(sa.func.sum(ProductModel.price_ex_vat), 0))
+
+# ===== stock: อ่านจาก KPI ที่ trigger บน stock_levels ดูแล (migration stock_kpis) =====
+# ยอดรวม = แถว rollup เดียว + deltas ที่ยังไม่พับ (ไม่เกินการเขียนในรอบพับเดียว)
+# top N / out-of-stock ผ่าน index → ไม่ขึ้นกับจำนวนคลัง/item
+SQL_STOCK_KPIS = sa.text("""
+    WITH t AS (
+      SELECT on_hand, reserved FROM stock_kpi_rollup
+      UNION ALL
+      SELECT on_hand, reserved FROM stock_kpi_deltas
     )
-    try:
-        total_value = float(total_value or 0)
-    except Exception:
-        total_value = 0.0
-
-    new_since = datetime.now(timezone.utc) - timedelta(days=days)
-    created_col = getattr(ProductModel, "created_at", None)
-    if created_col is not None:
-        new_products = int(
-            await db.scalar(
-                sa.select(sa.func.count())
-                .select_from(ProductModel)
-                .where(created_col >= new_since)
-            )
-            or 0
-        )
-    else:
-        new_products = 0
+    SELECT (SELECT COALESCE(sum(on_hand), 0) FROM t) AS on_hand,
+           (SELECT COALESCE(sum(reserved), 0) FROM t) AS reserved,
+           (SELECT COALESCE(json_agg(json_build_object('sku', t.sku, 'name', t.name, 'on_hand', t.on_hand)
+                                     ORDER BY t.on_hand DESC), '[]'::json)
+              FROM (SELECT i.sku, i.item_name AS name, k.on_hand
+                      FROM stock_item_kpis k JOIN items i ON i.item_id = k.item_id
+                     ORDER BY k.on_hand DESC LIMIT :limit_top) t) AS top,
+           (SELECT COALESCE(json_agg(json_build_object('sku', o.sku, 'name', o.name, 'available', o.available)
+                                     ORDER BY o.available, o.sku), '[]'::json)
+              FROM (SELECT i.sku, i.item_name AS name, k.available
+                      FROM stock_item_kpis k JOIN items i ON i.item_id = k.item_id
+                     WHERE k.available <= 0
+                     ORDER BY k.available, i.sku LIMIT 50) o) AS oos
+""")
 
-    top_rows = (
-        await db.execute(
-            sa.select(ProductModel).order_by(ProductModel.price_ex_vat.desc()).limit(5)
-        )
-    ).scalars().all()
-    top5 = [
-        {"sku": r.sku, "name": r.name, "unit": r.unit, "price_ex_vat": str(r.price_ex_vat)}
-        for r in top_rows
-    ]
 
-    # ===== เอกสารเดือนนี้ & เลขล่าสุดทีมผู้ใช้ =====
-    tz = zoneinfo.ZoneInfo("Asia/Bangkok")
-    now = datetime.now(tz)
-    mm = f"{now.month:02d}"
-    yyyymm = f"{now.year:04d}{mm}"
-    yy_th = (now.year + 543) % 100
+async def _load_stock_kpis(db: AsyncSession, limit_top: int) -> dict:
+    m = (await db.execute(SQL_STOCK_KPIS, {"limit_top": limit_top})).mappings().one()
+    top, oos = m["top"], m["oos"]
+    if isinstance(top, str):
+        top = json.loads(top)
+    if isinstance(oos, str):
+        oos = json.loads(oos)
+    total_on_hand = int(m["on_hand"] or 0)
+    total_reserved = int(m["reserved"] or 0)
+    return {
+        "total_on_hand": total_on_hand,
+        "total_reserved": total_reserved,
+        "total_available": total_on_hand - total_reserved,
+        "top_by_on_hand": top,
+        "out_of_stock": oos,
+        "source": "stock_item_kpis",
+    }
 
-    quotes_this_month = int(
-        await db.scalar(
-            sa.text("SELECT COUNT(*) FROM quotations WHERE to_char(created_at,'YYYYMM')=:p"),
-            {"p": yyyymm},
-        ) or 0
-    )
-    pos_this_month = int(
-        await db.scalar(
-            sa.text("SELECT COUNT(*) FROM purchase_orders WHERE to_char(created_at,'YYYYMM')=:p"),
-            {"p": yyyymm},
-        ) or 0
-    )
-    sos_this_month = int(
-        await db.scalar(
-            sa.text("SELECT COUNT(*) FROM sales_orders WHERE to_char(created_at,'YYYYMM')=:p"),
-            {"p": yyyymm},
-        ) or 0
-    )
 
-    # team/company ของ user
+async def _load_stock(db: AsyncSession, limit_top: int) -> dict:
     try:
-        team_code = await db.scalar(
-            sa.text("SELECT team_code FROM team_codes WHERE user_id=:u"),
-            {"u": str(user.id)},
-        )
+        return await _load_stock_kpis(db, limit_top)
     except Exception:
-        team_code = None
+        # ยังไม่ได้รัน migration stock_kpis → aggregate จาก stock_levels ตรง ๆ
+        await db.rollback()
+    return await _load_stock_raw(db, limit_top)
 
-    try:
-        company_code = await db.scalar(
-            sa.text("SELECT company_code FROM company_codes WHERE user_id=:u"),
-            {"u": str(user.id)},
+
+async def _load_stock_raw(db: AsyncSession, limit_top: int) -> dict:
+    totals = await db.execute(
+        sa.text(
+            "SELECT COALESCE(SUM(on_hand),0) AS on_hand, COALESCE(SUM(reserved),0) AS reserved FROM stock_levels"
         )
-    except Exception:
-        company_code = None
-    company_code = company_code or "SVS"
+    )
+    row = totals.mappings().first() or {"on_hand": 0, "reserved": 0}
+    total_on_hand = int(row["on_hand"] or 0)
+    total_reserved = int(row["reserved"] or 0)
+    total_available = total_on_hand - total_reserved
 
-    # เลข Q ล่าสุดของทีมผู้ใช้ในเดือนนี้
-    last_quote_number: Optional[str] = None
-    if team_code:
-        last_seq = int(
-            await db.scalar(
-                sa.text("""
-                    SELECT last_seq
-                    FROM quote_numbering
-                    WHERE company_code=:c AND team_code=:t AND period_yyyymm=:p
-                """),
-                {"c": company_code, "t": team_code, "p": yyyymm},
-            ) or 0
+    top = await db.execute(
+        sa.text(
+            """
+            SELECT i.sku, i.item_name AS name, COALESCE(SUM(s.on_hand),0) AS on_hand
+            FROM stock_levels s
+            JOIN items i ON i.item_id = s.item_id
+            GROUP BY i.sku, i.item_name
+            ORDER BY on_hand DESC
+            LIMIT :limit_top
+            """
+        ),
+        {"limit_top": limit_top},
+    )
+    top_by_on_hand = [dict(r) for r in top.mappings().all()]
+
+    oos = await db.execute(
+        sa.text(
+            """
+            SELECT i.sku, i.item_name AS name,
+                   (COALESCE(SUM(s.on_hand),0) - COALESCE(SUM(s.reserved),0)) AS available
+            FROM stock_levels s
+            JOIN items i ON i.item_id = s.item_id
+            GROUP BY i.sku, i.item_name
+            HAVING (COALESCE(SUM(s.on_hand),0) - COALESCE(SUM(s.reserved),0)) <= 0
+            ORDER BY available ASC, i.sku ASC
+            LIMIT 50
+            """
         )
-        if last_seq:
-            last_quote_number = f"Q{team_code}{yy_th:02d}{mm}{last_seq:03d}"
+    )
+    out_of_stock = [dict(r) for r in oos.mappings().all()]
 
     return {
-        "total_products": total_products,
-        "total_value_ex_vat": total_value,
-        "new_products_last_days": {"days": days, "count": new_products},
-        "top5_by_price": top5,
-        # เพิ่มทางธุรกิจ
-        "quotes_this_month": quotes_this_month,
-        "pos_this_month": pos_this_month,
-        "sos_this_month": sos_this_month,
-        "last_quote_number": last_quote_number,
-        "period_yyyymm": yyyymm,
+        "total_on_hand": total_on_hand,
+        "total_reserved": total_reserved,
+        "total_available": total_available,
+        "top_by_on_hand": top_by_on_hand,
+        "out_of_stock": out_of_stock,
+        "source": "stock_levels",
     }
 
 
@@ -147,55 +247,9 @@ async def stock(
     NOTE: stock_levels.item_id → items.item_id (ไม่ใช่ products.id)
     """
     try:
-        totals = await db.execute(
-            sa.text(
-                "SELECT COALESCE(SUM(on_hand),0) AS on_hand, COALESCE(SUM(reserved),0) AS reserved FROM stock_levels"
-            )
-        )
-        row = totals.mappings().first() or {"on_hand": 0, "reserved": 0}
-        total_on_hand = int(row["on_hand"] or 0)
-        total_reserved = int(row["reserved"] or 0)
-        total_available = total_on_hand - total_reserved
-
-        top = await db.execute(
-            sa.text(
-                """
-                SELECT i.sku, i.item_name AS name, COALESCE(SUM(s.on_hand),0) AS on_hand
-                FROM stock_levels s
-                JOIN items i ON i.item_id = s.item_id
-                GROUP BY i.sku, i.item_name
-                ORDER BY on_hand DESC
-                LIMIT :limit_top
-                """
-            ),
-            {"limit_top": limit_top},
+        return await dashboard_cache.get(
+            f"stock:{limit_top}", (STOCK,), lambda s: _load_stock(s, limit_top), db,
         )
-        top_by_on_hand = [dict(r) for r in top.mappings().all()]
-
-        oos = await db.execute(
-            sa.text(
-                """
-                SELECT i.sku, i.item_name AS name,
-                       (COALESCE(SUM(s.on_hand),0) - COALESCE(SUM(s.reserved),0)) AS available
-                FROM stock_levels s
-                JOIN items i ON i.item_id = s.item_id
-                GROUP BY i.sku, i.item_name
-                HAVING (COALESCE(SUM(s.on_hand),0) - COALESCE(SUM(s.reserved),0)) <= 0
-                ORDER BY available ASC, i.sku ASC
-                LIMIT 50
-                """
-            )
-        )
-        out_of_stock = [dict(r) for r in oos.mappings().all()]
-
-        return {
-            "total_on_hand": total_on_hand,
-            "total_reserved": total_reserved,
-            "total_available": total_available,
-            "top_by_on_hand": top_by_on_hand,
-            "out_of_stock": out_of_stock,
-            "source": "stock_levels",
-        }
     except Exception as e:
         return {
             "total_on_hand": 0,
@@ -206,11 +260,57 @@ async def stock(
             "source": "unavailable",
             "detail": f"{type(e).__name__}: {e}",
         }
+
+
+DOC_TYPES = (("quotes", "Q", "quotations"), ("pos", "PO", "purchase_orders"), ("sos", "SO", "sales_orders"))
+
+
+async def _daily_raw(db: AsyncSession, since_day: date, team_code: Optional[str]) -> dict[tuple[date, str], int]:
+    # สำรองเมื่อยังไม่ได้รัน migration doc_daily_counts: นับจากเอกสารจริง
+    # ช่วงเวลาแบบ half-open [เที่ยงคืนวันแรก, ...) ตามเวลาไทย → range scan บน index created_at
+    since = datetime.combine(since_day, time.min, tzinfo=TZ)
+    out: dict[tuple[date, str], int] = {}
+    for _, code, table in DOC_TYPES:
+        rows = (await db.execute(sa.text(f"""
+            SELECT (created_at AT TIME ZONE 'Asia/Bangkok')::date AS d, COUNT(*) AS cnt
+            FROM {table}
+            WHERE created_at >= :since
+              AND (CAST(:team AS text) IS NULL OR substring(number FROM '^{code}([A-Z]+)[0-9]') = :team)
+            GROUP BY 1
+        """), {"since": since, "team": team_code})).mappings().all()
+        out.update({(r["d"], code): int(r["cnt"]) for r in rows})
+    return out
+
+
+async def _load_timeseries(db: AsyncSession, days: int, team_code: Optional[str]) -> list[dict]:
+    # วันตามปฏิทินไทย; อ่านจาก rollup (≤ days×3 แถว) แทนการ GROUP BY เอกสารทั้งหมด
+    today = datetime.now(TZ).date()
+    start_date = today - timedelta(days=max(1, days) - 1)
+    try:
+        counts = await doc_rollup.daily_counts(db, start_date, team_code)
+    except Exception:
+        await db.rollback()
+        counts = await _daily_raw(db, start_date, team_code)
+
+    # ประกอบ series ครบทุกวัน ตั้งแต่ start → today
+    out = []
+    d = start_date
+    while d <= today:
+        row = {"date": d.isoformat()}
+        for name, code, _ in DOC_TYPES:
+            row[name] = counts.get((d, code), 0)
+        out.append(row)
+        d += timedelta(days=1)
+
+    return out
+
+
 @router.get("/timeseries")
 async def timeseries(
     db: AsyncSession = Depends(get_db),
     user = Depends(RP("products:read")),
-    days: int = Query(30, ge=1, le=365),
+    days: int = Query(30, ge=1, le=1830),
+    team_code: Optional[str] = Query(None, description="กรองเฉพาะทีม (จากเลขเอกสาร)"),
 ):
     """
     เอกสารรายวันย้อนหลัง N วัน:
@@ -219,52 +319,26 @@ async def timeseries(
       ...
     ]
     """
-    # คำนวณช่วงวันที่ฝั่ง Python และฝังเป็น literal ที่ปลอดภัย
-    tz = zoneinfo.ZoneInfo("Asia/Bangkok")
-    today = datetime.now(tz).date()
-    start_date = today - timedelta(days=max(1, days) - 1)
-    start_iso = start_date.isoformat()  # 'YYYY-MM-DD'
-
-    # ดึงยอดต่อวันของแต่ละเอกสาร (ใช้ literal DATE 'YYYY-MM-DD')
-    q_sql = sa.text(f"""
-        SELECT to_char(date(created_at), 'YYYY-MM-DD') AS d, COUNT(*) AS cnt
-        FROM quotations
-        WHERE created_at::date >= DATE '{start_iso}'
-        GROUP BY 1 ORDER BY 1
-    """)
-    p_sql = sa.text(f"""
-        SELECT to_char(date(created_at), 'YYYY-MM-DD') AS d, COUNT(*) AS cnt
-        FROM purchase_orders
-        WHERE created_at::date >= DATE '{start_iso}'
-        GROUP BY 1 ORDER BY 1
-    """)
-    s_sql = sa.text(f"""
-        SELECT to_char(date(created_at), 'YYYY-MM-DD') AS d, COUNT(*) AS cnt
-        FROM sales_orders
-        WHERE created_at::date >= DATE '{start_iso}'
-        GROUP BY 1 ORDER BY 1
-    """)
-
-    q_rows = (await db.execute(q_sql)).mappings().all()
-    p_rows = (await db.execute(p_sql)).mappings().all()
-    s_rows = (await db.execute(s_sql)).mappings().all()
-
-    q_map = {r["d"]: int(r["cnt"]) for r in q_rows}
-    p_map = {r["d"]: int(r["cnt"]) for r in p_rows}
-    s_map = {r["d"]: int(r["cnt"]) for r in s_rows}
+    team_code = team_code.strip().upper() if team_code else None
+    return await dashboard_cache.get(
+        f"timeseries:{days}:{team_code or '-'}:{datetime.now(TZ).date()}", (DOCS,),
+        lambda s: _load_timeseries(s, days, team_code), db,
+    )
 
-    # ประกอบ series ครบทุกวัน ตั้งแต่ start → today
-    out = []
-    d = start_date
-    while d <= today:
-        key = d.isoformat()
-        out.append({
-            "date": key,
-            "quotes": q_map.get(key, 0),
-            "pos":    p_map.get(key, 0),
-            "sos":    s_map.get(key, 0),
-        })
-        d += timedelta(days=1)
 
-    return out
+@router.on_event("startup")
+async def _start_rollup():
+    await doc_rollup.start()
+    await stock_rollup.start()
+
+
+@router.on_event("shutdown")
+async def _stop_rollup():
+    await doc_rollup.stop()
+    await stock_rollup.stop()
+
 
+@router.get("/cache-stats")
+async def cache_stats(user=Depends(RP("products:read"))):
+    """hit/miss ของ cache dashboard (ต่อ process)"""
+    return dashboard_cache.snapshot()
@@ -4,17 +4,26 @@ from fastapi import APIRouter, Body, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from collections import deque
-import asyncio, json, time
-from typing import AsyncGenerator, Dict, Any
+from itertools import islice
+import asyncio, json, os, random, time, zlib
+from typing import AsyncGenerator, Dict, Any, Optional
 
 router = APIRouter()
 
-# in-memory log store
+# in-memory log store = ring buffer ที่ใช้ร่วมกันทุก subscriber
+# แต่ละรายการมี seq เพิ่มทีละ 1 (ต่อเนื่องใน buffer เสมอ) → ใช้เป็น SSE id สำหรับ resume
 MAX_LOGS = 1000
 LOGS: "deque[dict]" = deque(maxlen=MAX_LOGS)
+_seq = 0
+_tick = asyncio.Event()          # set เมื่อมีรายการใหม่ แล้วเปลี่ยนเป็น Event ใหม่
 
-# sse subscribers
-SUBSCRIBERS: "set[asyncio.Queue]" = set()
+HEARTBEAT_SEC = 15.0
+STREAM_BATCH = 200               # ส่งไม่เกินเท่านี้ต่อรอบ แล้วค่อยเช็ค disconnect
+
+# sse subscribers: id → สถานะ (cursor = seq ล่าสุดที่ส่งแล้ว)
+SUBSCRIBERS: "dict[int, dict]" = {}
+_sub_ids = 0
+STREAM_STATS = {"connected_total": 0, "resumed": 0, "dropped": 0, "heartbeats": 0}
 
 class DebugEntry(BaseModel):
     ts: float | None = None
@@ -24,26 +33,179 @@ class DebugEntry(BaseModel):
     data: Dict[str, Any] | None = None
     context: Dict[str, Any] | None = None
 
-def _broadcast(obj: dict):
-    for q in list(SUBSCRIBERS):
-        try:
-            q.put_nowait(obj)
-        except Exception:
-            pass
+def _publish_many(objs: "list[dict]") -> None:
+    """เก็บลง ring พร้อม seq แล้วปลุก subscriber ครั้งเดียว — ไม่ copy ลงคิวของใคร"""
+    global _seq, _tick
+    if not objs:
+        return
+    for obj in objs:
+        _seq += 1
+        obj["seq"] = _seq
+        LOGS.append(obj)
+    tick, _tick = _tick, asyncio.Event()
+    tick.set()
+
+def _publish(obj: dict) -> dict:
+    _publish_many([obj])
+    return obj
+
+def _since(cursor: int) -> tuple[list[dict], int]:
+    """รายการที่ seq > cursor (สูงสุด STREAM_BATCH) + จำนวนที่หลุดจาก ring ไปแล้ว"""
+    if not LOGS:
+        return [], 0
+    first = LOGS[0]["seq"]
+    dropped = max(0, first - cursor - 1)
+    start = max(0, cursor + 1 - first)
+    return list(islice(LOGS, start, start + STREAM_BATCH)), dropped
 
 @router.get("/debug/ping")
 async def debug_ping():
-    return {"ok": True, "server_time": time.time(), "count": len(LOGS)}
+    return {"ok": True, "server_time": time.time(), "count": len(LOGS), "seq": _seq}
 
 @router.post("/debug/log")
 async def debug_log(entry: DebugEntry):
     obj = entry.dict()
     if not obj.get("ts"):
         obj["ts"] = time.time()
-    LOGS.append(obj)
-    _broadcast(obj)
+    _publish(obj)
     return {"ok": True}
 
+# ===== batch ingestion: sampling ต่อ level/source + rate limit ต่อ client =====
+BATCH_MAX_BYTES = 1 << 20            # body (หลัง gzip) ไม่เกิน 1 MB
+BATCH_MAX_INFLATED = 8 << 20         # หลังแตก gzip ไม่เกิน 8 MB
+BATCH_MAX_ENTRIES = 1000
+MESSAGE_MAX = 4000
+LEVELS = {"info", "warn", "error", "debug", "net"}
+
+def _parse_rates(spec: str) -> "dict[str, float]":
+    # "debug=0.1,net=0.2,fe:info=0.5" → key เป็น level หรือ source:level
+    out: "dict[str, float]" = {}
+    for part in spec.split(","):
+        k, _, v = part.partition("=")
+        try:
+            out[k.strip()] = max(0.0, min(1.0, float(v)))
+        except ValueError:
+            continue
+    return out
+
+SAMPLE_RATES = _parse_rates(os.getenv("DEBUG_LOG_SAMPLE", "debug=0.2,net=0.5"))
+RATE_PER_SEC = float(os.getenv("DEBUG_LOG_RATE", "100"))      # ต่อ client (ทุก source รวมกัน)
+RATE_BURST = float(os.getenv("DEBUG_LOG_BURST", "300"))
+BUCKETS_MAX = 10_000
+_buckets: "dict[str, list[float]]" = {}                        # client → [tokens, last_ts]
+INGEST_STATS = {"batches": 0, "received": 0, "accepted": 0, "sampled_out": 0, "rate_limited": 0, "invalid": 0}
+
+def _sample_rate(source: str, level: str) -> float:
+    if level == "error":
+        return 1.0   # error ไม่สุ่มทิ้ง
+    return SAMPLE_RATES.get(f"{source}:{level}", SAMPLE_RATES.get(level, 1.0))
+
+def _prune_buckets(now: float) -> None:
+    # bucket ที่เติมกลับจนเต็มแล้ว = เหมือน client ใหม่ → ลบได้โดยไม่คืน burst ให้ใคร
+    idle = RATE_BURST / RATE_PER_SEC if RATE_PER_SEC > 0 else float("inf")
+    for k in [k for k, b in _buckets.items() if now - b[1] >= idle]:
+        del _buckets[k]
+
+def _take(key: str, n: int, now: float) -> int:
+    """token bucket: คืนจำนวนที่รับได้จาก n"""
+    b = _buckets.get(key)
+    if b is None:
+        if len(_buckets) >= BUCKETS_MAX:
+            _prune_buckets(now)
+            if len(_buckets) >= BUCKETS_MAX:
+                return 0   # client ใหม่จำนวนมากพร้อมกัน → ไม่รับจนกว่าจะมี bucket ว่าง
+        b = _buckets[key] = [RATE_BURST, now]
+    b[0] = min(RATE_BURST, b[0] + (now - b[1]) * RATE_PER_SEC)
+    b[1] = now
+    got = min(n, int(b[0]))
+    b[0] -= got
+    return got
+
+async def _read_body(request: Request) -> Optional[bytes]:
+    """อ่าน body ไม่เกิน BATCH_MAX_BYTES — เกินคืน None (ไม่อ่านที่เหลือเข้าหน่วยความจำ)"""
+    try:
+        if int(request.headers.get("content-length") or 0) > BATCH_MAX_BYTES:
+            return None
+    except ValueError:
+        pass
+    buf = bytearray()
+    async for chunk in request.stream():
+        buf += chunk
+        if len(buf) > BATCH_MAX_BYTES:
+            return None
+    return bytes(buf)
+
+def _read_batch(raw: bytes, encoding: str) -> list:
+    if "gzip" in encoding or raw[:2] == b"\x1f\x8b":
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        raw = d.decompress(raw, BATCH_MAX_INFLATED)
+        if d.unconsumed_tail:
+            raise ValueError("inflated body too large")
+    data = json.loads(raw)
+    if isinstance(data, dict):
+        data = data.get("entries")
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array or {entries: [...]}")
+    return data
+
+@router.post("/debug/logs:batch")
+async def debug_logs_batch(request: Request):
+    """
+    รับ log หลายรายการต่อ request: JSON array หรือ {"entries": [...]} (รองรับ Content-Encoding: gzip)
+    ฝั่ง server สุ่มเก็บตาม level/source (DEBUG_LOG_SAMPLE) และจำกัดอัตราต่อ client
+    (source มาจาก client เอง จึงไม่ใช้เป็น key ของ rate limit)
+    """
+    raw = await _read_body(request)
+    if raw is None:
+        return Response(status_code=413)
+    try:
+        entries = _read_batch(raw, request.headers.get("content-encoding", "").lower())
+    except (ValueError, zlib.error) as e:
+        return Response(content=json.dumps({"ok": False, "detail": str(e)}), status_code=400,
+                        media_type="application/json")
+
+    now = time.time()
+    client = request.client.host if request.client else "-"
+    res = {"received": len(entries), "accepted": 0, "sampled_out": 0, "rate_limited": 0, "invalid": 0}
+    by_source: "dict[str, list[dict]]" = {}
+    for e in entries[:BATCH_MAX_ENTRIES]:
+        if not isinstance(e, dict) or not isinstance(e.get("message"), str):
+            res["invalid"] += 1
+            continue
+        level = e.get("level") if e.get("level") in LEVELS else "info"
+        source = str(e.get("source") or "fe")[:32]
+        rate = _sample_rate(source, level)
+        if rate < 1.0 and random.random() >= rate:
+            res["sampled_out"] += 1
+            continue
+        by_source.setdefault(source, []).append({
+            "ts": e.get("ts") if isinstance(e.get("ts"), (int, float)) else now,
+            "level": level, "source": source, "message": e["message"][:MESSAGE_MAX],
+            "data": e.get("data"), "context": e.get("context"),
+            **({"sample_rate": rate} if rate < 1.0 else {}),
+        })
+    res["invalid"] += max(0, len(entries) - BATCH_MAX_ENTRIES)
+
+    # quota ของ client แบ่งให้ทุก source ตามลำดับ — เปลี่ยน source ไม่ได้ burst เพิ่ม
+    keep: "list[dict]" = []
+    for source, objs in by_source.items():
+        got = _take(client, len(objs), now)
+        keep.extend(objs[:got])
+        res["rate_limited"] += len(objs) - got
+    keep.sort(key=lambda o: o["ts"])
+    _publish_many(keep)
+    res["accepted"] = len(keep)
+
+    INGEST_STATS["batches"] += 1
+    for k in ("received", "accepted", "sampled_out", "rate_limited", "invalid"):
+        INGEST_STATS[k] += res[k]
+    return {"ok": True, **res}
+
+@router.get("/debug/logs:stats")
+async def debug_ingest_stats():
+    return {**INGEST_STATS, "sample_rates": SAMPLE_RATES, "rate_per_sec": RATE_PER_SEC, "burst": RATE_BURST,
+            "buckets": len(_buckets)}
+
 @router.get("/debug/logs")
 async def debug_logs(limit: int = 200):
     limit = max(1, min(limit, MAX_LOGS))
@@ -52,37 +214,88 @@ async def debug_logs(limit: int = 200):
 @router.post("/debug/flush")
 async def debug_flush():
     LOGS.clear()
-    _broadcast({"ts": time.time(), "level": "info", "source": "be", "message": "__flush__"})
+    _publish({"ts": time.time(), "level": "info", "source": "be", "message": "__flush__"})
     return {"ok": True}
 
-async def _event_stream(q: asyncio.Queue) -> AsyncGenerator[bytes, None]:
-    try:
-        while True:
-            item = await q.get()
-            payload = json.dumps(item, ensure_ascii=False)
-            yield f"data: {payload}\n\n".encode("utf-8")
-    finally:
-        pass
+@router.get("/debug/stream/stats")
+async def debug_stream_stats():
+    return {
+        **STREAM_STATS,
+        "seq": _seq,
+        "buffered": len(LOGS),
+        "subscribers": [
+            {"id": k, "cursor": s["cursor"], "lag": _seq - s["cursor"], "sent": s["sent"], "dropped": s["dropped"],
+             "connected_for_sec": round(time.time() - s["since"], 1)}
+            for k, s in SUBSCRIBERS.items()
+        ],
+    }
+
+def _sse(obj: dict, seq: Optional[int] = None) -> bytes:
+    payload = json.dumps(obj, ensure_ascii=False)
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}data: {payload}\n\n".encode("utf-8")
+
+async def _event_stream(request: Request, sub: dict) -> AsyncGenerator[bytes, None]:
+    yield b"retry: 3000\n\n"
+    # push a hello event (ไม่เก็บใน ring)
+    yield _sse({"ts": time.time(), "level": "info", "source": "be", "message": "__hello__", "seq": sub["cursor"]})
+    while True:
+        tick = _tick
+        batch, dropped = _since(sub["cursor"])
+        if dropped:
+            # ช้ากว่า ring (หรือ resume จาก id ที่เก่าเกิน) → แจ้ง client ว่าข้ามไปกี่รายการ
+            sub["dropped"] += dropped
+            STREAM_STATS["dropped"] += dropped
+            yield _sse({"ts": time.time(), "level": "warn", "source": "be", "message": "__dropped__",
+                        "data": {"count": dropped}})
+        for obj in batch:
+            yield _sse(obj, obj["seq"])
+        if batch:
+            sub["cursor"] = batch[-1]["seq"]
+            sub["sent"] += len(batch)
+        elif dropped:
+            sub["cursor"] = _seq
+        if await request.is_disconnected():
+            return
+        if len(batch) >= STREAM_BATCH:
+            continue   # ยังมีค้างใน ring
+        try:
+            await asyncio.wait_for(tick.wait(), timeout=HEARTBEAT_SEC)
+        except asyncio.TimeoutError:
+            if await request.is_disconnected():
+                return
+            STREAM_STATS["heartbeats"] += 1
+            yield b": hb\n\n"
 
 @router.get("/debug/stream")
-async def debug_stream(request: Request):
-    q: asyncio.Queue = asyncio.Queue(maxsize=100)
-    SUBSCRIBERS.add(q)
-    # push a hello event
-    try:
-        q.put_nowait({"ts": time.time(), "level": "info", "source": "be", "message": "__hello__"})
-    except Exception:
-        pass
+async def debug_stream(request: Request, last_event_id: Optional[int] = None):
+    """
+    SSE ของ log ทั้งหมด; เชื่อมต่อใหม่ด้วย Last-Event-ID (header ที่ EventSource ส่งเอง
+    หรือ ?last_event_id=) เพื่อรับรายการที่พลาดไปจาก ring ต่อ
+    """
+    global _sub_ids
+    hdr = request.headers.get("last-event-id")
+    if hdr and hdr.strip().isdigit():
+        last_event_id = int(hdr)
+    # ไม่ระบุ = เริ่มจากรายการใหม่เท่านั้น; id มากกว่า seq ปัจจุบัน (server restart) = เริ่มใหม่
+    cursor = _seq if last_event_id is None or last_event_id > _seq else last_event_id
+    if last_event_id is not None:
+        STREAM_STATS["resumed"] += 1
+
+    _sub_ids += 1
+    sub_id = _sub_ids
+    sub = {"cursor": cursor, "sent": 0, "dropped": 0, "since": time.time()}
+    SUBSCRIBERS[sub_id] = sub
+    STREAM_STATS["connected_total"] += 1
 
     async def generator():
         try:
-            while True:
-                if await request.is_disconnected():
-                    break
-                async for chunk in _event_stream(q):
-                    yield chunk
+            async for chunk in _event_stream(request, sub):
+                yield chunk
         finally:
-            SUBSCRIBERS.discard(q)
-
-    return StreamingResponse(generator(), media_type="text/event-stream")
+            SUBSCRIBERS.pop(sub_id, None)
 
+    return StreamingResponse(
+        generator(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,63 @@
+# FILE: backend/app/routers/import_jobs.py
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db, require_user
+from ..services import import_jobs
+from ..services.rbac_service import get_permissions
+
+router = APIRouter(prefix="/import-jobs", tags=["import-jobs"])
+
+
+@router.on_event("startup")
+async def _start_workers():
+    await import_jobs.start()
+
+
+@router.on_event("shutdown")
+async def _stop_workers():
+    await import_jobs.stop()
+
+
+async def _require_kind_perm(db: AsyncSession, user, kind: str) -> None:
+    k = import_jobs.KINDS.get(kind)
+    if k is None:
+        raise HTTPException(400, f"kind ต้องเป็นหนึ่งใน {sorted(import_jobs.KINDS)}")
+    if k.perm not in await get_permissions(db, user.id):
+        raise HTTPException(403, "Forbidden")
+
+
+@router.post("", status_code=202)
+async def create_import_job(
+    kind: str = Form(..., description="quote_catalog | products"),
+    mode: str = Form("upsert"),   # upsert | replace (replace ใช้ได้กับ quote_catalog)
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_user),
+):
+    """
+    รับไฟล์แล้วคืน job id ทันที — งานจริงทำใน background worker
+    ติดตามผลที่ GET /import-jobs/{id}
+    """
+    await _require_kind_perm(db, user, kind)
+    if mode not in ("upsert", "replace"):
+        raise HTTPException(400, "mode ต้องเป็น upsert หรือ replace")
+    content = await file.read()
+    if not content:
+        raise HTTPException(400, "ไฟล์ว่าง")
+    job_id = await import_jobs.submit(
+        db, kind, file_name=file.filename or "upload", content=content, mode=mode, user_id=user.id,
+    )
+    return {"ok": True, "job_id": job_id, "status": "PENDING"}
+
+
+@router.get("/{job_id}")
+async def get_import_job(job_id: int, db: AsyncSession = Depends(get_db), user=Depends(require_user)):
+    job = await import_jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(404, "not found")
+    if job["requested_by"] != user.id and "import:data" not in await get_permissions(db, user.id):
+        raise HTTPException(404, "not found")
+    return job
@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..schemas.inventory import ReceiveIn, ReceiveOut, IssueIn, IssueOut
 from ..services.inventory_service import receive as svc_receive, issue as svc_issue
 from ..deps import get_db
+from ..services.dashboard_cache import STOCK, invalidate as invalidate_dashboard
 
 router = APIRouter(prefix="/inventory", tags=["inventory"])
 
@@ -23,6 +24,7 @@ async def receive_stock(payload: ReceiveIn):
             ref=payload.ref,
             lot=payload.lot,
         )
+        invalidate_dashboard(STOCK)
         return ReceiveOut(**result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -36,6 +38,7 @@ async def issue_stock(payload: IssueIn):
             qty=float(payload.qty),
             ref=payload.ref,
         )
+        invalidate_dashboard(STOCK)
         return IssueOut(**result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
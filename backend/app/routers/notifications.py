@@ -0,0 +1,76 @@
+# FILE: backend/app/routers/notifications.py
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db, require_perm as RP
+from ..services import notif_dispatcher
+from ..services.notif_dispatcher import RuleTargetNotFound
+
+router = APIRouter(prefix="/notifications", tags=["notifications"])
+
+
+@router.on_event("startup")
+async def _start_dispatcher():
+    await notif_dispatcher.start()
+
+
+@router.on_event("shutdown")
+async def _stop_dispatcher():
+    await notif_dispatcher.stop()
+
+
+class LowStockRuleIn(BaseModel):
+    sku: str
+    wh_code: Optional[str] = None          # ไม่ระบุ = ยอดรวมทุกคลัง
+    threshold: float = Field(0, ge=0)      # แจ้งเมื่อ available (on_hand - reserved) <= threshold
+    channel: str = "INAPP"                 # INAPP | WEBHOOK
+    webhook_url: Optional[str] = None      # http(s)://... หรือ inproc://<ชื่อ> สำหรับทดสอบ
+
+
+@router.get("")
+async def list_notifications(
+    db: AsyncSession = Depends(get_db),
+    user=Depends(RP("products:read")),
+    status: Optional[str] = Query(None, pattern="^(PENDING|SENDING|SENT|FAILED)$"),
+    after_id: Optional[int] = Query(None, description="คืนเฉพาะรายการที่ id มากกว่านี้ (poll แบบเบา)"),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """แจ้งเตือนล่าสุด (LOW_STOCK ฯลฯ) — ใช้แทนการ poll /dashboard/stock เพื่อดูของหมด"""
+    return await notif_dispatcher.feed(db, status=status, after_id=after_id, limit=limit)
+
+
+@router.post("/rules/low-stock", status_code=201)
+async def create_low_stock_rule(
+    body: LowStockRuleIn,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(RP("stock:adjust")),
+):
+    # EMAIL: ยังไม่มีตัวส่ง — รับไว้จะแค่ retry จนครบแล้ว FAILED
+    if body.channel not in ("INAPP", "WEBHOOK"):
+        raise HTTPException(400, "channel ต้องเป็น INAPP หรือ WEBHOOK")
+    if body.channel == "WEBHOOK" and not body.webhook_url:
+        raise HTTPException(400, "WEBHOOK ต้องระบุ webhook_url")
+    try:
+        return await notif_dispatcher.create_low_stock_rule(
+            db, sku=body.sku.strip(), wh_code=(body.wh_code or "").strip() or None,
+            threshold=body.threshold, channel=body.channel, webhook_url=body.webhook_url, owner_id=user.id,
+        )
+    except RuleTargetNotFound as e:
+        raise HTTPException(400, str(e))
+
+
+@router.post("/dispatch")
+async def dispatch_now(user=Depends(RP("stock:adjust")), limit: int = Query(notif_dispatcher.BATCH, ge=1, le=1000)):
+    """ส่งคิวหนึ่งชุดทันที (ปกติ worker ทำเองทุก NOTIF_DISPATCH_SEC)"""
+    return await notif_dispatcher.dispatch_once(limit)
+
+
+@router.get("/inproc/{name}")
+async def inproc_inbox(name: str, user=Depends(RP("products:read"))):
+    """สิ่งที่ webhook inproc://<name> ได้รับ (ตัวแทน webhook ภายใน process สำหรับทดสอบ)"""
+    return list(notif_dispatcher.inproc_inbox.get(name, ()))
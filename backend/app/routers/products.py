@@ -22,8 +22,9 @@ from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import get_db, require_perm as RP, require_user
-from ..models import AuditLog
 from ..models import Product as ProductModel
+from ..services import audit_sink
+from ..services.dashboard_cache import PRODUCTS, invalidate as invalidate_dashboard
 
 router = APIRouter()  # prefix from main.py => /api/products
 
@@ -87,12 +88,9 @@ async def _log(
     detail: Optional[dict] = None,
 ):
     try:
-        db.add(
-            AuditLog(
-                actor_id=user_id, action=action, subject_id=subject_id, detail=detail or {}
-            )
+        await audit_sink.record(
+            db, action, actor_id=user_id, subject_id=subject_id, detail=detail or {}, commit=True
         )
-        await db.commit()
     except Exception:
         await db.rollback()
 
@@ -196,6 +194,7 @@ async def upsert_product_compat(
         )
         await db.commit()
         obj = await db.get(ProductModel, existing.id)
+        invalidate_dashboard(PRODUCTS)
         await _log(
             db,
             getattr(user, "id", None),
@@ -220,6 +219,7 @@ async def upsert_product_compat(
         db.add(obj)
         await db.commit()
         await db.refresh(obj)
+        invalidate_dashboard(PRODUCTS)
         await _log(
             db,
             getattr(user, "id", None),
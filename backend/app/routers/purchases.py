@@ -3,21 +3,23 @@ from __future__ import annotations
 
 import re
 import sqlalchemy as sa
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from uuid import UUID
-from datetime import datetime
-import zoneinfo
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import get_db, require_perm as RP
-from ..models import Product as ProductModel
+from ..services.dashboard_cache import DOCS, invalidate as invalidate_dashboard
+from ..services.documents_service import ProductsNotFound, insert_document, resolve_products, transition_with_moves
+from ..services.numbering import next_doc_number
+from ..services.pagination import invalidate_total, keyset_page, paginate
 
 router = APIRouter(prefix="/purchases", tags=["purchases"])
 
 TEAM_RE = re.compile(r"^[A-Z]{2,12}$")
 COMP_RE = re.compile(r"^[A-Z0-9]{2,8}$")
+TOTAL_KEY = "purchase_orders"   # cache key ของ total (list ไม่มี filter)
 
 
 # ===== Schemas =====
@@ -36,15 +38,6 @@ class POCreateIn(BaseModel):
 
 
 # ===== Helpers =====
-def _th_period():
-    tz = zoneinfo.ZoneInfo("Asia/Bangkok")
-    now = datetime.now(tz)
-    mm = f"{now.month:02d}"
-    yyyymm = f"{now.year:04d}{mm}"
-    yy_th = (now.year + 543) % 100
-    return mm, yyyymm, yy_th
-
-
 async def _resolve_team_code(db: AsyncSession, user, override: Optional[str]) -> str:
     if override:
         t = override.strip().upper()
@@ -67,26 +60,6 @@ async def _resolve_company_code(db: AsyncSession, user, override: Optional[str])
     return company or "SVS"
 
 
-async def _next_po_number(db: AsyncSession, company_code: str, team_code: str) -> str:
-    mm, period_yyyymm, yy_th = _th_period()
-
-    # ✅ ใช้ advisory lock (int4,int4) — เข้ากันได้แน่นอน
-    key = f"po|{company_code}|{team_code}|{period_yyyymm}"
-    await db.execute(sa.text("SELECT pg_advisory_xact_lock(hashtext(:k), 0)"), {"k": key})
-
-    res = await db.execute(sa.text("""
-        INSERT INTO po_numbering(company_code, team_code, period_yyyymm, last_seq)
-        VALUES (:c,:t,:p,1)
-        ON CONFLICT (company_code, team_code, period_yyyymm)
-        DO UPDATE SET last_seq = po_numbering.last_seq + 1
-        RETURNING last_seq
-    """), {"c": company_code, "t": team_code, "p": period_yyyymm})
-    seq = int(res.scalar_one())
-
-    # PO<TEAM><YY><MM><SEQ3>
-    return f"PO{team_code}{yy_th:02d}{mm}{seq:03d}"
-
-
 # ===== Routes =====
 @router.post("", dependencies=[Depends(RP("po:create"))])
 async def create_po(
@@ -97,52 +70,39 @@ async def create_po(
     if not payload.vendor or not payload.vendor.strip():
         raise HTTPException(status_code=400, detail="ต้องกรอกชื่อ Vendor")
 
+    # ตรวจสินค้าทั้งหมดก่อนออกเลข (เลขถูกจองแบบ commit ทันที — ไม่ให้เสียเลขเพราะสินค้าไม่ครบ)
+    try:
+        products = await resolve_products(db, (it.product_id for it in payload.items))
+    except ProductsNotFound as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # 🟡 หุ้มส่วน numbering เพื่อให้เห็นรายละเอียดถ้ายังมี error
     try:
         team_code    = await _resolve_team_code(db, user, payload.team_code)
         company_code = await _resolve_company_code(db, user, payload.company_code)
-        number       = await _next_po_number(db, company_code, team_code)
+        number       = await next_doc_number("PO", company_code, team_code)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"numbering_error: {type(e).__name__}: {e}")
 
-    await db.execute(sa.text("""
-        INSERT INTO purchase_orders(number,vendor,status,notes)
-        VALUES(:n,:v,'ordered',:no)
-    """), {"n": number, "v": payload.vendor.strip(), "no": payload.notes})
-    po_id = await db.scalar(sa.text("SELECT id FROM purchase_orders WHERE number=:n"), {"n": number})
-
-    # รายการ (ถ้ามี)
-    for it in payload.items:
-        prod = await db.get(ProductModel, it.product_id)
-        if not prod:
-            raise HTTPException(status_code=400, detail=f"product {it.product_id} not found")
-        await db.execute(sa.text("""
-            INSERT INTO purchase_order_items(po_id,product_id,sku,name,qty,price_ex_vat)
-            VALUES (:po,:pid,:sku,:name,:qty,:price)
-        """), {"po": po_id, "pid": it.product_id, "sku": prod.sku, "name": prod.name,
-               "qty": it.qty, "price": it.price_ex_vat})
+    doc = await insert_document(
+        db, "purchase_orders",
+        {"number": number, "vendor": payload.vendor.strip(), "status": "ordered", "notes": payload.notes},
+        payload.items, products,   # รายการ (ถ้ามี) ใส่ใน statement เดียวกับหัวเอกสาร
+    )
 
     await db.commit()
-    return {"id": str(po_id), "number": number, "status": "ordered"}
+    invalidate_total(TOTAL_KEY)
+    invalidate_dashboard(DOCS)
+    return {"id": str(doc["id"]), "number": doc["number"], "status": doc["status"]}
 
 
 @router.post("/{po_id}/receive", dependencies=[Depends(RP("po:receive"))])
 async def receive_po(po_id: UUID, db: AsyncSession = Depends(get_db), note: str = "PO receive"):
-    h = await db.execute(sa.text("SELECT * FROM purchase_orders WHERE id=:id"), {"id": po_id})
-    head = h.mappings().first()
-    if not head:
+    res = await transition_with_moves(db, "po", po_id, note)
+    if res is None:
         raise HTTPException(status_code=404, detail="not found")
-    if head["status"] == "received":
-        return {"ok": True, "status": head["status"], "stock_moves": []}
-
-    its = await db.execute(sa.text("SELECT sku, name, qty FROM purchase_order_items WHERE po_id=:id"), {"id": po_id})
-    items = [dict(r) for r in its.mappings().all()]
-
-    await db.execute(sa.text("UPDATE purchase_orders SET status='received' WHERE id=:id"), {"id": po_id})
     await db.commit()
-
-    moves = [{"sku": it["sku"], "qty": float(it["qty"]), "note": f"{head['number']} - {note}"} for it in items]
-    return {"ok": True, "status": "received", "stock_moves": moves}
+    return {"ok": True, **res}
 # ====== LIST/DETAIL (ใหม่) ======
 @router.get("", dependencies=[Depends(RP("po:read"))])
 async def list_pos(
@@ -150,22 +110,30 @@ async def list_pos(
     q: Optional[str] = None,
     page: int = 1,
     per_page: int = 20,
+    total: str = Query("exact", description="exact | estimate | none"),
+    cursor: Optional[str] = Query(None, description="keyset: ส่ง next_cursor จากหน้าก่อน (ว่าง = หน้าแรก)"),
 ):
+    if cursor is not None:
+        # infinite scroll: keyset บน (created_at, id) แทน OFFSET
+        try:
+            return await keyset_page(
+                db, columns="id, number, vendor, status, created_at", table="purchase_orders",
+                where="(vendor ILIKE :qq OR number ILIKE :qq)" if q else None,
+                params={"qq": f"%{q}%"} if q else {},
+                cursor=cursor, per_page=per_page,
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
     where = "WHERE (vendor ILIKE :qq OR number ILIKE :qq)" if q else ""
-    params = ({"qq": f"%{q}%"} if q else {}) | {"off": (page-1)*per_page, "lim": per_page}
-
-    total = await db.scalar(sa.text(f"SELECT COUNT(*) FROM purchase_orders {where}"), {"qq": f"%{q}%"} if q else {})
-    rows = await db.execute(sa.text(f"""
-        SELECT id, number, vendor, status, created_at
-        FROM purchase_orders
-        {where}
-        ORDER BY created_at DESC
-        OFFSET :off LIMIT :lim
-    """), params)
-    return {
-        "items": [dict(r) for r in rows.mappings().all()],
-        "total": int(total or 0), "page": page, "per_page": per_page
-    }
+    return await paginate(
+        db,
+        columns="id, number, vendor, status, created_at",
+        from_where=f"FROM purchase_orders {where}",
+        order_by="created_at DESC, id DESC",
+        params={"qq": f"%{q}%"} if q else {},
+        page=page, per_page=per_page, total=total,
+        cache_key=None if q else TOTAL_KEY,
+    )
 
 @router.get("/{po_id}", dependencies=[Depends(RP("po:read"))])
 async def get_po(po_id: UUID, db: AsyncSession = Depends(get_db)):
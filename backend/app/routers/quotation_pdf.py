@@ -0,0 +1,65 @@
+# FILE: backend/app/routers/quotation_pdf.py
+from __future__ import annotations
+
+import asyncio
+from typing import List
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db, require_user
+from ..services.quotation_pdf import MAX_BATCH, PdfUnavailable, build_zip, pdf_service, safe_filename
+
+router = APIRouter(prefix="/sales/quotations", tags=["sales-quotations"])
+
+
+@router.on_event("shutdown")
+async def _stop_pool():
+    pdf_service.shutdown()
+
+
+class PdfBatchIn(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1)
+
+
+@router.get("/pdf/cache-stats")
+async def pdf_cache_stats(user=Depends(require_user)):
+    return pdf_service.snapshot()
+
+
+@router.post("/pdf/batch")
+async def quotations_pdf_batch(body: PdfBatchIn, db: AsyncSession = Depends(get_db), user=Depends(require_user)):
+    """หลายใบใน zip เดียว (render พร้อมกันใน process pool; ใบที่เคย render และไม่ถูกแก้ใช้จาก cache)"""
+    if len(body.ids) > MAX_BATCH:
+        raise HTTPException(400, f"ไม่เกิน {MAX_BATCH} ใบต่อครั้ง")
+    try:
+        pdfs, missing = await pdf_service.render_many(db, body.ids)
+    except PdfUnavailable as e:
+        raise HTTPException(503, str(e))
+    if not pdfs:
+        raise HTTPException(404, "Not found")
+    data = await asyncio.to_thread(build_zip, pdfs)
+    headers = {"Content-Disposition": 'attachment; filename="quotations.zip"'}
+    if missing:
+        headers["X-Missing-Ids"] = ",".join(missing)
+    return Response(content=data, media_type="application/zip", headers=headers)
+
+
+@router.get("/{qid}/pdf")
+async def quotation_pdf(qid: UUID, db: AsyncSession = Depends(get_db), user=Depends(require_user)):
+    try:
+        pdf = await pdf_service.render(db, qid)
+    except PdfUnavailable as e:
+        raise HTTPException(503, str(e))
+    if pdf is None:
+        raise HTTPException(404, "Not found")
+    return Response(
+        content=pdf.data,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'inline; filename="{safe_filename(pdf.number)}.pdf"',
+            "ETag": f'"{pdf.content_hash}"',
+        },
+    )
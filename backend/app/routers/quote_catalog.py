@@ -1,15 +1,17 @@
 # FILE: backend/app/routers/quote_catalog.py
 from __future__ import annotations
 
-import io, csv
 import sqlalchemy as sa
-from decimal import Decimal
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
 from pydantic import BaseModel, Field
 from typing import Optional
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..deps import get_db, require_perm as RP
+from ..deps import get_db, require_user, require_perm as RP
+from ..services import import_jobs
+from ..services.catalog_suggest import SUGGEST_FIELDS, suggest_index
+from ..services.pagination import paginate
+from ..services.quote_catalog_service import TOTAL_KEY, bulk_upsert_catalog, catalog_changed, parse_catalog_file
 
 router = APIRouter(prefix="/sales/quote-catalog", tags=["quote-catalog"])
 
@@ -31,43 +33,31 @@ async def list_catalog(
     q: Optional[str] = Query(None, description="ค้นหาใน part_no/description/sku/cas_no"),
     page: int = 1,
     per_page: int = 20,
+    total: str = Query("exact", description="exact | estimate | none"),
 ):
-    # normalize page/per_page
-    page = max(1, int(page or 1))
-    per_page = max(1, min(200, int(per_page or 20)))
-
-    conds = []; params = {"off": (page-1)*per_page, "lim": per_page}
+    conds = []; params = {}
     if q:
         conds.append("(part_no ILIKE :qq OR description ILIKE :qq OR sku ILIKE :qq OR cas_no ILIKE :qq)")
         params["qq"] = f"%{q}%"
     where = ("WHERE " + " AND ".join(conds)) if conds else ""
 
-    total = await db.scalar(sa.text(f"SELECT COUNT(*) FROM quote_catalog {where}"), params)
-    rows = await db.execute(sa.text(f"""
-      SELECT id, sku, part_no, description, cas_no, package_label, warn_text, default_price_ex_vat
-      FROM quote_catalog {where}
-      ORDER BY part_no, COALESCE(package_label,'')
-      OFFSET :off LIMIT :lim
-    """), params)
-    return {
-        "items": [dict(r) for r in rows.mappings().all()],
-        "total": int(total or 0),
-        "page": page,
-        "per_page": per_page
-    }
+    return await paginate(
+        db,
+        columns="id, sku, part_no, description, cas_no, package_label, warn_text, default_price_ex_vat",
+        from_where=f"FROM quote_catalog {where}",
+        order_by="part_no, COALESCE(package_label,'')",
+        params=params, page=page, per_page=per_page, total=total,
+        cache_key=None if conds else TOTAL_KEY,
+    )
 
 @router.get("/suggest/{field}", dependencies=[Depends(RP("quote:read"))])
 async def suggest_field(field: str, db: AsyncSession = Depends(get_db), q: Optional[str] = None, limit: int = 10):
-    allowed = {"part_no","description","cas_no","package_label","warn_text","sku"}
-    if field not in allowed:
+    # ตอบจาก vocabulary ในหน่วยความจำ (prefix ด้วย bisect → substring/trigram) — ดู services/catalog_suggest.py
+    if field not in SUGGEST_FIELDS:
         raise HTTPException(400, "field not allowed")
-    if q:
-        sql = sa.text(f"SELECT DISTINCT {field} AS v FROM quote_catalog WHERE {field} ILIKE :qq ORDER BY v NULLS LAST LIMIT :lim")
-        rows = await db.execute(sql, {"qq": f"%{q}%", "lim": limit})
-    else:
-        sql = sa.text(f"SELECT DISTINCT {field} AS v FROM quote_catalog ORDER BY v NULLS LAST LIMIT :lim")
-        rows = await db.execute(sql, {"lim": limit})
-    return [r["v"] for r in rows.mappings().all() if r["v"]]
+    limit = max(1, min(50, int(limit or 10)))
+    await suggest_index.ensure(db)
+    return suggest_index.search(field, q, limit)
 
 @router.get("/{cid}", dependencies=[Depends(RP("quote:read"))])
 async def get_catalog(cid: UUID, db: AsyncSession = Depends(get_db)):
@@ -96,6 +86,7 @@ async def create_catalog(payload: CatalogUpsertIn, db: AsyncSession = Depends(ge
     })
     cid = r.scalar_one()
     await db.commit()
+    catalog_changed()
     return {"ok": True, "id": str(cid)}
 
 @router.put("/{cid}", dependencies=[Depends(RP("quote:update"))])
@@ -114,158 +105,54 @@ async def update_catalog(cid: UUID, payload: CatalogUpsertIn, db: AsyncSession =
       "price": payload.default_price_ex_vat,
     })
     await db.commit()
+    catalog_changed()
     return {"ok": True}
 
 @router.delete("/{cid}", dependencies=[Depends(RP("quote:update"))])
 async def delete_catalog(cid: UUID, db: AsyncSession = Depends(get_db)):
     await db.execute(sa.text("DELETE FROM quote_catalog WHERE id=:id"), {"id": str(cid)})
     await db.commit()
+    catalog_changed()
     return {"ok": True}
 
-# ===== Import helpers =====
-def _norm(s: str | None) -> str | None:
-    if s is None: return None
-    s = str(s).strip()
-    return s or None
-
-def _num(v) -> float | None:
-    if v is None: return None
-    s = str(v).replace(",", "").strip()
-    if s == "": return None
-    try:
-        return float(Decimal(s))
-    except Exception:
-        return None
-
-_HEADER_MAP = {
-    "part_no": {"part no", "partno", "รหัสสินค้า", "รหัส", "itemcode"},
-    "description": {"description", "descriptions", "รายละเอียด", "ชื่อสินค้า"},
-    "cas_no": {"cas", "cas no", "casno", "เลขcas", "casเลขที่"},
-    "package_label": {"package", "pack", "ขนาดบรรจุ", "หน่วย", "unit"},
-    "warn_text": {"warn", "หมายเหตุ", "note", "warning"},
-    "default_price_ex_vat": {"unit price", "price", "ราคาต่อหน่วย", "ราคา/หน่วย"},
-    "sku": {"sku", "รหัสสต็อก"},
-}
-def _key_of(col: str) -> str | None:
-    c = col.lower().strip().replace(".", "").replace("_", " ")
-    for k, names in _HEADER_MAP.items():
-        if c in names: return k
-    return None
-
-def _parse_csv_catalog(file_bytes: bytes) -> list[dict]:
-    text = file_bytes.decode("utf-8-sig", errors="ignore")
-    rdr = csv.reader(io.StringIO(text))
-    rows = list(rdr)
-    if not rows: return []
-    head = rows[0]
-    pos: dict[str, int] = {}
-    for i, h in enumerate(head):
-        key = _key_of(h or "")
-        if key: pos[key] = i
-    out: list[dict] = []
-    for r in rows[1:]:
-        if not any(r): continue
-        def get(k):
-            i = pos.get(k)
-            return r[i].strip() if i is not None and i < len(r) and r[i] is not None else None
-        out.append({
-            "sku": _norm(get("sku")),
-            "part_no": _norm(get("part_no")),
-            "description": _norm(get("description")),
-            "cas_no": _norm(get("cas_no")),
-            "package_label": _norm(get("package_label")),
-            "warn_text": _norm(get("warn_text")),
-            "default_price_ex_vat": _num(get("default_price_ex_vat")),
-        })
-    return out
-
-def _parse_xlsx_catalog(file_bytes: bytes) -> list[dict]:
-    try:
-        import openpyxl  # lazy import
-    except Exception as e:
-        raise HTTPException(400, f"ต้องติดตั้ง openpyxl สำหรับ .xlsx: {e}")
-    wb = openpyxl.load_workbook(io.BytesIO(file_bytes), data_only=True)
-    ws = wb.active
-    rows = list(ws.iter_rows(values_only=True))
-    if not rows: return []
-    head = [str(c or "") for c in rows[0]]
-    pos: dict[str, int] = {}
-    for i, h in enumerate(head):
-        key = _key_of(h or "")
-        if key: pos[key] = i
-    out: list[dict] = []
-    for r in rows[1:]:
-        if r is None: continue
-        cells = [str(c) if c is not None else "" for c in r]
-        if not any(cells): continue
-        def get(k):
-            i = pos.get(k)
-            return (cells[i].strip() if i is not None and i < len(cells) else None)
-        out.append({
-            "sku": _norm(get("sku")),
-            "part_no": _norm(get("part_no")),
-            "description": _norm(get("description")),
-            "cas_no": _norm(get("cas_no")),
-            "package_label": _norm(get("package_label")),
-            "warn_text": _norm(get("warn_text")),
-            "default_price_ex_vat": _num(get("default_price_ex_vat")),
-        })
-    return out
-
 @router.post("/import", dependencies=[Depends(RP("quote:update"))])
 async def import_quote_catalog(
     file: UploadFile = File(..., description="ไฟล์ .xlsx หรือ .csv"),
     mode: str = Form("upsert"),   # upsert | replace
+    background: bool = Form(False),  # true = คืน job id ทันที แล้วทำใน background
     db: AsyncSession = Depends(get_db),
+    user=Depends(require_user),
 ):
     """
     นำเข้าข้อมูลฐานแคตตาล็อก (part_no, description, cas_no, package_label, warn_text, default_price_ex_vat, sku)
     - mode=upsert (ค่าเริ่มต้น): แก้/เพิ่มตาม (part_no, COALESCE(package_label,''))
     - mode=replace: ลบทั้งหมดก่อน แล้วค่อยเพิ่ม
+    ใช้ COPY ลง staging + merge ชุดเดียว (ดู services/quote_catalog_service.py)
+    คืนค่า inserted/updated/skipped (skipped = แถวที่ไม่มีทั้ง part_no และ description)
+    - background=true: ไฟล์ใหญ่ (กัน proxy timeout) → คืน job_id แล้ว poll ที่ GET /import-jobs/{id}
     """
+    if mode not in ("upsert", "replace"):
+        raise HTTPException(400, "mode ต้องเป็น upsert หรือ replace")
     content = await file.read()
-    name = (file.filename or "").lower()
-    if name.endswith(".csv"):
-        items = _parse_csv_catalog(content)
-    elif name.endswith(".xlsx"):
-        items = _parse_xlsx_catalog(content)
-    else:
-        raise HTTPException(400, "รองรับเฉพาะ .csv หรือ .xlsx")
+    if background:
+        if not (file.filename or "").lower().endswith((".csv", ".xlsx")):
+            raise HTTPException(400, "รองรับเฉพาะ .csv หรือ .xlsx")
+        job_id = await import_jobs.submit(
+            db, "quote_catalog", file_name=file.filename or "", content=content, mode=mode, user_id=user.id,
+        )
+        return {"ok": True, "job_id": job_id, "status": "PENDING", "mode": mode}
+    try:
+        items = parse_catalog_file(file.filename or "", content)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
     if not items:
-        return {"ok": True, "inserted": 0, "mode": mode}
-
-    if mode not in ("upsert", "replace"):
-        raise HTTPException(400, "mode ต้องเป็น upsert หรือ replace")
+        return {"ok": True, "inserted": 0, "updated": 0, "skipped": 0, "mode": mode}
 
     if mode == "replace":
         await db.execute(sa.text("TRUNCATE quote_catalog RESTART IDENTITY"))
 
-    inserted = 0
-    for it in items:
-        if not it.get("part_no") and not it.get("description"):
-            continue
-        await db.execute(sa.text("""
-            INSERT INTO quote_catalog (sku, part_no, description, cas_no, package_label, warn_text, default_price_ex_vat)
-            VALUES (:sku, :part_no, :description, :cas_no, :package_label, :warn_text, :price)
-            ON CONFLICT (part_no, COALESCE(package_label,'')) DO UPDATE
-            SET sku=COALESCE(EXCLUDED.sku, quote_catalog.sku),
-                description=COALESCE(EXCLUDED.description, quote_catalog.description),
-                cas_no=COALESCE(EXCLUDED.cas_no, quote_catalog.cas_no),
-                package_label=COALESCE(EXCLUDED.package_label, quote_catalog.package_label),
-                warn_text=COALESCE(EXCLUDED.warn_text, quote_catalog.warn_text),
-                default_price_ex_vat=COALESCE(EXCLUDED.default_price_ex_vat, quote_catalog.default_price_ex_vat)
-        """), {
-            "sku": it.get("sku"),
-            "part_no": it.get("part_no"),
-            "description": it.get("description"),
-            "cas_no": it.get("cas_no"),
-            "package_label": it.get("package_label"),
-            "warn_text": it.get("warn_text"),
-            "price": it.get("default_price_ex_vat"),
-        })
-        inserted += 1
-
+    counts = await bulk_upsert_catalog(db, items)
     await db.commit()
-    return {"ok": True, "inserted": inserted, "mode": mode}
-
+    catalog_changed()
+    return {"ok": True, **counts, "mode": mode}
@@ -1,27 +1,103 @@
+import asyncio
+import logging
+import re
+import zoneinfo
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete, text, func
+from sqlalchemy import select, insert, update, delete, text, func, bindparam
 from uuid import UUID
-from typing import Optional, List, Any, Dict
-from app.db import get_db
-from app.dependencies.auth import get_current_user  # ใช้ user.id
+from typing import Optional, Any, Dict
+from ..database import engine
+from ..deps import get_db, require_user  # ใช้ user.id
 # ตารางคุณมีชื่อ "quotations" / "quotation_items" ตามเดิม
-from sqlalchemy import Table, MetaData
+from sqlalchemy import MetaData
+from ..services.dashboard_cache import DOCS, invalidate as invalidate_dashboard
+from ..services.documents_service import insert_document
+from ..services.pagination import invalidate_total, paginate_select
+from ..services.quotation_items import ItemLineError, QuotationItemsWriter
+
+log = logging.getLogger("uvicorn.error")
 
 router = APIRouter(prefix="/sales/quotations", tags=["sales-quotations"])
-md = MetaData()
+TOTAL_KEY = "quotations"   # cache key ของ total (list ไม่มี filter)
+_TZ = zoneinfo.ZoneInfo("Asia/Bangkok")
+
+
+def _as_ts(v: Optional[str], name: str) -> Optional[datetime]:
+    """'YYYY-MM-DD' หรือ ISO datetime → datetime มี timezone (ไม่ระบุ = เวลาไทย) ให้ asyncpg bind กับ timestamptz ได้"""
+    if not v:
+        return None
+    try:
+        dt = datetime.fromisoformat(v.strip())
+    except ValueError:
+        raise HTTPException(400, f"{name} must be YYYY-MM-DD or ISO datetime")
+    return dt if dt.tzinfo else dt.replace(tzinfo=_TZ)
+
+# คอลัมน์จริงอยู่ใน DB (มีมากกว่า db/init) → reflect; sales_reps ไม่มีก็ได้
+QUOTE_TABLES = ("quotations", "quotation_items", "team_codes", "company_codes", "sales_reps")
+
+
+class _Schema:
+    """ตารางที่ reflect แล้ว + statement ที่สร้างครั้งเดียว (ค่าเปลี่ยนผ่าน bindparam → ใช้ compiled cache ซ้ำ)"""
+
+    def __init__(self, md: MetaData):
+        missing = [t for t in QUOTE_TABLES[:4] if t not in md.tables]
+        if missing:
+            raise RuntimeError(f"missing tables: {', '.join(missing)}")
+        q = self.quotations = md.tables["quotations"]
+        qi = self.quotation_items = md.tables["quotation_items"]
+        tc = self.team_codes = md.tables["team_codes"]
+        cc = self.company_codes = md.tables["company_codes"]
+        rep = self.sales_reps = md.tables.get("sales_reps")
+
+        self.list_base = select(q).order_by(q.c.created_at.desc(), q.c.id.desc())
+        self.sel_head = select(q).where(q.c.id == bindparam("qid"))
+        self.sel_items = select(qi).where(qi.c.quotation_id == bindparam("qid"))
+        self.count_items = select(func.count()).select_from(qi).where(qi.c.quotation_id == bindparam("qid"))
+        self.sel_team = select(tc.c.team_code).where(tc.c.user_id == bindparam("uid"))
+        self.sel_company = select(cc.c.company_code).where(cc.c.user_id == bindparam("uid"))
+        self.sel_rep = select(rep).where(rep.c.user_id == bindparam("uid")) if rep is not None else None
+        self.next_number = text("SELECT next_quote_number(:cc,:tc)")
+        self.set_status = update(q).where(q.c.id == bindparam("qid")).values(status=bindparam("new_status"))
+        self.ins_item = insert(qi)
+        self.items = QuotationItemsWriter(qi)
+        self.lock_head = select(q.c.id).where(q.c.id == bindparam("qid")).with_for_update()
+        self.del_item = delete(qi).where(qi.c.id == bindparam("iid"), qi.c.quotation_id == bindparam("qid"))
+
+
+_schema: Optional[_Schema] = None
+_schema_lock = asyncio.Lock()
+
 
-quotations = Table("quotations", md, autoload_with=None)       # ใช้ reflection runtime
-quotation_items = Table("quotation_items", md, autoload_with=None)
-team_codes = Table("team_codes", md, autoload_with=None)
-company_codes = Table("company_codes", md, autoload_with=None)
-sales_reps = Table("sales_reps", md, autoload_with=None)
+async def load_schema() -> _Schema:
+    """reflect ครั้งแรกครั้งเดียวต่อ process (ปกติที่ startup) — request ถัดไปได้ค่าที่ cache ไว้"""
+    global _schema
+    if _schema is None:
+        async with _schema_lock:
+            if _schema is None:
+                md = MetaData()
+                async with engine.connect() as conn:
+                    await conn.run_sync(md.reflect, only=lambda name, _md: name in QUOTE_TABLES)
+                _schema = _Schema(md)
+    return _schema
+
+
+async def get_schema() -> _Schema:
+    try:
+        return await load_schema()
+    except Exception as e:
+        raise HTTPException(503, f"quotation schema unavailable: {type(e).__name__}: {e}")
+
+
+@router.on_event("startup")
+async def _reflect_on_startup():
+    try:
+        await load_schema()
+    except Exception as e:
+        # DB ยังไม่พร้อม → ลองใหม่ตอน request แรก
+        log.warning("sales_quotations: reflect deferred (%s: %s)", type(e).__name__, e)
 
-async def reflect(md: MetaData, db: AsyncSession):
-    if not quotations.metadata.bind:
-        engine = db.get_bind()
-        md.bind = engine
-        md.reflect(only=["quotations","quotation_items","team_codes","company_codes","sales_reps"])
 
 @router.get("", response_model=dict)
 async def list_q(
@@ -32,33 +108,44 @@ async def list_q(
     date_to: Optional[str] = None,
     page: int = 1,
     page_size: int = 20,
+    total: str = Query("exact", description="exact | estimate | none"),
     db: AsyncSession = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(require_user),
+    S: _Schema = Depends(get_schema),
 ):
-    await reflect(md, db)
-    stmt = select(quotations).order_by(quotations.c.created_at.desc())
+    quotations = S.quotations
+    stmt = S.list_base
+    df, dt = _as_ts(date_from, "date_from"), _as_ts(date_to, "date_to")
     if q:
         like = f"%{q}%"
         stmt = stmt.where((quotations.c.number.ilike(like)) | (quotations.c.customer.ilike(like)))
     if status:
         stmt = stmt.where(quotations.c.status == status)
-    if date_from:
-        stmt = stmt.where(quotations.c.created_at >= text(":df")).params(df=date_from)
-    if date_to:
-        stmt = stmt.where(quotations.c.created_at < text(":dt") ).params(dt=date_to)
+    if df:
+        stmt = stmt.where(quotations.c.created_at >= df)
+    if dt:
+        stmt = stmt.where(quotations.c.created_at < dt)
     if team_code:
-        stmt = stmt.where(text(":tc = substring(quotations.number from 2 for 3)")).params(tc=team_code)
+        team_code = team_code.strip().upper()
+        if "team_code" in quotations.c:
+            # index (team_code, created_at DESC, id DESC) → range scan ตามลำดับที่แสดง
+            stmt = stmt.where(quotations.c.team_code == team_code)
+        else:
+            # ยังไม่ได้รัน migration quotations_team_code
+            stmt = stmt.where(quotations.c.number.regexp_match(f"^Q{re.escape(team_code)}[0-9]"))
 
-    total = (await db.execute(select(func.count()).select_from(stmt.subquery()))).scalar()
-    rows = (await db.execute(stmt.offset((page-1)*page_size).limit(page_size))).mappings().all()
-    return {"items":[dict(r) for r in rows], "total": total, "page": page, "page_size": page_size}
+    filtered = any((q, status, date_from, date_to, team_code))
+    res = await paginate_select(db, stmt, page=page, per_page=page_size, total=total,
+                                cache_key=None if filtered else TOTAL_KEY)
+    res["page_size"] = res.pop("per_page")
+    return res
 
 @router.get("/{qid}", response_model=dict)
-async def get_q(qid: UUID, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    await reflect(md, db)
-    row = (await db.execute(select(quotations).where(quotations.c.id==qid))).mappings().first()
+async def get_q(qid: UUID, db: AsyncSession = Depends(get_db), user=Depends(require_user),
+                S: _Schema = Depends(get_schema)):
+    row = (await db.execute(S.sel_head, {"qid": qid})).mappings().first()
     if not row: raise HTTPException(404, "Not found")
-    items = (await db.execute(select(quotation_items).where(quotation_items.c.quotation_id==qid))).mappings().all()
+    items = (await db.execute(S.sel_items, {"qid": qid})).mappings().all()
     out = dict(row); out["items"] = [dict(i) for i in items]
     return out
 
@@ -66,91 +153,87 @@ async def get_q(qid: UUID, db: AsyncSession = Depends(get_db), user=Depends(get_
 async def create_q(
     payload: Dict[str, Any] = Body(...),  # {customer, notes, items:[{sku,name,qty,price_ex_vat,...}]}
     db: AsyncSession = Depends(get_db),
-    user=Depends(get_current_user),
+    user=Depends(require_user),
+    S: _Schema = Depends(get_schema),
 ):
-    await reflect(md, db)
+    items = payload.get("items", [])
     # หา team/company ของ user
-    tc = (await db.execute(select(team_codes.c.team_code).where(team_codes.c.user_id==user.id))).scalar()
-    cc = (await db.execute(select(company_codes.c.company_code).where(company_codes.c.user_id==user.id))).scalar()
+    tc = (await db.execute(S.sel_team, {"uid": str(user.id)})).scalar()
+    cc = (await db.execute(S.sel_company, {"uid": str(user.id)})).scalar()
     if not tc or not cc:
         raise HTTPException(400, "team_code / company_code not mapped for user")
 
     # ออกเลขเอกสาร
-    n_stmt = text("SELECT next_quote_number(:cc,:tc)")
-    number = (await db.execute(n_stmt, {"cc": cc, "tc": tc})).scalar()
+    number = (await db.execute(S.next_number, {"cc": cc, "tc": tc})).scalar()
     # snapshot ผู้ขาย
-    rep = (await db.execute(select(sales_reps).where(sales_reps.c.user_id==user.id))).mappings().first()
-
-    ins = quotations.insert().values(
-        number=number,
-        customer=payload.get("customer",""),
-        status="draft",
-        notes=payload.get("notes"),
-        vat_rate=payload.get("vat_rate", 0.07),  # หน่วยเดิมของคุณเป็น 0.07 = 7%
-        doc_discount_rate=payload.get("doc_discount_rate"),
-        doc_discount_amount=payload.get("doc_discount_amount"),
-        sales_user_id=user.id,
-        sales_name=(rep or {}).get("full_name"),
-        sales_phone=(rep or {}).get("phone"),
-        sales_email=(rep or {}).get("email"),
-    ).returning(quotations.c.id, quotations.c.number)
-    qrow = (await db.execute(ins)).first()
-    qid = qrow.id
-
-    # ใส่รายการ
-    items = payload.get("items", [])
-    for it in items:
-        await db.execute(quotation_items.insert().values(
-            quotation_id=qid,
-            product_id=it.get("product_id"),
-            sku=it["sku"],
-            name=it.get("name",""),
-            qty=it.get("qty",1),
-            price_ex_vat=it.get("price_ex_vat",0),
-            part_no=it.get("part_no"),
-            description=it.get("description"),
-            cas_no=it.get("cas_no"),
-            package_label=it.get("package_label"),
-            warn_text=it.get("warn_text"),
-            discount_rate=it.get("discount_rate"),
-            discount_amount=it.get("discount_amount"),
-            catalog_id=it.get("catalog_id"),
-        ))
+    rep = None
+    if S.sel_rep is not None:
+        rep = (await db.execute(S.sel_rep, {"uid": str(user.id)})).mappings().first()
+
+    header = {
+        "number": number,
+        "customer": payload.get("customer",""),
+        "status": "draft",
+        "notes": payload.get("notes"),
+        "vat_rate": payload.get("vat_rate", 0.07),  # หน่วยเดิมของคุณเป็น 0.07 = 7%
+        "doc_discount_rate": payload.get("doc_discount_rate"),
+        "doc_discount_amount": payload.get("doc_discount_amount"),
+        "sales_user_id": user.id,
+        "sales_name": (rep or {}).get("full_name"),
+        "sales_phone": (rep or {}).get("phone"),
+        "sales_email": (rep or {}).get("email"),
+    }
+    if "team_code" in S.quotations.c:
+        header["team_code"] = tc
+    qrow = await insert_document(db, "quotations", header)
+    qid = qrow["id"]
+
+    # ใส่รายการทั้งหมดใน INSERT เดียว
+    try:
+        await S.items.insert(db, qid, items)
+    except ItemLineError as e:
+        await db.rollback()
+        raise HTTPException(400, str(e))
     await db.commit()
+    invalidate_total(TOTAL_KEY)
+    invalidate_dashboard(DOCS)
 
-    return {"id": qid, "number": qrow.number, "status": "draft"}
+    return {"id": qid, "number": qrow["number"], "status": qrow["status"]}
 
 @router.patch("/{qid}", response_model=dict)
-async def update_head(qid: UUID, payload: Dict[str, Any], db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    await reflect(md, db)
+async def update_head(qid: UUID, payload: Dict[str, Any], db: AsyncSession = Depends(get_db), user=Depends(require_user),
+                      S: _Schema = Depends(get_schema)):
     fields = {k:v for k,v in payload.items() if k in ["customer","notes","vat_rate","doc_discount_rate","doc_discount_amount","expires_at"]}
     if not fields: return {"ok": True}
-    await db.execute(quotations.update().where(quotations.c.id==qid).values(**fields))
+    await db.execute(S.quotations.update().where(S.quotations.c.id==qid).values(**fields))
     await db.commit()
     return {"ok": True}
 
 @router.put("/{qid}/items", response_model=dict)
-async def replace_items(qid: UUID, payload: Dict[str, Any], db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    await reflect(md, db)
+async def replace_items(qid: UUID, payload: Dict[str, Any], db: AsyncSession = Depends(get_db), user=Depends(require_user),
+                        S: _Schema = Depends(get_schema)):
+    """
+    แทนที่รายการทั้งหมดด้วย items แต่เขียนเฉพาะส่วนที่ต่าง (จับคู่ด้วย id แล้ว catalog_id)
+    → insert / update / delete อย่างละ 1 statement; คืนผลต่อบรรทัด
+    """
     items = payload.get("items", [])
-    await db.execute(delete(quotation_items).where(quotation_items.c.quotation_id==qid))
-    for it in items:
-        await db.execute(quotation_items.insert().values(
-            quotation_id=qid,
-            sku=it["sku"], name=it.get("name",""),
-            qty=it.get("qty",1), price_ex_vat=it.get("price_ex_vat",0),
-            part_no=it.get("part_no"), description=it.get("description"),
-            cas_no=it.get("cas_no"), package_label=it.get("package_label"),
-            warn_text=it.get("warn_text"), discount_rate=it.get("discount_rate"),
-            discount_amount=it.get("discount_amount"), catalog_id=it.get("catalog_id"),
-        ))
+    if not isinstance(items, list):
+        raise HTTPException(400, "items ต้องเป็น list")
+    # lock หัวเอกสารกันแก้รายการพร้อมกัน
+    if (await db.execute(S.lock_head, {"qid": qid})).scalar() is None:
+        raise HTTPException(404, "Not found")
+    try:
+        res = await S.items.sync(db, qid, items)
+    except ItemLineError as e:
+        await db.rollback()
+        raise HTTPException(400, str(e))
     await db.commit()
-    return {"ok": True}
+    return {"ok": True, **res}
 
 @router.post("/{qid}/items", response_model=dict)
-async def add_item(qid: UUID, it: Dict[str, Any], db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    await reflect(md, db)
-    await db.execute(quotation_items.insert().values(
+async def add_item(qid: UUID, it: Dict[str, Any], db: AsyncSession = Depends(get_db), user=Depends(require_user),
+                   S: _Schema = Depends(get_schema)):
+    await db.execute(S.ins_item, dict(
         quotation_id=qid, sku=it["sku"], name=it.get("name",""),
         qty=it.get("qty",1), price_ex_vat=it.get("price_ex_vat",0)
     ))
@@ -158,26 +241,25 @@ async def add_item(qid: UUID, it: Dict[str, Any], db: AsyncSession = Depends(get
     return {"ok": True}
 
 @router.delete("/{qid}/items/{item_id}", response_model=dict)
-async def del_item(qid: UUID, item_id: UUID, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    await reflect(md, db)
-    await db.execute(delete(quotation_items).where(quotation_items.c.id==item_id, quotation_items.c.quotation_id==qid))
+async def del_item(qid: UUID, item_id: UUID, db: AsyncSession = Depends(get_db), user=Depends(require_user),
+                   S: _Schema = Depends(get_schema)):
+    await db.execute(S.del_item, {"iid": item_id, "qid": qid})
     await db.commit()
     return {"ok": True}
 
 @router.post("/{qid}/status", response_model=dict)
-async def set_status(qid: UUID, payload: Dict[str,str], db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    await reflect(md, db)
+async def set_status(qid: UUID, payload: Dict[str,str], db: AsyncSession = Depends(get_db), user=Depends(require_user),
+                     S: _Schema = Depends(get_schema)):
     new_status = payload.get("status")
     if new_status not in ["draft","sent","accepted","declined","cancelled","expired"]:
         raise HTTPException(400, "invalid status")
     # guard: ต้องมีรายการอย่างน้อยเมื่อ sent/accepted
     if new_status in ["sent","accepted"]:
-        cnt = (await db.execute(select(func.count()).select_from(quotation_items).where(quotation_items.c.quotation_id==qid))).scalar()
+        cnt = (await db.execute(S.count_items, {"qid": qid})).scalar()
         if not cnt: raise HTTPException(400, "no items")
-    await db.execute(quotations.update().where(quotations.c.id==qid).values(status=new_status))
+    await db.execute(S.set_status, {"qid": qid, "new_status": new_status})
     await db.commit()
     return {"ok": True}
 
 # หมายเหตุ: POST /{qid}/to-so จะคืน payload stock_moves ไปยัง /inventory/issue
 # (จงผูกกับ service ฝั่งคุณต่อ)
-
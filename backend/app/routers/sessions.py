@@ -7,12 +7,13 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, update
 
 from ..database import get_session
 from ..deps import require_user
 from ..security.jwtauth import get_current_user_and_sid
-from ..models import Session as SessionModel, AuditLog
+from ..models import Session as SessionModel
+from ..services import audit_sink
 from ..schemas.session import SessionOut, RevokeCountOut
 
 router = APIRouter(prefix="/auth/sessions", tags=["auth"])
@@ -78,9 +79,7 @@ async def revoke_other_sessions(
     )
     revoked_ids = [r[0] for r in result.fetchall()]
     if revoked_ids:
-        await session.execute(
-            insert(AuditLog).values(actor_id=user.id, action="session.revoke_others")
-        )
+        await audit_sink.record(session, "session.revoke_others", actor_id=user.id)
     await session.commit()
     return {"revoked": len(revoked_ids)}
 
@@ -112,9 +111,7 @@ async def revoke_session(
         .where(SessionModel.id == sid_uuid)
         .values(ended_at=now, revoked=True)
     )
-    await session.execute(
-        insert(AuditLog).values(actor_id=user.id, action="session.revoke", subject_id=sid_uuid)
-    )
+    await audit_sink.record(session, "session.revoke", actor_id=user.id, subject_id=sid_uuid)
     await session.commit()
     return {"ok": True}
 
@@ -12,7 +12,9 @@ import sqlalchemy as sa
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import get_db, require_user, require_perm as RP
-from ..models import Product as ProductModel, AuditLog
+from ..models import Product as ProductModel
+from ..services import audit_sink
+from ..services.dashboard_cache import PRODUCTS, invalidate as invalidate_dashboard
 
 router = APIRouter()
 
@@ -283,8 +285,7 @@ def _to_out_dynamic(obj: ProductModel) -> _ProductOut:
 
 async def _log(db: AsyncSession, actor_id: Optional[UUID], action: str, subject_id: Optional[UUID] = None, detail: Optional[dict] = None):
     try:
-        db.add(AuditLog(actor_id=actor_id, action=action, subject_id=subject_id, detail=detail or {}))
-        await db.commit()
+        await audit_sink.record(db, action, actor_id=actor_id, subject_id=subject_id, detail=detail or {}, commit=True)
     except Exception:
         await db.rollback()
 
@@ -399,6 +400,7 @@ async def products_upsert(
         await db.execute(sa.update(ProductModel).where(ProductModel.id == existing.id).values(**vals))
         await db.commit()
         obj = await db.get(ProductModel, existing.id)
+        invalidate_dashboard(PRODUCTS)
         await _log(db, getattr(user, "id", None), "product.upsert.update", obj.id, {"sku": obj.sku})
     else:
         ins = {"sku": sku, "name": name}
@@ -414,6 +416,7 @@ async def products_upsert(
         db.add(obj)
         await db.commit()
         await db.refresh(obj)
+        invalidate_dashboard(PRODUCTS)
         await _log(db, getattr(user, "id", None), "product.upsert.insert", obj.id, {"sku": obj.sku})
 
     # upsert meta
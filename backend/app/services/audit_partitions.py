@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+import sqlalchemy as sa
+
+from ..database import AsyncSessionLocal
+
+log = logging.getLogger("uvicorn.error")
+
+# audit_logs แบ่ง partition รายเดือน (db/migrations/20261019_audit_logs_partitioned.sql)
+AHEAD_MONTHS = int(os.getenv("AUDIT_PARTITION_AHEAD", "3"))
+RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))   # 0 = เก็บตลอด
+MAINT_SEC = float(os.getenv("AUDIT_MAINT_SEC", "3600"))             # 0 = ปิด job
+
+# หลาย worker/instance → รันทีละตัว (ตัวอื่นข้ามรอบนั้นไป)
+SQL_LOCK = sa.text("SELECT pg_try_advisory_xact_lock(hashtext('audit_logs_maintenance'))")
+SQL_ENSURE = sa.text("SELECT audit_logs_ensure_partitions(:ahead)")
+SQL_DROP = sa.text("SELECT audit_logs_drop_expired(:keep)")
+SQL_PARTITIONS = sa.text("""
+    SELECT c.relname AS name,
+           pg_get_expr(c.relpartbound, c.oid) AS bound,
+           GREATEST(c.reltuples, 0)::bigint AS est_rows,
+           pg_total_relation_size(c.oid) AS bytes
+      FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+     WHERE i.inhparent = to_regclass('audit_logs')
+     ORDER BY c.relname
+""")
+
+_task: Optional[asyncio.Task] = None
+last_run: dict = {}
+
+
+async def maintain_once() -> dict:
+    """สร้าง partition ล่วงหน้า + DETACH/DROP เดือนที่เกิน retention ใน transaction เดียว"""
+    t0 = time.perf_counter()
+    async with AsyncSessionLocal() as s:
+        if not (await s.execute(SQL_LOCK)).scalar():
+            return {"skipped": True}
+        created = [r[0] for r in (await s.execute(SQL_ENSURE, {"ahead": AHEAD_MONTHS})).all()]
+        dropped = [r[0] for r in (await s.execute(SQL_DROP, {"keep": RETENTION_MONTHS})).all()]
+        await s.commit()
+    res = {"created": created, "dropped": dropped, "at": time.time(),
+           "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    last_run.clear()
+    last_run.update(res)
+    if created or dropped:
+        log.info("audit partitions: created=%s dropped=%s", created, dropped)
+    return res
+
+
+async def partitions(db) -> list[dict]:
+    return [dict(r) for r in (await db.execute(SQL_PARTITIONS)).mappings().all()]
+
+
+async def _loop() -> None:
+    while True:
+        try:
+            await maintain_once()
+        except Exception as e:
+            log.warning("audit partitions: maintenance failed (%s: %s)", type(e).__name__, e)
+        await asyncio.sleep(MAINT_SEC)
+
+
+async def start() -> None:
+    global _task
+    if _task is None and MAINT_SEC > 0:
+        _task = asyncio.create_task(_loop(), name="audit-partitions")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
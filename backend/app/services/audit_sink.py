@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..database import AsyncSessionLocal
+from ..models import AuditLog
+
+log = logging.getLogger("uvicorn.error")
+
+# inline  = เขียนใน transaction ของผู้เรียก (ไม่หายแม้ process ตาย)
+# batched = เข้าคิวในหน่วยความจำ แล้ว flusher INSERT ทีละชุด (ไม่มี commit/fsync ต่อ request;
+#           แถวที่ยังอยู่ในคิวหายได้ถ้า process ถูก kill กลางทาง — shutdown ปกติจะ drain ก่อน)
+MODE = os.getenv("AUDIT_MODE", "batched").strip().lower()
+FLUSH_MS = int(os.getenv("AUDIT_FLUSH_MS", "200"))
+FLUSH_ROWS = int(os.getenv("AUDIT_FLUSH_ROWS", "500"))
+QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))
+
+# คิวไม่จำกัดขนาดเอง — ขอบเขต QUEUE_MAX คุมด้วย qsize() + _reserved (ที่จองไว้รอ commit)
+# จองตอน record() แล้ว after_commit จึงใส่คิวได้เสมอ ไม่มีแถวหล่นระหว่างรอ commit
+_queue: "asyncio.Queue[dict] | None" = None
+_reserved = 0
+_task: Optional[asyncio.Task] = None
+stats = {"queued": 0, "inline": 0, "flushed": 0, "batches": 0, "flush_errors": 0, "overflow_inline": 0}
+_PENDING = "audit_pending"   # key ใน Session.info: แถวที่รอ transaction ของผู้เรียก commit
+
+
+def _row(action: str, actor_id, subject_id, detail, ip_addr) -> dict:
+    return {
+        "actor_id": actor_id, "action": action, "subject_id": subject_id, "detail": detail,
+        "ip_addr": ip_addr, "created_at": datetime.now(timezone.utc),   # เวลาเกิดเหตุ ไม่ใช่เวลาที่ flush
+    }
+
+
+def _has_room() -> bool:
+    return _queue is not None and _queue.qsize() + _reserved < QUEUE_MAX
+
+
+def _enqueue(row: dict) -> None:
+    assert _queue is not None
+    _queue.put_nowait(row)
+    stats["queued"] += 1
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_after_commit(session: Session) -> None:
+    global _reserved
+    rows = session.info.pop(_PENDING, ())
+    _reserved -= len(rows)
+    for row in rows:
+        _enqueue(row)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_after_end(session: Session, transaction) -> None:
+    # transaction หลักจบโดยไม่ commit (rollback หรือ close() ทิ้ง transaction กลางทาง)
+    # → ไม่บันทึก audit ของสิ่งที่ไม่ได้เกิดขึ้นจริง และคืนที่ที่จองไว้ (commit แล้ว after_commit pop ไปก่อน)
+    global _reserved
+    if transaction.parent is None:
+        _reserved -= len(session.info.pop(_PENDING, ()))
+
+
+async def record(db: AsyncSession, action: str, *, actor_id: Optional[UUID] = None,
+                 subject_id: Optional[UUID] = None, detail: Optional[dict] = None,
+                 ip_addr: Optional[str] = None, commit: bool = False) -> None:
+    """
+    บันทึก audit หนึ่งแถวคู่กับ transaction ของ db
+    commit=False: เป็นส่วนหนึ่งของ transaction ที่ผู้เรียกจะ commit เอง
+      inline → INSERT ทันที; batched → เข้าคิวเมื่อ transaction นั้น commit (rollback = ทิ้ง)
+    commit=True: งานหลัก commit ไปแล้ว — inline → INSERT + commit; batched → เข้าคิวเลย
+    คิวเต็ม (รวมที่จองไว้) → เขียน inline แทน (ช้าลงแต่ไม่ทิ้ง audit)
+    """
+    global _reserved
+    row = _row(action, actor_id, subject_id, detail, ip_addr)
+    if MODE == "batched":
+        if _queue is None:
+            await start()
+        if _has_room():
+            if commit:
+                _enqueue(row)
+            else:
+                db.sync_session.info.setdefault(_PENDING, []).append(row)
+                _reserved += 1
+            return
+        stats["overflow_inline"] += 1
+    await db.execute(insert(AuditLog).values(**row))
+    stats["inline"] += 1
+    if commit:
+        await db.commit()
+
+
+async def _write(rows: list[dict]) -> None:
+    async with AsyncSessionLocal() as s:
+        # executemany → insertmanyvalues: INSERT หลายแถวใน statement เดียว
+        await s.execute(insert(AuditLog), rows)
+        await s.commit()
+
+
+async def _flush(rows: list[dict]) -> None:
+    for attempt in range(3):
+        try:
+            await _write(rows)
+            stats["flushed"] += len(rows)
+            stats["batches"] += 1
+            return
+        except Exception as e:
+            stats["flush_errors"] += 1
+            log.warning("audit sink: flush %d rows failed (%s: %s)", len(rows), type(e).__name__, e)
+            await asyncio.sleep(0.5 * (attempt + 1))
+    log.error("audit sink: dropped %d audit rows after retries", len(rows))
+
+
+async def _take_batch(rows: list[dict]) -> None:
+    """เติม rows จนครบ FLUSH_ROWS หรือครบเวลา FLUSH_MS นับจากแถวแรก"""
+    assert _queue is not None
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + FLUSH_MS / 1000
+    while len(rows) < FLUSH_ROWS:
+        try:
+            rows.append(_queue.get_nowait())
+            continue
+        except asyncio.QueueEmpty:
+            pass
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            rows.append(await asyncio.wait_for(_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+
+
+async def _flusher() -> None:
+    assert _queue is not None
+    rows: list[dict] = []
+    try:
+        while True:
+            rows = [await _queue.get()]
+            await _take_batch(rows)
+            await _flush(rows)
+            rows = []
+    except asyncio.CancelledError:
+        # shutdown ระหว่างรวมชุด → แถวที่หยิบออกจากคิวแล้วต้องไม่หาย
+        if rows:
+            await _flush(rows)
+        raise
+
+
+async def start() -> None:
+    global _queue, _task
+    if MODE != "batched" or _task is not None:
+        return
+    _queue = asyncio.Queue()
+    _task = asyncio.create_task(_flusher(), name="audit-flusher")
+
+
+async def stop() -> None:
+    """หยุด flusher แล้ว drain คิวที่เหลือทั้งหมดลง DB"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    if _queue is None:
+        return
+    while not _queue.empty():
+        rows = []
+        while len(rows) < FLUSH_ROWS and not _queue.empty():
+            rows.append(_queue.get_nowait())
+        await _flush(rows)
+
+
+def snapshot() -> dict:
+    return {**stats, "mode": MODE, "pending": _queue.qsize() if _queue is not None else 0, "reserved": _reserved,
+            "flush_ms": FLUSH_MS, "flush_rows": FLUSH_ROWS, "queue_max": QUEUE_MAX}
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+
+log = logging.getLogger("uvicorn.error")
+
+SUGGEST_FIELDS = ("part_no", "description", "cas_no", "package_label", "warn_text", "sku")
+
+# ตรวจ data_versions ไม่บ่อยกว่านี้ (วินาที) และ rebuild อย่างน้อยทุก MAX_AGE แม้ไม่มีสัญญาณ
+CHECK_SEC = float(os.getenv("SUGGEST_VERSION_CHECK_SEC", "2"))
+MAX_AGE_SEC = float(os.getenv("SUGGEST_MAX_AGE_SEC", "300"))
+SIMILARITY_MIN = 0.3   # เท่ากับ pg_trgm.similarity_threshold ค่า default
+
+SQL_VERSION = sa.text("SELECT version FROM data_versions WHERE table_name='quote_catalog'")
+SQL_LOAD = sa.text(f"SELECT {', '.join(SUGGEST_FIELDS)} FROM quote_catalog")
+
+
+_WORD = re.compile(r"\w+")
+SIMILAR_BUDGET = 30_000  # จำนวน posting สูงสุดที่ยอมไล่ตอนหา similarity (คุมเวลาตอบ)
+
+
+def _grams(key: str, tail: bool = True) -> set[str]:
+    """trigram แบบ pg_trgm: แยกคำแล้ว pad "  " หน้า / " " หลังแต่ละคำ
+    tail=False ใช้กับ query ที่คำสุดท้ายยังพิมพ์ไม่จบ (ไม่มี trigram ปิดท้ายคำ)"""
+    words = _WORD.findall(key)
+    out: set[str] = set()
+    for n, w in enumerate(words):
+        s = f"  {w} " if tail or n < len(words) - 1 else f"  {w}"
+        out.update(s[i:i + 3] for i in range(len(s) - 2))
+    return out
+
+
+class _FieldIndex:
+    """distinct values ของ field เดียว: เรียงตาม casefold + trigram → posting (index ใน values)"""
+
+    __slots__ = ("values", "keys", "grams")
+
+    def __init__(self, values: Iterable[str]):
+        self.values = sorted({v for v in values if v}, key=lambda v: (v.casefold(), v))
+        self.keys = [v.casefold() for v in self.values]
+        grams: dict[str, array] = {}
+        for i, k in enumerate(self.keys):
+            for g in _grams(k):
+                a = grams.get(g)
+                if a is None:
+                    a = grams[g] = array("I")
+                a.append(i)
+        self.grams = grams
+
+    def _prefix(self, key: str, limit: int) -> list[int]:
+        out = []
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and len(out) < limit and self.keys[i].startswith(key):
+            out.append(i)
+            i += 1
+        return out
+
+    def _contains(self, key: str, limit: int, seen: set[int]) -> list[int]:
+        # candidate = posting ที่สั้นที่สุดของ trigram ในคำของ query แล้วตรวจ substring จริงอีกที
+        # (query ที่ไม่มีคำยาว ≥3 ตัว → ใช้ trigram ต้นคำ จึงหาเจอเฉพาะที่ขึ้นต้นคำ)
+        words = _WORD.findall(key)
+        if not words:
+            return []
+        if any(len(w) >= 3 for w in words):
+            gs = {w[i:i + 3] for w in words for i in range(len(w) - 2)}
+        else:
+            gs = {f"  {words[0]}"[-3:]}
+        postings = [self.grams.get(g) for g in gs]
+        if any(p is None for p in postings):
+            return []
+        out = []
+        for i in min(postings, key=len):
+            if i not in seen and key in self.keys[i]:
+                out.append(i)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def _similar(self, key: str, limit: int, seen: set[int]) -> list[int]:
+        # คะแนนแบบ word_similarity: สัดส่วน trigram ของ query ที่พบใน value (ทนพิมพ์ผิด)
+        q = _grams(key, tail=False)
+        postings = sorted((p for p in (self.grams.get(g) for g in q) if p is not None), key=len)
+        hits: Counter = Counter()
+        budget = SIMILAR_BUDGET
+        for p in postings:
+            if len(p) > budget:
+                break
+            budget -= len(p)
+            hits.update(p)
+        need = SIMILARITY_MIN * len(q)
+        scored = []
+        for i, n in hits.most_common():
+            if n < need:
+                break
+            if i in seen:
+                continue
+            sim = len(q & _grams(self.keys[i])) / len(q)
+            if sim >= SIMILARITY_MIN:
+                scored.append((-sim, i))
+                if len(scored) >= limit * 5:
+                    break
+        return [i for _, i in sorted(scored)[:limit]]
+
+    def search(self, q: Optional[str], limit: int) -> list[str]:
+        key = (q or "").strip().casefold()
+        if not key:
+            return self.values[:limit]
+        hits = self._prefix(key, limit)
+        if len(hits) < limit:
+            seen = set(hits)
+            more = self._contains(key, limit - len(hits), seen)
+            hits += more
+            seen.update(more)
+            if len(hits) < limit and len(key) >= 3:
+                hits += self._similar(key, limit - len(hits), seen)
+        return [self.values[i] for i in hits]
+
+
+def _build(rows: list[tuple]) -> dict[str, _FieldIndex]:
+    return {f: _FieldIndex(r[n] for r in rows) for n, f in enumerate(SUGGEST_FIELDS)}
+
+
+class CatalogSuggestIndex:
+    """
+    vocabulary ของ quote_catalog ในหน่วยความจำ (ต่อ process)
+    - โหลดครั้งแรกแบบรอ, ครั้งถัดไป rebuild เบื้องหลังแล้วสลับ snapshot (ระหว่างนั้นตอบจากของเก่า)
+    - stale เมื่อ: invalidate() จาก endpoint ที่เขียน catalog, data_versions เปลี่ยน (trigger), หรือเกิน MAX_AGE
+    """
+
+    def __init__(self):
+        self._fields: Optional[dict[str, _FieldIndex]] = None
+        self._version: Optional[int] = None
+        self._gen = 0
+        self._built_gen = -1
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def invalidate(self) -> None:
+        self._gen += 1
+
+    async def _db_version(self, db: AsyncSession) -> Optional[int]:
+        try:
+            return await db.scalar(SQL_VERSION)
+        except Exception:
+            await db.rollback()   # ยังไม่ได้รัน migration data_versions
+            return None
+
+    def _stale(self) -> bool:
+        return self._built_gen != self._gen or (time.monotonic() - self._built_at) > MAX_AGE_SEC
+
+    async def _load(self, db: AsyncSession) -> None:
+        # เรียกขณะถือ self._lock เท่านั้น
+        gen = self._gen
+        version = await self._db_version(db)
+        rows = (await db.execute(SQL_LOAD)).all()
+        fields = await asyncio.to_thread(_build, [tuple(r) for r in rows])
+        self._fields, self._version = fields, version
+        self._built_gen, self._built_at = gen, time.monotonic()
+        self._checked_at = self._built_at
+
+    async def _rebuild(self, db: AsyncSession) -> None:
+        async with self._lock:
+            await self._load(db)
+
+    async def _rebuild_bg(self) -> None:
+        try:
+            async with AsyncSessionLocal() as s:
+                await self._rebuild(s)
+        except Exception:
+            log.exception("catalog suggest: background rebuild failed")
+
+    async def ensure(self, db: AsyncSession) -> None:
+        if self._fields is None:
+            async with self._lock:
+                # cold start พร้อมกันหลาย request → คนแรกโหลด คนที่เหลือรอ lock แล้วใช้ผลเดียวกัน
+                if self._fields is None:
+                    await self._load(db)
+            return
+        now = time.monotonic()
+        if not self._stale() and now - self._checked_at >= CHECK_SEC:
+            self._checked_at = now
+            if await self._db_version(db) != self._version:
+                self.invalidate()
+        if self._stale() and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._rebuild_bg())
+
+    def search(self, field: str, q: Optional[str], limit: int) -> list[str]:
+        assert self._fields is not None
+        return self._fields[field].search(q, limit)
+
+
+suggest_index = CatalogSuggestIndex()
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+
+log = logging.getLogger("uvicorn.error")
+
+# สดภายใน TTL; เลย TTL แต่ไม่เกิน STALE → ตอบค่าเก่าทันทีแล้วคำนวณใหม่เบื้องหลัง (stale-while-revalidate)
+TTL_SEC = float(os.getenv("DASHBOARD_TTL_SEC", "30"))
+STALE_SEC = float(os.getenv("DASHBOARD_STALE_SEC", "300"))
+
+# tag ที่ใช้ invalidate (ชื่อเดียวกับที่ endpoint เขียนส่งมา)
+DOCS = "docs"          # quotations / purchase_orders / sales_orders
+PRODUCTS = "products"
+STOCK = "stock"        # stock_levels / stock moves
+TEAMS = "teams"        # team_codes / company_codes mapping
+
+Loader = Callable[[AsyncSession], Awaitable[Any]]
+
+
+@dataclass
+class _Entry:
+    value: Any
+    tags: frozenset[str]
+    fresh_until: float
+    stale_until: float
+
+
+@dataclass
+class _Stats:
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    refresh_errors: int = 0
+    invalidations: int = 0
+    by_tag: dict[str, int] = field(default_factory=dict)
+
+
+class TileCache:
+    """cache ต่อ process ของ tile บน dashboard — key → ค่า + tags สำหรับ invalidate"""
+
+    def __init__(self):
+        self._entries: dict[str, _Entry] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshing: set[str] = set()
+        self.stats = _Stats()
+
+    async def get(self, key: str, tags: tuple[str, ...], loader: Loader, db: AsyncSession,
+                  ttl: float = TTL_SEC, stale: float = STALE_SEC) -> Any:
+        now = time.monotonic()
+        e = self._entries.get(key)
+        if e and now < e.fresh_until:
+            self.stats.hits += 1
+            return e.value
+        if e and now < e.stale_until:
+            self.stats.stale_hits += 1
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                asyncio.create_task(self._refresh(key, tags, loader, ttl, stale))
+            return e.value
+
+        self.stats.misses += 1
+        fut = self._inflight.get(key)
+        if fut is not None:
+            # มีคนกำลังคำนวณ key เดียวกันอยู่ → รอผลเดียวกัน (ไม่ยิง query ซ้ำ)
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await loader(db)
+            self._put(key, value, tags, ttl, stale)
+            fut.set_result(value)
+            return value
+        except BaseException as ex:
+            fut.set_exception(ex)
+            fut.exception()   # ไม่ให้ asyncio เตือน "exception never retrieved" เมื่อไม่มีใครรอ
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _refresh(self, key: str, tags: tuple[str, ...], loader: Loader, ttl: float, stale: float) -> None:
+        gen = self.stats.invalidations
+        try:
+            async with AsyncSessionLocal() as s:
+                value = await loader(s)
+            # ถ้ามี invalidate ระหว่างคำนวณ ค่าที่ได้อาจเก่ากว่าข้อมูลที่เพิ่งเขียน → ทิ้ง
+            if gen == self.stats.invalidations:
+                self._put(key, value, tags, ttl, stale)
+            self.stats.refreshes += 1
+        except Exception:
+            self.stats.refresh_errors += 1
+            log.exception("dashboard cache: refresh %s failed", key)
+        finally:
+            self._refreshing.discard(key)
+
+    def _put(self, key: str, value: Any, tags: tuple[str, ...], ttl: float, stale: float) -> None:
+        now = time.monotonic()
+        self._entries[key] = _Entry(value, frozenset(tags), now + ttl, now + ttl + stale)
+
+    def invalidate(self, *tags: str) -> int:
+        """ลบทุก key ที่มี tag ใด ๆ ใน tags — เรียกหลัง commit ของ endpoint ที่เขียน"""
+        keys = [k for k, e in self._entries.items() if e.tags.intersection(tags)]
+        for k in keys:
+            del self._entries[k]
+        self.stats.invalidations += 1
+        for t in tags:
+            self.stats.by_tag[t] = self.stats.by_tag.get(t, 0) + 1
+        return len(keys)
+
+    def snapshot(self) -> dict:
+        s = self.stats
+        lookups = s.hits + s.stale_hits + s.misses
+        return {
+            "entries": len(self._entries),
+            "hits": s.hits,
+            "stale_hits": s.stale_hits,
+            "misses": s.misses,
+            "hit_ratio": round((s.hits + s.stale_hits) / lookups, 4) if lookups else None,
+            "refreshes": s.refreshes,
+            "refresh_errors": s.refresh_errors,
+            "invalidations": s.invalidations,
+            "invalidations_by_tag": dict(s.by_tag),
+            "ttl_sec": TTL_SEC,
+            "stale_sec": STALE_SEC,
+        }
+
+
+dashboard_cache = TileCache()
+
+
+def invalidate(*tags: str) -> None:
+    dashboard_cache.invalidate(*tags)
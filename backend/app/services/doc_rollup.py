@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+
+log = logging.getLogger("uvicorn.error")
+
+# พับ doc_daily_deltas เข้า doc_daily_counts ทุก ๆ FOLD_SEC (0 = ปิด)
+FOLD_SEC = float(os.getenv("DOC_ROLLUP_FOLD_SEC", "60"))
+
+# ลบ deltas แล้วบวกเข้า counts ใน statement เดียว — หลาย worker พับพร้อมกันได้ (แต่ละแถวถูกลบครั้งเดียว)
+SQL_FOLD = sa.text("""
+    WITH d AS (
+      DELETE FROM doc_daily_deltas RETURNING day, doc_type, team_code, n
+    ),
+    g AS (
+      SELECT day, doc_type, team_code, sum(n) AS n FROM d GROUP BY 1, 2, 3
+    ),
+    up AS (
+      INSERT INTO doc_daily_counts AS c (day, doc_type, team_code, count)
+      SELECT day, doc_type, team_code, n FROM g
+      ON CONFLICT (day, doc_type, team_code) DO UPDATE SET count = c.count + EXCLUDED.count
+      RETURNING 1
+    )
+    SELECT count(*) FROM up
+""")
+
+# ยอดต่อวัน/ประเภท = counts + deltas ที่ยังไม่พับ (ค่าปัจจุบันเสมอ)
+SQL_DAILY = sa.text("""
+    SELECT day, doc_type, sum(n) AS cnt FROM (
+      SELECT day, doc_type, team_code, count AS n FROM doc_daily_counts WHERE day >= :since
+      UNION ALL
+      SELECT day, doc_type, team_code, n FROM doc_daily_deltas WHERE day >= :since
+    ) x
+    WHERE (CAST(:team AS text) IS NULL OR team_code = :team)
+    GROUP BY 1, 2
+""")
+
+_task: Optional[asyncio.Task] = None
+
+
+async def daily_counts(db: AsyncSession, since: date, team_code: Optional[str] = None) -> dict[tuple[date, str], int]:
+    """{(day, 'Q'|'PO'|'SO'): count} ตั้งแต่ since (วันตามเวลาไทย)"""
+    rows = (await db.execute(SQL_DAILY, {"since": since, "team": team_code})).mappings().all()
+    return {(r["day"], r["doc_type"]): int(r["cnt"]) for r in rows if r["cnt"]}
+
+
+async def fold_once() -> int:
+    async with AsyncSessionLocal() as s:
+        n = int((await s.execute(SQL_FOLD)).scalar() or 0)
+        await s.commit()
+    return n
+
+
+async def _loop() -> None:
+    while True:
+        await asyncio.sleep(FOLD_SEC)
+        try:
+            await fold_once()
+        except Exception as e:
+            log.warning("doc rollup: fold failed (%s: %s)", type(e).__name__, e)
+
+
+async def start() -> None:
+    global _task
+    if _task is None and FOLD_SEC > 0:
+        _task = asyncio.create_task(_loop(), name="doc-rollup-fold")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
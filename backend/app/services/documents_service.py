@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import re
+from decimal import Decimal
+from typing import Iterable, Mapping, Optional, Sequence
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# ตารางรายการของเอกสาร → คอลัมน์ FK ไปยังหัวเอกสาร
+ITEM_FK = {
+    "sales_order_items": "so_id",
+    "purchase_order_items": "po_id",
+}
+
+SQL_PRODUCTS_BY_IDS = sa.text("SELECT id, sku, name FROM products WHERE id = ANY(:ids)")
+
+
+class ProductsNotFound(LookupError):
+    def __init__(self, ids: Sequence[UUID]):
+        self.ids = list(ids)
+        if len(self.ids) == 1:
+            msg = f"product {self.ids[0]} not found"
+        else:
+            msg = "products not found: " + ", ".join(str(i) for i in self.ids)
+        super().__init__(msg)
+
+
+async def resolve_products(db: AsyncSession, ids: Iterable[UUID]) -> dict[UUID, Mapping]:
+    """ดึงสินค้าทั้งหมดด้วยคำสั่งเดียว — ProductsNotFound (พร้อม id ที่ขาด) ถ้าหาไม่ครบ"""
+    want = list(dict.fromkeys(ids))
+    if not want:
+        return {}
+    rows = (await db.execute(SQL_PRODUCTS_BY_IDS, {"ids": want})).mappings().all()
+    found = {r["id"]: r for r in rows}
+    missing = [i for i in want if i not in found]
+    if missing:
+        raise ProductsNotFound(missing)
+    return found
+
+
+def _item_params(items: Sequence, products: Mapping[UUID, Mapping]) -> dict:
+    return {
+        "pid": [it.product_id for it in items],
+        "sku": [products[it.product_id]["sku"] for it in items],
+        "name": [products[it.product_id]["name"] for it in items],
+        "qty": [Decimal(str(it.qty)) for it in items],
+        "price": [Decimal(str(it.price_ex_vat)) for it in items],
+    }
+
+
+_ITEMS_FROM = """
+        unnest(
+          CAST(:pid AS uuid[]), CAST(:sku AS text[]), CAST(:name AS text[]),
+          CAST(:qty AS numeric[]), CAST(:price AS numeric[])
+        ) WITH ORDINALITY AS t(product_id, sku, name, qty, price, n)
+"""
+
+
+# ===== หัวเอกสาร =====
+# ตารางหัวเอกสาร → ตารางรายการที่ insert_document ใส่พร้อมกันได้ (None = caller ใส่เอง)
+HEADER_ITEMS = {
+    "sales_orders": "sales_order_items",
+    "purchase_orders": "purchase_order_items",
+    "quotations": None,
+}
+_COL = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+async def insert_document(db: AsyncSession, table: str, header: Mapping[str, object],
+                          items: Sequence = (), products: Optional[Mapping[UUID, Mapping]] = None) -> Mapping:
+    """
+    INSERT หัวเอกสาร ... RETURNING id, number, status, created_at (ไม่ต้อง SELECT id ตาม number อีกรอบ)
+    ถ้ามี items (SO/PO) ใส่รายการใน statement เดียวกันผ่าน CTE → 1 round trip ต่อเอกสาร
+    """
+    cols = list(header)
+    # ชื่อตาราง/คอลัมน์ถูกแทรกลง SQL ตรง ๆ → ตรวจเสมอ (assert หายไปเมื่อรันด้วย -O)
+    if table not in HEADER_ITEMS:
+        raise ValueError(f"unknown document table: {table!r}")
+    bad = [c for c in cols if not _COL.match(c)]
+    if bad:
+        raise ValueError(f"{table}: invalid column name(s) {bad!r}")
+    params = {f"h_{c}": v for c, v in header.items()}
+    ins = (f"INSERT INTO {table} ({', '.join(cols)}) "
+           f"VALUES ({', '.join(':h_' + c for c in cols)}) "
+           f"RETURNING id, number, status, created_at")
+    if not items:
+        return (await db.execute(sa.text(ins), params)).mappings().one()
+
+    item_table = HEADER_ITEMS[table]
+    if item_table is None:
+        raise ValueError(f"{table}: items ต้องใส่แยก")
+    fk = ITEM_FK[item_table]
+    return (await db.execute(sa.text(f"""
+        WITH h AS ({ins}),
+        i AS (
+          INSERT INTO {item_table} ({fk}, product_id, sku, name, qty, price_ex_vat)
+          SELECT h.id, t.product_id, t.sku, t.name, t.qty, t.price
+          FROM h, {_ITEMS_FROM}
+          ORDER BY t.n
+          RETURNING 1
+        )
+        SELECT h.id, h.number, h.status, h.created_at, (SELECT count(*) FROM i) AS item_count
+        FROM h
+    """), params | _item_params(items, products or {}))).mappings().one()
+
+
+# ===== เปลี่ยนสถานะ + stock_moves =====
+# kind → (หัว, รายการ, FK, สถานะปลายทาง, เครื่องหมาย qty ของ move)
+MOVE_KINDS = {
+    "so": ("sales_orders", "sales_order_items", "so_id", "fulfilled", -1),
+    "po": ("purchase_orders", "purchase_order_items", "po_id", "received", 1),
+}
+
+
+async def transition_with_moves(db: AsyncSession, kind: str, doc_id: UUID, note: str) -> Optional[dict]:
+    """
+    เปลี่ยนสถานะ (fulfilled/received) และคืนรายการ stock_moves ในคำสั่งเดียว
+    UPDATE แบบมีเงื่อนไข → เรียกซ้ำ/พร้อมกันได้ moves เพียงครั้งเดียว
+    คืน None ถ้าไม่พบเอกสาร; ไม่ commit
+    """
+    head, items, fk, to_status, sign = MOVE_KINDS[kind]
+    rows = (await db.execute(sa.text(f"""
+        WITH h AS (
+          UPDATE {head} SET status=:st WHERE id=:id AND status <> :st
+          RETURNING id, number
+        )
+        SELECT h.number, i.sku, i.qty
+        FROM h LEFT JOIN {items} i ON i.{fk} = h.id
+    """), {"id": doc_id, "st": to_status})).mappings().all()
+    if not rows:
+        # ไม่ได้ UPDATE: ไม่มีเอกสาร หรือเปลี่ยนสถานะไปแล้ว
+        status = await db.scalar(sa.text(f"SELECT status FROM {head} WHERE id=:id"), {"id": doc_id})
+        return None if status is None else {"status": status, "stock_moves": []}
+    moves = [
+        {"sku": r["sku"], "qty": sign * float(r["qty"]), "note": f"{r['number']} - {note}"}
+        for r in rows if r["sku"] is not None
+    ]
+    return {"status": to_status, "stock_moves": moves}
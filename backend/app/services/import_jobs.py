@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+from .dashboard_cache import PRODUCTS, invalidate as invalidate_dashboard
+from .product_import_service import bulk_upsert_products, parse_products_csv
+from .quote_catalog_service import bulk_upsert_catalog, catalog_changed, parse_catalog_file
+
+log = logging.getLogger("uvicorn.error")
+
+WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+HEARTBEAT_SEC = 15.0
+STALE_SEC = float(os.getenv("IMPORT_STALE_SEC", "120"))     # ไม่มี heartbeat นานเท่านี้ = ไม่มี worker ถืองาน
+MAX_ATTEMPTS = int(os.getenv("IMPORT_MAX_ATTEMPTS", "3"))
+
+
+@dataclass(frozen=True)
+class JobKind:
+    job_type: str                                       # ค่าใน inv_import_jobs.job_type
+    perm: str                                           # สิทธิ์ที่ต้องมีตอน submit
+    parse: Callable[[str, bytes], list[dict]]           # (file_name, content) -> rows
+    apply: Callable[[AsyncSession, list[dict]], Awaitable[dict]]
+    truncate: Optional[str] = None                      # ใช้เมื่อ mode=replace
+    on_applied: Optional[Callable[[], None]] = None     # เรียกหลัง commit (เช่น ล้าง cache)
+
+
+KINDS: dict[str, JobKind] = {
+    "quote_catalog": JobKind(
+        job_type="QUOTE_CATALOG", perm="quote:update",
+        parse=parse_catalog_file, apply=bulk_upsert_catalog,
+        truncate="TRUNCATE quote_catalog RESTART IDENTITY",
+        on_applied=catalog_changed,
+    ),
+    "products": JobKind(
+        job_type="PRODUCTS", perm="import:data",
+        parse=lambda _name, content: parse_products_csv(content), apply=bulk_upsert_products,
+        on_applied=lambda: invalidate_dashboard(PRODUCTS),
+    ),
+}
+_BY_TYPE = {k.job_type: k for k in KINDS.values()}
+
+SQL_SUBMIT = sa.text("""
+    INSERT INTO inv_import_jobs (job_type, file_name, status, mode, content, requested_by)
+    VALUES (:t, :f, 'PENDING', :m, :c, :u)
+    RETURNING id
+""")
+SQL_CLAIM = sa.text("""
+    UPDATE inv_import_jobs SET status='VALIDATING', started_at=now(), heartbeat_at=now(), attempts=attempts+1
+    WHERE id=:id AND status='PENDING'
+    RETURNING job_type, file_name, mode, content
+""")
+SQL_PROGRESS = sa.text("""
+    UPDATE inv_import_jobs
+    SET status=:s, total_rows=:total, processed_rows=:done,
+        inserted_rows=:ins, updated_rows=:upd, skipped_rows=:skp
+    WHERE id=:id
+""")
+SQL_FINISH = sa.text("""
+    UPDATE inv_import_jobs
+    SET status=:s, error_text=:err, finished_at=now(), content=NULL
+    WHERE id=:id
+""")
+SQL_HEARTBEAT = sa.text("""
+    UPDATE inv_import_jobs SET heartbeat_at=now() WHERE id=:id AND status IN ('VALIDATING','APPLYING')
+""")
+# งานค้าง VALIDATING/APPLYING ที่ไม่มี worker ต่ออายุ (process ตาย/restart กลางงาน)
+# apply เป็น transaction เดียว → ถูก rollback ไปแล้ว เริ่มใหม่ได้; ครบ MAX_ATTEMPTS หรือไม่มีไฟล์ → FAILED
+SQL_RECOVER = sa.text("""
+    UPDATE inv_import_jobs
+    SET status = CASE WHEN attempts >= :max OR content IS NULL THEN 'FAILED' ELSE 'PENDING' END,
+        error_text = CASE WHEN attempts >= :max OR content IS NULL THEN 'worker lost (no heartbeat)' ELSE NULL END,
+        finished_at = CASE WHEN attempts >= :max OR content IS NULL THEN now() END,
+        content = CASE WHEN attempts >= :max THEN NULL ELSE content END,
+        processed_rows = 0, inserted_rows = 0, updated_rows = 0, skipped_rows = 0
+    WHERE status IN ('VALIDATING','APPLYING')
+      AND COALESCE(heartbeat_at, started_at, created_at) < now() - make_interval(secs => :stale)
+    RETURNING id, status
+""")
+SQL_PENDING = sa.text("SELECT id FROM inv_import_jobs WHERE status='PENDING' ORDER BY id")
+SQL_GET = sa.text("""
+    SELECT id, job_type, file_name, status, mode, error_text, requested_by,
+           total_rows, processed_rows, inserted_rows, updated_rows, skipped_rows,
+           created_at, started_at, finished_at
+    FROM inv_import_jobs WHERE id=:id
+""")
+
+_queue: "asyncio.Queue[int] | None" = None
+_tasks: list[asyncio.Task] = []
+
+
+async def submit(db: AsyncSession, kind: str, *, file_name: str, content: bytes, mode: str,
+                 user_id: Optional[UUID]) -> int:
+    """บันทึกงาน (PENDING) พร้อมไฟล์ แล้วโยนเข้าคิว — caller ได้ job id กลับทันที"""
+    k = KINDS[kind]
+    job_id = int((await db.execute(SQL_SUBMIT, {
+        "t": k.job_type, "f": file_name, "m": mode, "c": content,
+        "u": str(user_id) if user_id else None,
+    })).scalar_one())
+    await db.commit()
+    if _queue is not None:
+        _queue.put_nowait(job_id)
+    return job_id
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[dict]:
+    m = (await db.execute(SQL_GET, {"id": job_id})).mappings().first()
+    if not m:
+        return None
+    out = dict(m)
+    total = out["total_rows"] or 0
+    out["progress"] = round(out["processed_rows"] / total, 4) if total else (1.0 if out["status"] == "APPLIED" else 0.0)
+    return out
+
+
+async def _progress(job_id: int, status: str, total: int, done: int, counts: dict) -> None:
+    # เขียนผ่าน session แยก เพื่อให้ผู้ poll เห็นทันทีแม้ transaction หลักยังไม่ commit
+    async with AsyncSessionLocal() as s:
+        await s.execute(SQL_PROGRESS, {
+            "id": job_id, "s": status, "total": total, "done": done,
+            "ins": counts["inserted"], "upd": counts["updated"], "skp": counts["skipped"],
+        })
+        await s.commit()
+
+
+async def _finish(job_id: int, status: str, err: Optional[str] = None) -> None:
+    async with AsyncSessionLocal() as s:
+        await s.execute(SQL_FINISH, {"id": job_id, "s": status, "err": err})
+        await s.commit()
+
+
+async def _heartbeat(job_id: int) -> None:
+    while True:
+        await asyncio.sleep(HEARTBEAT_SEC)
+        try:
+            async with AsyncSessionLocal() as s:
+                await s.execute(SQL_HEARTBEAT, {"id": job_id})
+                await s.commit()
+        except Exception as e:
+            log.warning("import job %s: heartbeat failed (%s: %s)", job_id, type(e).__name__, e)
+
+
+async def run_job(job_id: int) -> None:
+    async with AsyncSessionLocal() as s:
+        claimed = (await s.execute(SQL_CLAIM, {"id": job_id})).mappings().first()
+        await s.commit()
+    if not claimed:
+        return  # worker อื่นรับไปแล้ว หรือไม่ใช่ PENDING
+    hb = asyncio.create_task(_heartbeat(job_id))
+    try:
+        await _run_claimed(job_id, claimed)
+    finally:
+        hb.cancel()
+
+
+async def _run_claimed(job_id: int, claimed) -> None:
+    kind = _BY_TYPE.get(claimed["job_type"])
+    if kind is None:
+        await _finish(job_id, "FAILED", f"unsupported job_type {claimed['job_type']}")
+        return
+
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    try:
+        # parse เป็นงาน CPU (โดยเฉพาะ xlsx) → ย้ายออกจาก event loop
+        rows = await asyncio.to_thread(kind.parse, claimed["file_name"], bytes(claimed["content"] or b""))
+        total = len(rows)
+        await _progress(job_id, "APPLYING", total, 0, counts)
+
+        # apply ทั้งไฟล์ใน transaction เดียว (all-or-nothing) แบ่ง chunk เพื่อรายงาน progress
+        async with AsyncSessionLocal() as db:
+            try:
+                if claimed["mode"] == "replace" and kind.truncate:
+                    await db.execute(sa.text(kind.truncate))
+                for off in range(0, total, CHUNK_ROWS):
+                    res = await kind.apply(db, rows[off:off + CHUNK_ROWS])
+                    for k in counts:
+                        counts[k] += res.get(k, 0)
+                    await _progress(job_id, "APPLYING", total, min(off + CHUNK_ROWS, total), counts)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        if kind.on_applied:
+            kind.on_applied()
+        await _finish(job_id, "APPLIED")
+    except asyncio.CancelledError:
+        # shutdown ระหว่างทำงาน: transaction ถูก rollback แล้ว → ปิดสถานะให้ชัดเจน
+        await asyncio.shield(_finish(job_id, "FAILED", "interrupted by shutdown"))
+        raise
+    except Exception as e:
+        log.exception("import job %s failed", job_id)
+        await _finish(job_id, "FAILED", f"{type(e).__name__}: {e}")
+
+
+async def _worker(n: int) -> None:
+    assert _queue is not None
+    while True:
+        job_id = await _queue.get()
+        try:
+            await run_job(job_id)
+        except Exception:
+            log.exception("import worker %s: job %s crashed", n, job_id)
+        finally:
+            _queue.task_done()
+
+
+async def recover(*, requeue_all: bool = False) -> int:
+    """งานที่ไม่มี worker ถือ (ค้าง VALIDATING/APPLYING) → PENDING (เข้าคิวใหม่) หรือ FAILED"""
+    async with AsyncSessionLocal() as s:
+        rows = (await s.execute(SQL_RECOVER, {"max": MAX_ATTEMPTS, "stale": STALE_SEC})).all()
+        pending = (await s.execute(SQL_PENDING)).scalars().all() if requeue_all else []
+        await s.commit()
+    if rows:
+        log.warning("import jobs: recovered %d job(s) without a live worker", len(rows))
+    ids = pending or [r[0] for r in rows if r[1] == "PENDING"]
+    if _queue is not None:
+        for i in ids:
+            _queue.put_nowait(int(i))
+    return len(rows)
+
+
+async def _sweeper() -> None:
+    while True:
+        await asyncio.sleep(STALE_SEC)
+        try:
+            await recover()
+        except Exception as e:
+            log.warning("import jobs: sweep failed (%s: %s)", type(e).__name__, e)
+
+
+async def start() -> None:
+    """เริ่ม worker + หยิบงานที่ค้างจากรอบก่อน (PENDING และงานที่ worker ตายกลางทาง)"""
+    global _queue
+    if _queue is not None:
+        return
+    _queue = asyncio.Queue()
+    for n in range(max(1, WORKERS)):
+        _tasks.append(asyncio.create_task(_worker(n), name=f"import-worker-{n}"))
+    _tasks.append(asyncio.create_task(_sweeper(), name="import-sweeper"))
+    try:
+        await recover(requeue_all=True)
+    except Exception as e:
+        log.warning("import jobs: skip startup sweep (%s: %s)", type(e).__name__, e)
+
+
+async def stop() -> None:
+    global _queue
+    for t in _tasks:
+        t.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _queue = None
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import urllib.request
+from collections import defaultdict, deque
+from decimal import Decimal
+from typing import Any, Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import AsyncSessionLocal
+
+log = logging.getLogger("uvicorn.error")
+
+# การประเมิน LOW_STOCK ทำใน trigger บน stock_levels (migration stock_low_alerts) — ที่นี่แค่ส่งคิวออก
+DISPATCH_SEC = float(os.getenv("NOTIF_DISPATCH_SEC", "2"))   # 0 = ปิด worker (ยังเรียก dispatch_once เองได้)
+BATCH = int(os.getenv("NOTIF_BATCH", "100"))
+MAX_ATTEMPTS = int(os.getenv("NOTIF_MAX_ATTEMPTS", "5"))
+WEBHOOK_TIMEOUT_SEC = float(os.getenv("NOTIF_WEBHOOK_TIMEOUT_SEC", "5"))
+BACKOFF_SEC = float(os.getenv("NOTIF_BACKOFF_SEC", "10"))         # retry ครั้งที่ n รอ BACKOFF_SEC * 2^(n-1)
+BACKOFF_MAX_SEC = float(os.getenv("NOTIF_BACKOFF_MAX_SEC", "3600"))
+LEASE_SEC = float(os.getenv("NOTIF_LEASE_SEC", "300"))             # SENDING ค้างเกินนี้ (process ตาย) → หยิบใหม่
+
+# webhook_url แบบ inproc://<ชื่อ> ส่งเข้า inbox ในหน่วยความจำแทน HTTP (ใช้ทดสอบบนเครื่อง)
+INPROC_SCHEME = "inproc://"
+INPROC_KEEP = 200
+inproc_inbox: defaultdict[str, deque] = defaultdict(lambda: deque(maxlen=INPROC_KEEP))
+
+# หยิบงานที่ถึงเวลาเป็นชุดแล้วตั้ง SENDING + เวลาเช่า แล้ว commit ทันที (ไม่ถือ row lock/connection ระหว่างส่ง)
+# SKIP LOCKED → หลาย worker/process ไม่แย่งแถวเดียวกัน; SENDING ที่หมดเวลาเช่าถูกหยิบใหม่ได้
+SQL_CLAIM = sa.text("""
+    WITH c AS (
+      SELECT id FROM notif_queue
+      WHERE status IN ('PENDING', 'SENDING') AND next_attempt_at <= now()
+      ORDER BY id
+      LIMIT :n
+      FOR UPDATE SKIP LOCKED
+    ),
+    up AS (
+      UPDATE notif_queue q SET status = 'SENDING', next_attempt_at = now() + make_interval(secs => :lease)
+      FROM c WHERE q.id = c.id
+      RETURNING q.id, q.rule_id, q.title, q.payload, q.created_at
+    )
+    SELECT up.id, up.rule_id, up.title, up.payload, up.created_at, r.channel, r.webhook_url
+    FROM up JOIN notif_rules r ON r.id = up.rule_id
+    ORDER BY up.id
+""")
+SQL_SENT = sa.text("""
+    UPDATE notif_queue SET status='SENT', sent_at=now(), attempts=attempts+1, last_error=NULL
+    WHERE id = ANY(:ids) AND status = 'SENDING'
+""")
+SQL_RETRY = sa.text("""
+    UPDATE notif_queue
+    SET attempts=attempts+1, last_error=:err,
+        status = CASE WHEN attempts + 1 >= :max THEN 'FAILED' ELSE 'PENDING' END,
+        next_attempt_at = now() + make_interval(secs => least(:base * power(2, attempts), :cap))
+    WHERE id = ANY(:ids) AND status = 'SENDING'
+""")
+
+SQL_ITEM = sa.text("SELECT item_id, sku FROM items WHERE sku=:sku")
+SQL_WH = sa.text("SELECT wh_id FROM warehouses WHERE wh_code=:code")
+SQL_RULE_INSERT = sa.text("""
+    INSERT INTO notif_rules (rule_type, stock_item_id, stock_wh_id, threshold, channel, webhook_url, owner_id)
+    VALUES ('LOW_STOCK', :item, :wh, :th, :ch, :url, :owner)
+    RETURNING id
+""")
+# rule ใหม่: trigger จะตรวจเมื่อสต็อกเปลี่ยนครั้งถัดไป → ตั้ง firing จากยอดปัจจุบันเลย (ต่ำอยู่แล้ว = เข้าคิวทันที)
+SQL_RULE_PRIME = sa.text("""
+    WITH cur AS (
+      SELECT COALESCE(sum(on_hand - reserved), 0) AS available
+      FROM stock_levels
+      WHERE item_id = CAST(:item AS uuid) AND (CAST(:wh AS uuid) IS NULL OR wh_id = CAST(:wh AS uuid))
+    ),
+    up AS (
+      UPDATE notif_rules r SET firing = (cur.available <= r.threshold)
+      FROM cur WHERE r.id = :id
+      RETURNING r.id, r.firing, cur.available, r.threshold
+    )
+    INSERT INTO notif_queue (rule_id, title, payload)
+    SELECT up.id, 'LOW_STOCK ' || CAST(:sku AS text),
+           jsonb_build_object('rule_id', up.id, 'item_id', CAST(:item AS uuid), 'sku', CAST(:sku AS text),
+                              'wh_id', CAST(:wh AS uuid),
+                              'available', up.available, 'threshold', up.threshold, 'at', now())
+    FROM up WHERE up.firing
+    RETURNING id
+""")
+SQL_FEED = sa.text("""
+    SELECT q.id, q.rule_id, q.title, q.payload, q.status, q.attempts, q.last_error, q.created_at, q.sent_at
+    FROM notif_queue q
+    WHERE (CAST(:st AS text) IS NULL OR q.status = :st)
+      AND (CAST(:after AS bigint) IS NULL OR q.id > :after)
+    ORDER BY q.id DESC
+    LIMIT :n
+""")
+
+_task: Optional[asyncio.Task] = None
+_wake = asyncio.Event()
+
+
+class RuleTargetNotFound(LookupError):
+    pass
+
+
+def _payload(v: Any) -> Any:
+    return json.loads(v) if isinstance(v, str) else v
+
+
+def _json_default(o: Any):
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, UUID):
+        return str(o)
+    if hasattr(o, "isoformat"):
+        return o.isoformat()
+    raise TypeError(type(o).__name__)
+
+
+def _post_json(url: str, body: dict) -> None:
+    data = json.dumps(body, default=_json_default).encode("utf-8")
+    req = urllib.request.Request(url, data=data, method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=WEBHOOK_TIMEOUT_SEC) as resp:
+        resp.read()
+
+
+async def _deliver(channel: str, url: Optional[str], batch: list[dict]) -> None:
+    """ส่งหนึ่งกลุ่ม (channel, url) — raise เมื่อไม่สำเร็จ"""
+    if channel == "INAPP":
+        return  # feed อ่านจาก notif_queue โดยตรง (GET /notifications)
+    if channel != "WEBHOOK":
+        raise RuntimeError(f"channel {channel} is not configured")
+    if not url:
+        raise RuntimeError("webhook_url is empty")
+    body = {"notifications": batch}
+    if url.startswith(INPROC_SCHEME):
+        inproc_inbox[url[len(INPROC_SCHEME):]].append(json.loads(json.dumps(body, default=_json_default)))
+        return
+    # urllib เป็น blocking → ย้ายออกจาก event loop
+    await asyncio.to_thread(_post_json, url, body)
+
+
+async def dispatch_once(limit: int = BATCH) -> dict:
+    """ส่งงานที่ถึงเวลาหนึ่งชุด (รวมเป็น 1 request ต่อ webhook) แล้วคืนสถิติ"""
+    stats = {"claimed": 0, "sent": 0, "retry": 0, "failed_groups": 0}
+    async with AsyncSessionLocal() as s:
+        rows = (await s.execute(SQL_CLAIM, {"n": limit, "lease": LEASE_SEC})).mappings().all()
+        await s.commit()
+    stats["claimed"] = len(rows)
+    if not rows:
+        return stats
+
+    groups: dict[tuple, list] = defaultdict(list)
+    for r in rows:
+        groups[(r["channel"], r["webhook_url"])].append(r)
+
+    # ส่งโดยไม่ถือ connection; ผลแต่ละกลุ่มเก็บไว้เขียนทีเดียวตอนจบ
+    sent: list[int] = []
+    failed: list[tuple[list[int], str]] = []
+    for (channel, url), grp in groups.items():
+        ids = [int(r["id"]) for r in grp]
+        batch = [{
+            "id": r["id"], "rule_id": r["rule_id"], "title": r["title"],
+            "payload": _payload(r["payload"]), "created_at": r["created_at"],
+        } for r in grp]
+        try:
+            await _deliver(channel, url, batch)
+            sent.extend(ids)
+        except Exception as e:
+            stats["failed_groups"] += 1
+            stats["retry"] += len(ids)
+            log.warning("notif: deliver %s %s failed (%s: %s)", channel, url, type(e).__name__, e)
+            failed.append((ids, f"{type(e).__name__}: {e}"[:500]))
+
+    async with AsyncSessionLocal() as s:
+        for ids, err in failed:
+            await s.execute(SQL_RETRY, {"ids": ids, "err": err, "max": MAX_ATTEMPTS,
+                                        "base": BACKOFF_SEC, "cap": BACKOFF_MAX_SEC})
+        if sent:
+            await s.execute(SQL_SENT, {"ids": sent})
+        await s.commit()
+    stats["sent"] = len(sent)
+    return stats
+
+
+async def create_low_stock_rule(db: AsyncSession, *, sku: str, wh_code: Optional[str], threshold: float,
+                                channel: str, webhook_url: Optional[str], owner_id: Optional[UUID]) -> dict:
+    item = (await db.execute(SQL_ITEM, {"sku": sku})).mappings().first()
+    if not item:
+        raise RuleTargetNotFound(f"ไม่พบ SKU {sku}")
+    wh_id = None
+    if wh_code:
+        wh_id = (await db.execute(SQL_WH, {"code": wh_code})).scalar()
+        if wh_id is None:
+            raise RuleTargetNotFound(f"ไม่พบคลัง {wh_code}")
+    rule_id = int((await db.execute(SQL_RULE_INSERT, {
+        "item": item["item_id"], "wh": wh_id, "th": threshold, "ch": channel,
+        "url": webhook_url, "owner": str(owner_id) if owner_id else None,
+    })).scalar_one())
+    queued = (await db.execute(SQL_RULE_PRIME, {
+        "id": rule_id, "item": item["item_id"], "wh": wh_id, "sku": item["sku"],
+    })).scalar()
+    await db.commit()
+    if queued is not None:
+        wake()
+    return {"id": rule_id, "item_id": str(item["item_id"]), "wh_id": str(wh_id) if wh_id else None,
+            "firing": queued is not None}
+
+
+async def feed(db: AsyncSession, *, status: Optional[str], after_id: Optional[int], limit: int) -> list[dict]:
+    rows = (await db.execute(SQL_FEED, {"st": status, "after": after_id, "n": limit})).mappings().all()
+    return [{**r, "payload": _payload(r["payload"])} for r in rows]
+
+
+def wake() -> None:
+    """ให้ worker ส่งรอบถัดไปทันที (ไม่ต้องรอครบ DISPATCH_SEC)"""
+    _wake.set()
+
+
+async def _loop() -> None:
+    while True:
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=DISPATCH_SEC)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+        try:
+            # ชุดเต็มและส่งได้ = อาจมีค้างอีก → วนต่อทันที (ส่งไม่ได้ → รอรอบหน้า)
+            while True:
+                r = await dispatch_once()
+                if r["claimed"] < BATCH or not r["sent"]:
+                    break
+        except Exception as e:
+            log.warning("notif: dispatch failed (%s: %s)", type(e).__name__, e)
+
+
+async def start() -> None:
+    global _task
+    if _task is None and DISPATCH_SEC > 0:
+        _task = asyncio.create_task(_loop(), name="notif-dispatcher")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import zoneinfo
+from collections import defaultdict
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from ..database import DATABASE_URL
+
+# เลขเอกสาร <KIND><TEAM><YY พ.ศ.><MM><SEQ3> เช่น SOSALES6810001
+# ตัวนับต่อ (company, team, เดือน) อยู่ในตาราง *_numbering
+COUNTER_TABLES = {
+    "SO": "so_numbering",
+    "PO": "po_numbering",
+}
+
+# จำนวนเลขที่จองต่อครั้งต่อ process (1 = จองทีละเลข เรียงตามเวลาจริง)
+# >1 ลด round trip เมื่อออกเอกสารถี่ แต่เลขข้าม worker ไม่เรียงตามเวลาและเลขที่จองไว้หายเมื่อ restart
+BLOCK = max(1, int(os.getenv("DOC_NUMBER_BLOCK", "1")))
+
+_TZ = zoneinfo.ZoneInfo("Asia/Bangkok")
+
+# pool แยกของตัวนับ: ผู้เรียกถือ connection ของ request อยู่แล้วระหว่างขอเลข
+# ถ้าใช้ pool เดียวกัน การสร้าง SO/PO พร้อมกันจะกิน pool จนรอ connection ของตัวเอง
+_engine = create_async_engine(
+    DATABASE_URL, pool_pre_ping=True,
+    pool_size=int(os.getenv("DOC_NUMBER_POOL", "2")), max_overflow=int(os.getenv("DOC_NUMBER_POOL_OVERFLOW", "2")),
+)
+_Session = async_sessionmaker(_engine, expire_on_commit=False)
+
+_locks: defaultdict[tuple, asyncio.Lock] = defaultdict(asyncio.Lock)
+_pools: dict[tuple, list[int]] = {}   # key -> [next, last] ที่จองไว้แล้ว
+
+
+def th_period(now: datetime | None = None) -> tuple[str, str, int]:
+    now = now or datetime.now(_TZ)
+    mm = f"{now.month:02d}"
+    yyyymm = f"{now.year:04d}{mm}"
+    yy_th = (now.year + 543) % 100
+    return mm, yyyymm, yy_th
+
+
+async def _reserve(table: str, company_code: str, team_code: str, period: str, n: int) -> int:
+    """
+    เพิ่มตัวนับ n ใน transaction ของตัวเอง (commit ทันที) แล้วคืนค่าสุดท้าย
+    row lock ถูกถือแค่ช่วง UPSERT นี้ ไม่ใช่ตลอด transaction ของเอกสาร
+    → เอกสารทีม/เดือนเดียวกันไม่ต้องรอกัน; แลกกับเลขอาจเว้นช่วงถ้าเอกสาร rollback
+    """
+    async with _Session() as s:
+        last = (await s.execute(sa.text(f"""
+            INSERT INTO {table}(company_code, team_code, period_yyyymm, last_seq)
+            VALUES (:c, :t, :p, :n)
+            ON CONFLICT (company_code, team_code, period_yyyymm)
+            DO UPDATE SET last_seq = {table}.last_seq + :n
+            RETURNING last_seq
+        """), {"c": company_code, "t": team_code, "p": period, "n": n})).scalar_one()
+        await s.commit()
+    return int(last)
+
+
+async def allocate(kind: str, company_code: str, team_code: str, period: str) -> int:
+    table = COUNTER_TABLES[kind]
+    key = (kind, company_code, team_code, period)
+    async with _locks[key]:
+        pool = _pools.get(key)
+        if pool and pool[0] <= pool[1]:
+            seq = pool[0]
+            pool[0] += 1
+            return seq
+        last = await _reserve(table, company_code, team_code, period, BLOCK)
+        first = last - BLOCK + 1
+        # เดือนเปลี่ยน → pool ของเดือนก่อนไม่ถูกใช้อีก
+        for k in [k for k in _pools if k[3] != period]:
+            _pools.pop(k, None)
+            _locks.pop(k, None)
+        _pools[key] = [first + 1, last]
+        return first
+
+
+async def next_doc_number(kind: str, company_code: str, team_code: str) -> str:
+    mm, period, yy_th = th_period()
+    seq = await allocate(kind, company_code, team_code, period)
+    return f"{kind}{team_code}{yy_th:02d}{mm}{seq:03d}"
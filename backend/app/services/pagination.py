@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+# total=exact    : นับจริง — count(*) OVER() ในคำสั่งเดียวกับหน้า (ไม่ COUNT แยกอีกรอบ)
+# total=estimate : ประมาณจาก planner (EXPLAIN) — ไม่ต้องสแกนทั้งตาราง
+# total=none     : ไม่นับ, ดึงเกิน 1 แถวเพื่อบอก has_more
+TOTAL_MODES = ("exact", "estimate", "none")
+
+# total ของ list ที่ไม่มี filter cache ไว้ต่อ process; endpoint ที่เขียนเรียก invalidate_total()
+# TTL กันค่าค้างเมื่อมีหลาย worker/process เขียน
+TOTALS_TTL_SEC = float(os.getenv("LIST_TOTALS_TTL_SEC", "30"))
+_totals: dict[str, tuple[float, int]] = {}
+
+
+def invalidate_total(key: str) -> None:
+    _totals.pop(key, None)
+
+
+def _cached_total(key: Optional[str]) -> Optional[int]:
+    hit = _totals.get(key) if key else None
+    if hit and time.monotonic() - hit[0] < TOTALS_TTL_SEC:
+        return hit[1]
+    return None
+
+
+def _store_total(key: Optional[str], total: int) -> None:
+    if key:
+        _totals[key] = (time.monotonic(), total)
+
+
+def _page_args(page: int, per_page: int, max_per_page: int) -> tuple[int, int]:
+    page = max(1, int(page or 1))
+    per_page = max(1, min(max_per_page, int(per_page or 20)))
+    return page, per_page
+
+
+async def _estimate(db: AsyncSession, sql: str, params: dict) -> int:
+    plan = (await db.execute(sa.text(f"EXPLAIN (FORMAT JSON) {sql}"), params)).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def paginate(
+    db: AsyncSession,
+    *,
+    columns: str,
+    from_where: str,
+    order_by: str,
+    params: Optional[dict] = None,
+    page: int = 1,
+    per_page: int = 20,
+    total: str = "exact",
+    cache_key: Optional[str] = None,
+    max_per_page: int = 200,
+) -> dict:
+    """
+    ดึง 1 หน้าจาก SQL (text) พร้อม total ตาม mode
+    - from_where: "FROM ... [WHERE ...]" (ใช้ :param ได้)
+    - cache_key: ใส่เฉพาะตอน list ไม่มี filter → ใช้ total ที่ cache ไว้แทนการนับ
+    คืน {items, total, has_more, page, per_page}
+    """
+    if total not in TOTAL_MODES:
+        total = "exact"
+    page, per_page = _page_args(page, per_page, max_per_page)
+    p = dict(params or {}) | {"_off": (page - 1) * per_page}
+    tail = f"ORDER BY {order_by} OFFSET :_off LIMIT :_lim"
+    n: Optional[int] = None
+
+    if total == "exact" and (n := _cached_total(cache_key)) is None:
+        rows = (await db.execute(sa.text(
+            f"SELECT {columns}, count(*) OVER() AS _total {from_where} {tail}"
+        ), p | {"_lim": per_page})).mappings().all()
+        items = [dict(r) for r in rows]
+        if items:
+            n = int(items[0]["_total"])
+            for it in items:
+                del it["_total"]
+        else:
+            # หน้าเลยท้าย: ไม่มีแถวให้อ่าน window count → นับแยก (กรณีหายาก)
+            n = int(await db.scalar(sa.text(f"SELECT COUNT(*) {from_where}"), p) or 0)
+        _store_total(cache_key, n)
+    else:
+        rows = (await db.execute(sa.text(
+            f"SELECT {columns} {from_where} {tail}"
+        ), p | {"_lim": per_page + 1})).mappings().all()
+        items = [dict(r) for r in rows[:per_page]]
+        if total == "none":
+            return {"items": items, "total": None, "has_more": len(rows) > per_page,
+                    "page": page, "per_page": per_page}
+        if total == "estimate":
+            n = _cached_total(cache_key)
+            if n is None:
+                n = await _estimate(db, f"SELECT 1 {from_where}", p)
+            # ค่าประมาณต้องไม่น้อยกว่าที่เห็นจริง
+            n = max(n, (page - 1) * per_page + len(rows))
+
+    assert n is not None
+    return {"items": items, "total": n, "has_more": page * per_page < n,
+            "page": page, "per_page": per_page}
+
+
+async def paginate_select(
+    db: AsyncSession,
+    stmt: Select,
+    *,
+    page: int = 1,
+    per_page: int = 20,
+    total: str = "exact",
+    cache_key: Optional[str] = None,
+    max_per_page: int = 200,
+) -> dict:
+    """paginate() สำหรับ SQLAlchemy Core select (stmt ต้องมี order_by แล้ว)"""
+    if total not in TOTAL_MODES:
+        total = "exact"
+    page, per_page = _page_args(page, per_page, max_per_page)
+    off = (page - 1) * per_page
+    n: Optional[int] = None
+
+    if total == "exact" and (n := _cached_total(cache_key)) is None:
+        w = stmt.add_columns(sa.func.count().over().label("_total"))
+        rows = (await db.execute(w.offset(off).limit(per_page))).mappings().all()
+        items = [{k: v for k, v in r.items() if k != "_total"} for r in rows]
+        if rows:
+            n = int(rows[0]["_total"])
+        else:
+            n = int((await db.execute(
+                sa.select(sa.func.count()).select_from(stmt.order_by(None).subquery())
+            )).scalar() or 0)
+        _store_total(cache_key, n)
+    else:
+        rows = (await db.execute(stmt.offset(off).limit(per_page + 1))).mappings().all()
+        items = [dict(r) for r in rows[:per_page]]
+        if total == "none":
+            return {"items": items, "total": None, "has_more": len(rows) > per_page,
+                    "page": page, "per_page": per_page}
+        if total == "estimate":
+            n = _cached_total(cache_key)
+            if n is None:
+                q = sa.select(sa.literal(1)).select_from(stmt.order_by(None).subquery())
+                compiled = q.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+                n = await _estimate(db, str(compiled), {})
+            n = max(n, off + len(rows))
+
+    assert n is not None
+    return {"items": items, "total": n, "has_more": page * per_page < n,
+            "page": page, "per_page": per_page}
+
+
+# ===== keyset (cursor) บน (created_at, id) — สำหรับ infinite scroll =====
+def encode_cursor(created_at: datetime, id_: UUID | str) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id_)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """ValueError ถ้า cursor เสีย/ปลอม"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, id_ = json.loads(raw)
+        return datetime.fromisoformat(ts), UUID(id_)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+async def keyset_page(
+    db: AsyncSession,
+    *,
+    columns: str,
+    table: str,
+    where: Optional[str] = None,
+    params: Optional[dict] = None,
+    cursor: Optional[str] = None,
+    per_page: int = 20,
+    max_per_page: int = 200,
+) -> dict:
+    """
+    หน้าถัดไปเรียง created_at DESC, id DESC ต่อจาก cursor (ว่าง = หน้าแรก)
+    ใช้ index (created_at DESC, id DESC) — ไม่ต้อง sort/skip แถวก่อนหน้าเหมือน OFFSET
+    columns ต้องมี created_at และ id; คืน {items, next_cursor, has_more, per_page}
+    """
+    per_page = max(1, min(max_per_page, int(per_page or 20)))
+    conds = [where] if where else []
+    p = dict(params or {}) | {"_lim": per_page + 1}
+    if cursor:
+        p["_c_ts"], p["_c_id"] = decode_cursor(cursor)
+        conds.append("(created_at, id) < (:_c_ts, :_c_id)")
+    w = ("WHERE " + " AND ".join(conds)) if conds else ""
+    rows = (await db.execute(sa.text(
+        f"SELECT {columns} FROM {table} {w} ORDER BY created_at DESC, id DESC LIMIT :_lim"
+    ), p)).mappings().all()
+    items = [dict(r) for r in rows[:per_page]]
+    has_more = len(rows) > per_page
+    nxt = encode_cursor(items[-1]["created_at"], items[-1]["id"]) if has_more else None
+    return {"items": items, "next_cursor": nxt, "has_more": has_more, "per_page": per_page}
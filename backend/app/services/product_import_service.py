@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from typing import Iterable
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# รูปแบบไฟล์ = output ของ bin/normalize_products_csv.py
+# (sku,name,unit,price_ex_vat,team_id,cas_no) — cas_no ยังไม่มีคอลัมน์ใน products จึงไม่ได้ใช้
+SQL_UPSERT_PRODUCTS = sa.text("""
+    WITH src AS (
+      SELECT DISTINCT ON (sku) sku, name, unit, price, team_id
+      FROM unnest(
+        CAST(:sku AS text[]), CAST(:name AS text[]), CAST(:unit AS text[]),
+        CAST(:price AS numeric[]), CAST(:team AS uuid[])
+      ) WITH ORDINALITY AS t(sku, name, unit, price, team_id, n)
+      ORDER BY sku, n DESC
+    ),
+    up AS (
+      INSERT INTO products (sku, name, unit, price_ex_vat, team_id)
+      SELECT sku, name, unit, price, team_id FROM src
+      ON CONFLICT (sku) DO UPDATE
+      SET name=EXCLUDED.name, unit=EXCLUDED.unit, price_ex_vat=EXCLUDED.price_ex_vat,
+          team_id=COALESCE(EXCLUDED.team_id, products.team_id)
+      RETURNING (xmax = 0) AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted)     AS inserted,
+           COUNT(*) FILTER (WHERE NOT inserted) AS updated
+    FROM up
+""")
+
+
+def _uuid(v: str | None) -> UUID | None:
+    try:
+        return UUID(str(v).strip()) if v else None
+    except ValueError:
+        return None
+
+
+def _price(v: str | None) -> Decimal:
+    try:
+        return Decimal((v or "0").replace(",", "").strip() or "0")
+    except InvalidOperation:
+        return Decimal("0")
+
+
+def parse_products_csv(content: bytes) -> list[dict]:
+    text = content.decode("utf-8-sig", errors="ignore")
+    out: list[dict] = []
+    for r in csv.DictReader(io.StringIO(text)):
+        sku = (r.get("sku") or "").strip()
+        out.append({
+            "sku": sku or None,
+            "name": (r.get("name") or "").strip() or sku,
+            "unit": (r.get("unit") or "").strip() or "EA",
+            "price_ex_vat": _price(r.get("price_ex_vat")),
+            "team_id": _uuid(r.get("team_id")),
+        })
+    return out
+
+
+async def bulk_upsert_products(db: AsyncSession, items: Iterable[dict]) -> dict:
+    """upsert ตาม sku ด้วยคำสั่งเดียว (unnest arrays) — ไม่ commit"""
+    items = list(items)
+    rows = [it for it in items if it.get("sku")]
+    skipped = len(items) - len(rows)
+    if not rows:
+        return {"inserted": 0, "updated": 0, "skipped": skipped}
+    m = (await db.execute(SQL_UPSERT_PRODUCTS, {
+        "sku": [r["sku"] for r in rows],
+        "name": [r["name"] for r in rows],
+        "unit": [r["unit"] for r in rows],
+        "price": [r["price_ex_vat"] for r in rows],
+        "team": [r["team_id"] for r in rows],
+    })).mappings().one()
+    return {"inserted": int(m["inserted"] or 0), "updated": int(m["updated"] or 0), "skipped": skipped}
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# ฟิลด์ของรายการที่รับจาก payload (ตรงกับคอลัมน์ quotation_items ที่ reflect มา)
+ITEM_FIELDS = (
+    "product_id", "sku", "name", "qty", "price_ex_vat", "part_no", "description", "cas_no",
+    "package_label", "warn_text", "discount_rate", "discount_amount", "catalog_id",
+)
+_DEFAULTS = {"name": "", "qty": 1, "price_ex_vat": 0}
+
+
+class ItemLineError(ValueError):
+    def __init__(self, index: int, msg: str):
+        super().__init__(f"items[{index}]: {msg}")
+        self.index = index
+
+
+def item_values(qid, it: dict[str, Any], index: int = 0) -> dict[str, Any]:
+    if not it.get("sku"):
+        raise ItemLineError(index, "sku is required")
+    out = {"quotation_id": qid}
+    for f in ITEM_FIELDS:
+        out[f] = it.get(f, _DEFAULTS.get(f))
+    return out
+
+
+def _same(old: Any, new: Any) -> bool:
+    if old is None or new is None:
+        return old is None and new is None
+    if isinstance(old, Decimal) or isinstance(new, (int, float, Decimal)):
+        try:
+            return Decimal(str(old)) == Decimal(str(new))
+        except InvalidOperation:
+            return False
+    if isinstance(old, UUID) or isinstance(new, UUID):
+        return str(old) == str(new)
+    return old == new
+
+
+def _json_default(o: Any):
+    if isinstance(o, (Decimal, UUID)):
+        return str(o)
+    raise TypeError(type(o).__name__)
+
+
+class QuotationItemsWriter:
+    """statement แบบ set-based ของ quotation_items — สร้างครั้งเดียวจากตารางที่ reflect แล้ว"""
+
+    def __init__(self, qi: sa.Table):
+        self.table = qi
+        self.fields = [f for f in ITEM_FIELDS if f in qi.c]
+        dialect = postgresql.dialect()
+        quote = dialect.identifier_preparer.quote
+        defs = ", ".join(f"{quote(c)} {qi.c[c].type.compile(dialect=dialect)}" for c in ["id", *self.fields])
+        sets = ", ".join(f"{quote(c)} = v.{quote(c)}" for c in self.fields)
+        # หลายแถวใน UPDATE เดียว: ค่ามาเป็น jsonb array แล้วแตกเป็น record ตามชนิดคอลัมน์จริง
+        self.update_many = sa.text(f"""
+            UPDATE {quote(qi.name)} AS t SET {sets}
+            FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS v({defs})
+            WHERE t.id = v.id AND t.quotation_id = :qid
+        """)
+        self.insert_many = sa.insert(qi).returning(qi.c.id, sort_by_parameter_order=True)
+        self.delete_many = sa.delete(qi).where(qi.c.quotation_id == sa.bindparam("qid"),
+                                               qi.c.id.in_(sa.bindparam("ids", expanding=True)))
+        self.lock_existing = (sa.select(qi).where(qi.c.quotation_id == sa.bindparam("qid"))
+                              .order_by(qi.c.id).with_for_update())
+
+    def _row(self, qid, it: dict, index: int) -> dict:
+        v = item_values(qid, it, index)
+        return {k: v[k] for k in ("quotation_id", *self.fields)}
+
+    async def _insert_rows(self, db: AsyncSession, rows: list[dict]) -> list:
+        if not rows:
+            return []
+        return list((await db.execute(self.insert_many, rows)).scalars().all())
+
+    async def insert(self, db: AsyncSession, qid, items: list[dict]) -> list:
+        """เพิ่มหลายรายการใน INSERT เดียว (multi-VALUES) คืน id ตามลำดับ input"""
+        return await self._insert_rows(db, [self._row(qid, it, i) for i, it in enumerate(items)])
+
+    async def sync(self, db: AsyncSession, qid, items: list[dict]) -> dict:
+        """
+        ทำให้รายการของใบเสนอราคาเท่ากับ items โดยเทียบกับของเดิม:
+        จับคู่ด้วย id ก่อน แล้วค่อย catalog_id → ได้ insert / update / delete อย่างละไม่เกิน 1 statement
+        คืนผลต่อบรรทัดตามลำดับ input + id ที่ถูกลบ
+        """
+        existing = {str(r["id"]): r for r in (await db.execute(self.lock_existing, {"qid": qid})).mappings().all()}
+        by_catalog: dict[str, list[str]] = {}
+        for eid, r in existing.items():
+            if r.get("catalog_id") is not None:
+                by_catalog.setdefault(str(r["catalog_id"]), []).append(eid)
+
+        matched: set[str] = set()
+        plan: list[tuple[str, Optional[str], dict]] = []   # (action, existing id, row)
+        for i, it in enumerate(items):
+            row = self._row(qid, it, i)
+            eid = str(it["id"]) if it.get("id") else None
+            if eid is not None:
+                if eid not in existing or eid in matched:
+                    raise ItemLineError(i, f"id {eid} is not a line of this quotation")
+            elif row.get("catalog_id") is not None:
+                eid = next((e for e in by_catalog.get(str(row["catalog_id"]), ()) if e not in matched), None)
+            if eid is None:
+                plan.append(("inserted", None, row))
+                continue
+            matched.add(eid)
+            old = existing[eid]
+            changed = any(not _same(old.get(f), row[f]) for f in self.fields)
+            plan.append(("updated" if changed else "unchanged", eid, row))
+
+        deleted = [eid for eid in existing if eid not in matched]
+        if deleted:
+            await db.execute(self.delete_many, {"qid": qid, "ids": [existing[e]["id"] for e in deleted]})
+        upd = [{"id": eid, **{f: row[f] for f in self.fields}} for action, eid, row in plan if action == "updated"]
+        if upd:
+            await db.execute(self.update_many, {"qid": qid, "rows": json.dumps(upd, default=_json_default)})
+        new_ids = iter(await self._insert_rows(db, [row for action, _, row in plan if action == "inserted"]))
+
+        lines = []
+        for i, (action, eid, _) in enumerate(plan):
+            lines.append({"index": i, "id": str(next(new_ids)) if action == "inserted" else eid, "action": action})
+        summary = {a: sum(1 for l in lines if l["action"] == a) for a in ("inserted", "updated", "unchanged")}
+        summary["deleted"] = len(deleted)
+        return {"lines": lines, "deleted": deleted, "summary": summary}
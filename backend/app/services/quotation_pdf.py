@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Optional, Sequence
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+log = logging.getLogger("uvicorn.error")
+
+WORKERS = max(1, int(os.getenv("PDF_WORKERS", "2")))
+CACHE_BYTES = int(float(os.getenv("PDF_CACHE_MB", "64")) * 1024 * 1024)
+MAX_BATCH = int(os.getenv("PDF_MAX_BATCH", "200"))
+# TTF ที่มีอักษรไทย (เช่น THSarabunNew.ttf) — ไม่ตั้ง = Helvetica (ภาษาไทยจะไม่แสดง)
+FONT_PATH = os.getenv("PDF_FONT_PATH")
+# เปลี่ยนเมื่อแก้ layout → hash ใหม่ ไม่ใช้ PDF เก่าใน cache
+LAYOUT_VERSION = "1"
+
+SQL_HEADS = sa.text("SELECT * FROM quotations WHERE id = ANY(:ids)")
+SQL_ITEMS = sa.text("SELECT * FROM quotation_items WHERE quotation_id = ANY(:ids) ORDER BY quotation_id, id")
+
+
+class PdfUnavailable(RuntimeError):
+    pass
+
+
+def _plain(v: Any) -> Any:
+    if isinstance(v, (Decimal, UUID)):
+        return str(v)
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    return v
+
+
+def _num(v: Any) -> Decimal:
+    try:
+        return Decimal(str(v)) if v not in (None, "") else Decimal(0)
+    except Exception:
+        return Decimal(0)
+
+
+def _rate(v: Any) -> Decimal:
+    # หน่วยเดิมของระบบเป็นสัดส่วน (0.07 = 7%); ค่าที่ > 1 ถือเป็นเปอร์เซ็นต์
+    r = _num(v)
+    return r / 100 if r > 1 else r
+
+
+def _money(v: Decimal) -> str:
+    return f"{v.quantize(Decimal('0.01')):,}"
+
+
+# ===== render (รันใน process pool — ต้องเป็นฟังก์ชันระดับ module ที่ pickle ได้) =====
+def _render(doc: dict) -> bytes:
+    try:
+        from reportlab.lib.pagesizes import A4  # lazy import
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+    except ImportError as e:
+        raise PdfUnavailable(f"ต้องติดตั้ง reportlab สำหรับ PDF: {e}")
+
+    font = "Helvetica"
+    if FONT_PATH and os.path.exists(FONT_PATH):
+        font = "DocFont"
+        if font not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(font, FONT_PATH))
+
+    head, items = doc["head"], doc["items"]
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4, pageCompression=1)
+    c.setTitle(str(head.get("number") or "quotation"))
+    w, h = A4
+    left, right, bottom = 40, w - 40, 60
+    cols = [(left, "#"), (left + 25, "SKU"), (left + 120, "Description"),
+            (right - 170, "Qty"), (right - 110, "Price"), (right - 50, "Amount")]
+
+    def table_header(y: float) -> float:
+        c.setFont(font, 10)
+        for x, label in cols:
+            c.drawString(x, y, label)
+        c.line(left, y - 4, right, y - 4)
+        return y - 18
+
+    y = h - 50
+    c.setFont(font, 16)
+    c.drawString(left, y, "ใบเสนอราคา / QUOTATION")
+    c.setFont(font, 10)
+    y -= 22
+    for label, key in (("No.", "number"), ("Date", "created_at"), ("Customer", "customer"),
+                       ("Sales", "sales_name"), ("Phone", "sales_phone"), ("Email", "sales_email")):
+        val = head.get(key)
+        if val:
+            c.drawString(left, y, f"{label}: {str(val)[:10] if key == 'created_at' else val}")
+            y -= 14
+    y = table_header(y - 10)
+
+    subtotal = Decimal(0)
+    for n, it in enumerate(items, 1):
+        if y < bottom + 20:
+            c.showPage()
+            y = table_header(h - 50)
+        qty, price = _num(it.get("qty")), _num(it.get("price_ex_vat"))
+        gross = qty * price
+        amount = gross - (_num(it.get("discount_amount")) or gross * _rate(it.get("discount_rate")))
+        subtotal += amount
+        c.setFont(font, 9)
+        c.drawString(cols[0][0], y, str(n))
+        c.drawString(cols[1][0], y, str(it.get("sku") or "")[:18])
+        c.drawString(cols[2][0], y, str(it.get("name") or "")[:60])
+        c.drawRightString(cols[3][0] + 30, y, f"{qty.normalize():f}")
+        c.drawRightString(cols[4][0] + 45, y, _money(price))
+        c.drawRightString(right, y, _money(amount))
+        y -= 14
+
+    doc_disc = _num(head.get("doc_discount_amount")) or subtotal * _rate(head.get("doc_discount_rate"))
+    net = subtotal - doc_disc
+    vat = net * _rate(head.get("vat_rate"))
+    if y < bottom + 70:
+        c.showPage()
+        y = h - 50
+    c.line(left, y + 6, right, y + 6)
+    c.setFont(font, 10)
+    for label, val in (("Subtotal", subtotal), ("Discount", doc_disc), ("After discount", net),
+                       ("VAT", vat), ("Total", net + vat)):
+        y -= 14
+        c.drawRightString(right - 90, y, label)
+        c.drawRightString(right, y, _money(val))
+    if head.get("notes"):
+        c.drawString(left, y - 24, f"Notes: {head['notes']}"[:110])
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+@dataclass
+class RenderedPdf:
+    quotation_id: str
+    number: str
+    content_hash: str
+    data: bytes
+
+
+class QuotationPdfService:
+    """PDF ใบเสนอราคา: render ใน process pool + cache (id, content hash) แบบ LRU จำกัดขนาดรวม"""
+
+    def __init__(self, workers: int = WORKERS, cache_bytes: int = CACHE_BYTES):
+        self._workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[tuple[str, str], bytes]" = OrderedDict()
+        self._cache_bytes = cache_bytes
+        self._size = 0
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self._workers)
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _put(self, key: tuple[str, str], data: bytes) -> None:
+        if len(data) > self._cache_bytes:
+            return
+        # id เดียวกันแต่ hash เก่า (เอกสารถูกแก้) → ไม่มีวันถูกอ่านอีก ทิ้งเลย
+        for k in [k for k in self._cache if k[0] == key[0] and k != key]:
+            self._size -= len(self._cache.pop(k))
+        self._cache[key] = data
+        self._size += len(data)
+        while self._size > self._cache_bytes:
+            _, old = self._cache.popitem(last=False)
+            self._size -= len(old)
+            self.stats["evictions"] += 1
+
+    async def _load(self, db: AsyncSession, ids: Sequence[UUID]) -> dict[str, dict]:
+        heads = (await db.execute(SQL_HEADS, {"ids": list(ids)})).mappings().all()
+        docs = {str(r["id"]): {"head": {k: _plain(v) for k, v in r.items()}, "items": []} for r in heads}
+        for r in (await db.execute(SQL_ITEMS, {"ids": list(ids)})).mappings().all():
+            docs[str(r["quotation_id"])]["items"].append({k: _plain(v) for k, v in r.items()})
+        return docs
+
+    async def _render_one(self, qid: str, doc: dict) -> RenderedPdf:
+        h = hashlib.sha256(
+            (LAYOUT_VERSION + (FONT_PATH or "") + json.dumps(doc, sort_keys=True, default=str)).encode("utf-8")
+        ).hexdigest()[:32]
+        key = (qid, h)
+        number = str(doc["head"].get("number") or qid)
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return RenderedPdf(qid, number, h, data)
+
+        self.stats["misses"] += 1
+        fut = self._inflight.get(key)
+        if fut is None:
+            # ใบเดียวกันถูกขอพร้อมกัน → render ครั้งเดียว; client ตัดการเชื่อมต่อก็ยังเก็บผลเข้า cache
+            fut = asyncio.get_running_loop().run_in_executor(self._executor(), _render, doc)
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f: self._done(key, f))
+        data = await asyncio.shield(fut)
+        return RenderedPdf(qid, number, h, data)
+
+    def _done(self, key: tuple[str, str], fut: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not fut.cancelled() and fut.exception() is None:
+            self._put(key, fut.result())
+
+    async def render(self, db: AsyncSession, qid: UUID) -> Optional[RenderedPdf]:
+        docs = await self._load(db, [qid])
+        doc = docs.get(str(qid))
+        return await self._render_one(str(qid), doc) if doc else None
+
+    async def render_many(self, db: AsyncSession, ids: Sequence[UUID]) -> tuple[list[RenderedPdf], list[str]]:
+        """render หลายใบพร้อมกัน (กระจายไปทุก worker) คืน (ผลตามลำดับ ids, id ที่ไม่พบ)"""
+        docs = await self._load(db, ids)
+        keys = list(dict.fromkeys(str(i) for i in ids))
+        found = [k for k in keys if k in docs]
+        out = await asyncio.gather(*(self._render_one(k, docs[k]) for k in found))
+        return list(out), [k for k in keys if k not in docs]
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._cache), "bytes": self._size, "max_bytes": self._cache_bytes}
+
+
+def safe_filename(number: str) -> str:
+    """ชื่อไฟล์จากเลขเอกสาร: เฉพาะ ASCII ตัวอักษร/ตัวเลข/-_ (ใส่ใน header ได้เสมอ)"""
+    name = "".join(ch if (ch.isascii() and ch.isalnum()) or ch in "-_" else "_" for ch in number)
+    return name or "quotation"
+
+
+def build_zip(pdfs: Sequence[RenderedPdf]) -> bytes:
+    # PDF บีบอัดมาแล้ว → STORED (ไม่เสีย CPU บีบซ้ำ)
+    buf = io.BytesIO()
+    seen: dict[str, int] = {}
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for p in pdfs:
+            name = safe_filename(p.number)
+            seen[name] = seen.get(name, 0) + 1
+            if seen[name] > 1:
+                name = f"{name}-{seen[name]}"
+            zf.writestr(f"{name}.pdf", p.data)
+    return buf.getvalue()
+
+
+pdf_service = QuotationPdfService()
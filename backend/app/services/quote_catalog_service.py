@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import csv
+import io
+from decimal import Decimal
+from typing import Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .catalog_suggest import suggest_index
+from .pagination import invalidate_total
+
+CATALOG_COLS = ("sku", "part_no", "description", "cas_no", "package_label", "warn_text", "default_price_ex_vat")
+
+TOTAL_KEY = "quote_catalog"   # cache key ของ total (list ไม่มี filter)
+
+
+def catalog_changed() -> None:
+    """เรียกหลัง commit ที่แก้ quote_catalog: ล้าง suggest vocabulary + total ที่ cache ไว้"""
+    suggest_index.invalidate()
+    invalidate_total(TOTAL_KEY)
+
+
+# ===== Import helpers =====
+def _norm(s: str | None) -> str | None:
+    if s is None: return None
+    s = str(s).strip()
+    return s or None
+
+def _num(v) -> float | None:
+    if v is None: return None
+    s = str(v).replace(",", "").strip()
+    if s == "": return None
+    try:
+        return float(Decimal(s))
+    except Exception:
+        return None
+
+_HEADER_MAP = {
+    "part_no": {"part no", "partno", "รหัสสินค้า", "รหัส", "itemcode"},
+    "description": {"description", "descriptions", "รายละเอียด", "ชื่อสินค้า"},
+    "cas_no": {"cas", "cas no", "casno", "เลขcas", "casเลขที่"},
+    "package_label": {"package", "pack", "ขนาดบรรจุ", "หน่วย", "unit"},
+    "warn_text": {"warn", "หมายเหตุ", "note", "warning"},
+    "default_price_ex_vat": {"unit price", "price", "ราคาต่อหน่วย", "ราคา/หน่วย"},
+    "sku": {"sku", "รหัสสต็อก"},
+}
+def _key_of(col: str) -> str | None:
+    c = col.lower().strip().replace(".", "").replace("_", " ")
+    for k, names in _HEADER_MAP.items():
+        if c in names: return k
+    return None
+
+def _parse_csv_catalog(file_bytes: bytes) -> list[dict]:
+    text = file_bytes.decode("utf-8-sig", errors="ignore")
+    rdr = csv.reader(io.StringIO(text))
+    rows = list(rdr)
+    if not rows: return []
+    head = rows[0]
+    pos: dict[str, int] = {}
+    for i, h in enumerate(head):
+        key = _key_of(h or "")
+        if key: pos[key] = i
+    out: list[dict] = []
+    for r in rows[1:]:
+        if not any(r): continue
+        def get(k):
+            i = pos.get(k)
+            return r[i].strip() if i is not None and i < len(r) and r[i] is not None else None
+        out.append({
+            "sku": _norm(get("sku")),
+            "part_no": _norm(get("part_no")),
+            "description": _norm(get("description")),
+            "cas_no": _norm(get("cas_no")),
+            "package_label": _norm(get("package_label")),
+            "warn_text": _norm(get("warn_text")),
+            "default_price_ex_vat": _num(get("default_price_ex_vat")),
+        })
+    return out
+
+def _parse_xlsx_catalog(file_bytes: bytes) -> list[dict]:
+    try:
+        import openpyxl  # lazy import
+    except Exception as e:
+        raise ValueError(f"ต้องติดตั้ง openpyxl สำหรับ .xlsx: {e}")
+    wb = openpyxl.load_workbook(io.BytesIO(file_bytes), data_only=True)
+    ws = wb.active
+    rows = list(ws.iter_rows(values_only=True))
+    if not rows: return []
+    head = [str(c or "") for c in rows[0]]
+    pos: dict[str, int] = {}
+    for i, h in enumerate(head):
+        key = _key_of(h or "")
+        if key: pos[key] = i
+    out: list[dict] = []
+    for r in rows[1:]:
+        if r is None: continue
+        cells = [str(c) if c is not None else "" for c in r]
+        if not any(cells): continue
+        def get(k):
+            i = pos.get(k)
+            return (cells[i].strip() if i is not None and i < len(cells) else None)
+        out.append({
+            "sku": _norm(get("sku")),
+            "part_no": _norm(get("part_no")),
+            "description": _norm(get("description")),
+            "cas_no": _norm(get("cas_no")),
+            "package_label": _norm(get("package_label")),
+            "warn_text": _norm(get("warn_text")),
+            "default_price_ex_vat": _num(get("default_price_ex_vat")),
+        })
+    return out
+
+def parse_catalog_file(file_name: str, content: bytes) -> list[dict]:
+    """แยกตามนามสกุลไฟล์ (.csv/.xlsx) — ValueError ถ้าไม่รองรับ"""
+    name = (file_name or "").lower()
+    if name.endswith(".csv"):
+        return _parse_csv_catalog(content)
+    if name.endswith(".xlsx"):
+        return _parse_xlsx_catalog(content)
+    raise ValueError("รองรับเฉพาะ .csv หรือ .xlsx")
+
+
+# ===== row-by-row (ของเดิม) — คงไว้เป็น fallback/benchmark baseline =====
+SQL_UPSERT_ONE = sa.text("""
+    INSERT INTO quote_catalog (sku, part_no, description, cas_no, package_label, warn_text, default_price_ex_vat)
+    VALUES (:sku, :part_no, :description, :cas_no, :package_label, :warn_text, :price)
+    ON CONFLICT (part_no, COALESCE(package_label,'')) DO UPDATE
+    SET sku=COALESCE(EXCLUDED.sku, quote_catalog.sku),
+        description=COALESCE(EXCLUDED.description, quote_catalog.description),
+        cas_no=COALESCE(EXCLUDED.cas_no, quote_catalog.cas_no),
+        package_label=COALESCE(EXCLUDED.package_label, quote_catalog.package_label),
+        warn_text=COALESCE(EXCLUDED.warn_text, quote_catalog.warn_text),
+        default_price_ex_vat=COALESCE(EXCLUDED.default_price_ex_vat, quote_catalog.default_price_ex_vat)
+    RETURNING (xmax = 0) AS inserted
+""")
+
+# ===== bulk: staging (temp) → set-based merge =====
+SQL_STAGE_CREATE = sa.text("""
+    CREATE TEMP TABLE IF NOT EXISTS _quote_catalog_stage (
+      row_no               int NOT NULL,
+      sku                  text,
+      part_no              text,
+      description          text,
+      cas_no               text,
+      package_label        text,
+      warn_text            text,
+      default_price_ex_vat numeric
+    ) ON COMMIT DROP
+""")
+
+SQL_STAGE_INSERT = sa.text("""
+    INSERT INTO _quote_catalog_stage (row_no, sku, part_no, description, cas_no, package_label, warn_text, default_price_ex_vat)
+    VALUES (:row_no, :sku, :part_no, :description, :cas_no, :package_label, :warn_text, :default_price_ex_vat)
+""")
+
+# แถวที่ key ซ้ำในไฟล์เดียวกันถูกรวมเป็นแถวเดียว: ค่า non-null ของแถวหลังสุดชนะ
+# (ให้ผลเท่ากับการวน upsert ทีละแถวตามลำดับด้วย COALESCE)
+# แถวที่ไม่มี part_no ไม่ชน key ใด (NULL) → แยกกลุ่มตาม row_no = INSERT ใหม่ทุกแถวเหมือนเดิม
+SQL_MERGE = sa.text("""
+    WITH src AS (
+      SELECT part_no,
+             COALESCE(package_label,'') AS pkg_key,
+             (array_agg(sku ORDER BY row_no DESC) FILTER (WHERE sku IS NOT NULL))[1] AS sku,
+             (array_agg(description ORDER BY row_no DESC) FILTER (WHERE description IS NOT NULL))[1] AS description,
+             (array_agg(cas_no ORDER BY row_no DESC) FILTER (WHERE cas_no IS NOT NULL))[1] AS cas_no,
+             (array_agg(package_label ORDER BY row_no DESC) FILTER (WHERE package_label IS NOT NULL))[1] AS package_label,
+             (array_agg(warn_text ORDER BY row_no DESC) FILTER (WHERE warn_text IS NOT NULL))[1] AS warn_text,
+             (array_agg(default_price_ex_vat ORDER BY row_no DESC) FILTER (WHERE default_price_ex_vat IS NOT NULL))[1] AS default_price_ex_vat
+      FROM _quote_catalog_stage
+      GROUP BY part_no, COALESCE(package_label,''), CASE WHEN part_no IS NULL THEN row_no END
+    ),
+    up AS (
+      INSERT INTO quote_catalog (sku, part_no, description, cas_no, package_label, warn_text, default_price_ex_vat)
+      SELECT sku, part_no, description, cas_no, package_label, warn_text, default_price_ex_vat FROM src
+      ON CONFLICT (part_no, COALESCE(package_label,'')) DO UPDATE
+      SET sku=COALESCE(EXCLUDED.sku, quote_catalog.sku),
+          description=COALESCE(EXCLUDED.description, quote_catalog.description),
+          cas_no=COALESCE(EXCLUDED.cas_no, quote_catalog.cas_no),
+          package_label=COALESCE(EXCLUDED.package_label, quote_catalog.package_label),
+          warn_text=COALESCE(EXCLUDED.warn_text, quote_catalog.warn_text),
+          default_price_ex_vat=COALESCE(EXCLUDED.default_price_ex_vat, quote_catalog.default_price_ex_vat)
+      RETURNING (xmax = 0) AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted)     AS inserted,
+           COUNT(*) FILTER (WHERE NOT inserted) AS updated
+    FROM up
+""")
+
+
+def _usable(it: dict) -> bool:
+    # ข้ามเฉพาะแถวว่าง (ไม่มีทั้ง part_no และ description) เหมือน loop เดิม
+    return bool(it.get("part_no") or it.get("description"))
+
+
+def _price(v) -> Decimal | None:
+    return Decimal(str(v)) if v is not None else None
+
+
+async def upsert_catalog_rowwise(db: AsyncSession, items: Iterable[dict]) -> dict:
+    """upsert ทีละแถว (1 round trip ต่อแถว) — ใช้เทียบ benchmark"""
+    inserted = updated = skipped = 0
+    for it in items:
+        if not _usable(it):
+            skipped += 1
+            continue
+        r = await db.execute(SQL_UPSERT_ONE, {
+            "sku": it.get("sku"),
+            "part_no": it.get("part_no"),
+            "description": it.get("description"),
+            "cas_no": it.get("cas_no"),
+            "package_label": it.get("package_label"),
+            "warn_text": it.get("warn_text"),
+            "price": it.get("default_price_ex_vat"),
+        })
+        if r.scalar():
+            inserted += 1
+        else:
+            updated += 1
+    return {"inserted": inserted, "updated": updated, "skipped": skipped}
+
+
+async def _copy_to_stage(db: AsyncSession, rows: list[tuple]) -> None:
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    driver = getattr(raw, "driver_connection", None)
+    if driver is not None and hasattr(driver, "copy_records_to_table"):
+        # asyncpg: COPY ... FROM STDIN (binary) — round trip เดียว
+        await driver.copy_records_to_table(
+            "_quote_catalog_stage", records=rows, columns=["row_no", *CATALOG_COLS],
+        )
+        return
+    # driver อื่น: executemany (insertmanyvalues) แทน COPY
+    keys = ("row_no", *CATALOG_COLS)
+    await db.execute(SQL_STAGE_INSERT, [dict(zip(keys, r)) for r in rows])
+
+
+async def bulk_upsert_catalog(db: AsyncSession, items: Iterable[dict]) -> dict:
+    """
+    COPY แถวทั้งหมดลง temp staging แล้ว merge เข้า quote_catalog ด้วยคำสั่งเดียว
+    (semantics เดียวกับ upsert_catalog_rowwise) — ไม่ commit ให้ caller จัดการ transaction
+    """
+    rows: list[tuple] = []
+    skipped = 0
+    for i, it in enumerate(items, start=1):
+        if not _usable(it):
+            skipped += 1
+            continue
+        rows.append((
+            i, it.get("sku"), it.get("part_no"), it.get("description"), it.get("cas_no"),
+            it.get("package_label"), it.get("warn_text"), _price(it.get("default_price_ex_vat")),
+        ))
+    if not rows:
+        return {"inserted": 0, "updated": 0, "skipped": skipped}
+
+    await db.execute(SQL_STAGE_CREATE)
+    await db.execute(sa.text("TRUNCATE _quote_catalog_stage"))
+    await _copy_to_stage(db, rows)
+    m = (await db.execute(SQL_MERGE)).mappings().one()
+    return {"inserted": int(m["inserted"] or 0), "updated": int(m["updated"] or 0), "skipped": skipped}
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+import sqlalchemy as sa
+
+from ..database import AsyncSessionLocal
+from ..security.jwtauth import ACCESS_TTL_MIN
+
+log = logging.getLogger("uvicorn.error")
+
+# GC ตาราง sessions เป็นระยะ (แทนการรัน scripts/cleanup_sessions.sql ด้วยมือ)
+GC_SEC = float(os.getenv("SESSION_GC_SEC", "600"))                  # 0 = ปิด job
+RETENTION_DAYS = int(os.getenv("SESSION_GC_RETENTION_DAYS", "30"))  # session ที่จบแล้วเก็บไว้กี่วัน
+BATCH = int(os.getenv("SESSION_GC_BATCH", "500"))
+MAX_BATCHES = int(os.getenv("SESSION_GC_MAX_BATCHES", "200"))       # ต่อรอบ ที่เหลือไว้รอบหน้า
+PAUSE_SEC = 0.05                                                    # พักระหว่าง batch ให้ request อื่นได้ lock
+
+# idle/หมดอายุ → ปิด session ล่วงหน้า (เงื่อนไขเดียวกับ require_user)
+# แต่ละ batch เป็น transaction สั้น ๆ; SKIP LOCKED → ไม่รอแถวที่ request กำลัง touch อยู่
+SQL_EXPIRE = sa.text("""
+    UPDATE sessions SET ended_at = now(), revoked = TRUE
+     WHERE id IN (
+       SELECT id FROM sessions
+        WHERE ended_at IS NULL AND revoked = FALSE
+          AND (last_seen_at < now() - make_interval(mins => :idle_min) OR expires_at < now())
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+     )
+""")
+
+SQL_DELETE = sa.text("""
+    DELETE FROM sessions
+     WHERE id IN (
+       SELECT id FROM sessions
+        WHERE (revoked = TRUE OR ended_at IS NOT NULL)
+          AND COALESCE(ended_at, created_at) < now() - make_interval(days => :days)
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+     )
+""")
+
+_task: Optional[asyncio.Task] = None
+last_run: dict = {}
+totals = {"runs": 0, "expired": 0, "deleted": 0, "errors": 0}
+
+
+async def _batched(sql: sa.TextClause, params: dict) -> tuple[int, int]:
+    """รัน sql ทีละ batch (commit ทุก batch) จนหมดหรือครบ MAX_BATCHES คืน (แถว, จำนวน batch)"""
+    rows = batches = 0
+    while batches < MAX_BATCHES:
+        async with AsyncSessionLocal() as s:
+            n = (await s.execute(sql, {**params, "batch": BATCH})).rowcount or 0
+            await s.commit()
+        batches += 1
+        rows += n
+        if n < BATCH:
+            break
+        await asyncio.sleep(PAUSE_SEC)
+    return rows, batches
+
+
+async def run_once() -> dict:
+    t0 = time.perf_counter()
+    expired, b1 = await _batched(SQL_EXPIRE, {"idle_min": ACCESS_TTL_MIN})
+    deleted, b2 = await _batched(SQL_DELETE, {"days": RETENTION_DAYS})
+    res = {"expired": expired, "deleted": deleted, "batches": b1 + b2, "at": time.time(),
+           "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    totals["runs"] += 1
+    totals["expired"] += expired
+    totals["deleted"] += deleted
+    last_run.clear()
+    last_run.update(res)
+    if expired or deleted:
+        log.info("session gc: expired=%d deleted=%d (%d batches, %.0f ms)", expired, deleted, res["batches"], res["ms"])
+    return res
+
+
+def snapshot() -> dict:
+    return {**totals, "last_run": last_run or None, "interval_sec": GC_SEC, "retention_days": RETENTION_DAYS,
+            "batch": BATCH, "idle_min": ACCESS_TTL_MIN}
+
+
+async def _loop() -> None:
+    while True:
+        try:
+            await run_once()
+        except Exception as e:
+            totals["errors"] += 1
+            log.warning("session gc: run failed (%s: %s)", type(e).__name__, e)
+        await asyncio.sleep(GC_SEC)
+
+
+async def start() -> None:
+    global _task
+    if _task is None and GC_SEC > 0:
+        _task = asyncio.create_task(_loop(), name="session-gc")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import sqlalchemy as sa
+
+from ..database import AsyncSessionLocal
+
+log = logging.getLogger("uvicorn.error")
+
+# พับ stock_kpi_deltas เข้า stock_kpi_rollup ทุก ๆ FOLD_SEC (0 = ปิด) — migration stock_kpis
+FOLD_SEC = float(os.getenv("STOCK_ROLLUP_FOLD_SEC", "30"))
+
+# ลบ deltas แล้วบวกเข้าแถวรวมใน statement เดียว — หลาย worker พับพร้อมกันได้ (แต่ละแถวถูกลบครั้งเดียว)
+SQL_FOLD = sa.text("""
+    WITH d AS (
+      DELETE FROM stock_kpi_deltas RETURNING on_hand, reserved
+    ),
+    g AS (
+      SELECT count(*) AS n, COALESCE(sum(on_hand), 0) AS on_hand, COALESCE(sum(reserved), 0) AS reserved FROM d
+    ),
+    up AS (
+      UPDATE stock_kpi_rollup r SET on_hand = r.on_hand + g.on_hand, reserved = r.reserved + g.reserved
+        FROM g WHERE r.id AND g.n > 0
+    )
+    SELECT n FROM g
+""")
+
+_task: Optional[asyncio.Task] = None
+
+
+async def fold_once() -> int:
+    async with AsyncSessionLocal() as s:
+        n = int((await s.execute(SQL_FOLD)).scalar() or 0)
+        await s.commit()
+    return n
+
+
+async def _loop() -> None:
+    while True:
+        await asyncio.sleep(FOLD_SEC)
+        try:
+            await fold_once()
+        except Exception as e:
+            log.warning("stock rollup: fold failed (%s: %s)", type(e).__name__, e)
+
+
+async def start() -> None:
+    global _task
+    if _task is None and FOLD_SEC > 0:
+        _task = asyncio.create_task(_loop(), name="stock-rollup-fold")
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1 @@
+# benchmark scripts — รันจากโฟลเดอร์ backend: python -m bench.<name>
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import os
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+
+def database_url() -> str:
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        raise SystemExit("DATABASE_URL not set")
+    return url
+
+
+@asynccontextmanager
+async def rollback_session():
+    """session ที่ rollback ทุกครั้ง — benchmark ไม่ทิ้งข้อมูลไว้ใน DB"""
+    engine = create_async_engine(database_url(), echo=False)
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            try:
+                yield db
+            finally:
+                await db.rollback()
+    finally:
+        await engine.dispose()
+
+
+class Timer:
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.t0
+
+
+def report(label: str, seconds: float, n: int, extra: dict | None = None) -> None:
+    rate = n / seconds if seconds > 0 else float("inf")
+    tail = f"  {extra}" if extra else ""
+    print(f"{label:<16} {seconds:9.3f}s  {rate:12,.0f} rows/s{tail}")
@@ -0,0 +1,68 @@
+"""
+เทียบ predicate เดือนของ dashboard บนตารางเอกสารขนาดใหญ่:
+to_char(created_at,'YYYYMM')=:p (สแกนทั้งตาราง) vs created_at >= :a AND created_at < :b (range บน index)
+
+    cd backend && python -m bench.dashboard_ranges --rows 1000000
+
+ใส่เอกสารปลอมกระจาย 3 ปีลง sales_orders ใน transaction ที่ rollback ทิ้ง
+(ต้องรัน make db-migrate ก่อน เพื่อให้มี index created_at)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from app.routers.dashboard import TZ, _month_range
+
+from ._common import Timer, report, rollback_session
+
+OLD = sa.text("SELECT COUNT(*) FROM sales_orders WHERE to_char(created_at,'YYYYMM')=:p")
+NEW = sa.text("SELECT COUNT(*) FROM sales_orders WHERE created_at >= :a AND created_at < :b")
+
+
+async def _seed(db, n: int) -> None:
+    await db.execute(sa.text("""
+        INSERT INTO sales_orders (number, customer, status, created_at)
+        SELECT 'BENCH-DR-' || g, 'bench', 'confirmed',
+               now() - (random() * interval '1095 days')
+        FROM generate_series(1, :n) AS g
+    """), {"n": n})
+    await db.execute(sa.text("ANALYZE sales_orders"))
+
+
+async def _plan(db, stmt, params) -> str:
+    rows = (await db.execute(sa.text(f"EXPLAIN {stmt.text}"), params)).scalars().all()
+    return " / ".join(r.strip() for r in rows[:2])
+
+
+async def run(n: int, repeat: int) -> None:
+    now = datetime.now(TZ)
+    a, b = _month_range(now)
+    p = f"{now.year:04d}{now.month:02d}"
+    async with rollback_session() as db:
+        with Timer() as t:
+            await _seed(db, n)
+        report("seed", t.elapsed, n)
+
+        for label, stmt, params in (("to_char", OLD, {"p": p}), ("range", NEW, {"a": a, "b": b})):
+            cnt = None
+            with Timer() as t:
+                for _ in range(repeat):
+                    cnt = await db.scalar(stmt, params)
+            report(label, t.elapsed / repeat, n, {"count": cnt})
+            print(f"  plan: {await _plan(db, stmt, params)}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    a = ap.parse_args()
+    asyncio.run(run(a.rows, a.repeat))
+
+
+if __name__ == "__main__":
+    main()
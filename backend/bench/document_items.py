@@ -0,0 +1,95 @@
+"""
+เทียบการสร้างเอกสาร (SO) ขนาดใหญ่: ดึงสินค้า + INSERT ทีละบรรทัด
+vs หัว+รายการใน statement เดียว (insert_document)
+
+    cd backend && python -m bench.document_items --lines 300 --repeat 5
+
+ทุกแบบรันใน transaction ที่ rollback ทิ้ง (สินค้า/เอกสารทดสอบไม่ค้างใน DB)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import uuid
+from dataclasses import dataclass
+
+import sqlalchemy as sa
+
+from app.models import Product as ProductModel
+from app.services.documents_service import insert_document, resolve_products
+
+from ._common import Timer, report, rollback_session
+
+PREFIX = "BENCH-DOC-"
+
+
+@dataclass
+class Line:
+    product_id: uuid.UUID
+    qty: float
+    price_ex_vat: float
+
+
+async def _seed(db, n: int) -> list[Line]:
+    ids = [uuid.uuid4() for _ in range(n)]
+    await db.execute(sa.text("""
+        INSERT INTO products (id, sku, name, unit, price_ex_vat)
+        SELECT id, :p || n, 'Bench product ' || n, 'EA', 100
+        FROM unnest(CAST(:ids AS uuid[])) WITH ORDINALITY AS t(id, n)
+    """), {"ids": ids, "p": PREFIX})
+    return [Line(i, 1 + k % 7, 10.5) for k, i in enumerate(ids)]
+
+
+async def _header(db, k: int) -> uuid.UUID:
+    return (await db.execute(sa.text("""
+        INSERT INTO sales_orders (number, customer, status) VALUES (:n, 'bench', 'confirmed')
+        RETURNING id
+    """), {"n": f"{PREFIX}{uuid.uuid4().hex[:12]}-{k}"})).scalar_one()
+
+
+async def _rowwise(db, so_id, lines: list[Line]) -> None:
+    # แบบเดิมใน create_so: get() ทีละสินค้า + INSERT ทีละบรรทัด
+    for it in lines:
+        prod = await db.get(ProductModel, it.product_id)
+        await db.execute(sa.text("""
+            INSERT INTO sales_order_items(so_id,product_id,sku,name,qty,price_ex_vat)
+            VALUES (:so,:pid,:sku,:name,:qty,:price)
+        """), {"so": so_id, "pid": it.product_id, "sku": prod.sku, "name": prod.name,
+               "qty": it.qty, "price": it.price_ex_vat})
+
+
+async def _single(db, k: int, lines: list[Line]) -> None:
+    products = await resolve_products(db, (it.product_id for it in lines))
+    await insert_document(db, "sales_orders", {
+        "number": f"{PREFIX}{uuid.uuid4().hex[:12]}-{k}", "customer": "bench", "status": "confirmed",
+    }, lines, products)
+
+
+async def run(n: int, repeat: int) -> None:
+    print(f"lines={n:,} repeat={repeat}")
+    async with rollback_session() as db:
+        lines = await _seed(db, n)
+        with Timer() as t:
+            for k in range(repeat):
+                await _rowwise(db, await _header(db, k), lines)
+                db.expunge_all()   # ไม่ให้ identity map ของ get() ช่วยรอบถัดไป
+        report("rowwise", t.elapsed, n * repeat)
+
+    async with rollback_session() as db:
+        lines = await _seed(db, n)
+        with Timer() as t:
+            for k in range(repeat):
+                await _single(db, k, lines)
+        report("header+items", t.elapsed, n * repeat)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=5, help="จำนวนเอกสารต่อแบบ")
+    a = ap.parse_args()
+    asyncio.run(run(a.lines, a.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+เทียบ import quote_catalog: วน upsert ทีละแถว vs COPY + merge ชุดเดียว
+
+    cd backend && python -m bench.quote_catalog_import --rows 200000 --existing 0.3
+
+ทั้งสองแบบรันใน transaction ที่ rollback ทิ้ง จึงเริ่มจาก state เดียวกัน
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+
+from app.services.quote_catalog_service import bulk_upsert_catalog, upsert_catalog_rowwise
+
+from ._common import Timer, report, rollback_session
+
+PREFIX = "BENCH-QC-"
+
+
+def make_rows(n: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        out.append({
+            "sku": f"{PREFIX}SKU{i:07d}" if rnd.random() < 0.5 else None,
+            "part_no": f"{PREFIX}{i:07d}",
+            "description": f"Bench item {i}",
+            "cas_no": f"{rnd.randint(50, 9999)}-{rnd.randint(10, 99)}-{rnd.randint(0, 9)}",
+            "package_label": rnd.choice(["100 mL", "500 mL", "1 L", None]),
+            "warn_text": None,
+            "default_price_ex_vat": round(rnd.uniform(10, 5000), 2),
+        })
+    return out
+
+
+async def _seed(db, rows: list[dict], ratio: float) -> None:
+    pre = rows[: int(len(rows) * ratio)]
+    if pre:
+        await bulk_upsert_catalog(db, pre)
+
+
+async def run(n: int, ratio: float, skip_rowwise: bool) -> None:
+    rows = make_rows(n)
+    print(f"rows={n:,} pre-existing={ratio:.0%}")
+
+    if not skip_rowwise:
+        async with rollback_session() as db:
+            await _seed(db, rows, ratio)
+            with Timer() as t:
+                res = await upsert_catalog_rowwise(db, rows)
+            report("rowwise", t.elapsed, n, res)
+
+    async with rollback_session() as db:
+        await _seed(db, rows, ratio)
+        with Timer() as t:
+            res = await bulk_upsert_catalog(db, rows)
+        report("copy+merge", t.elapsed, n, res)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--existing", type=float, default=0.3, help="สัดส่วนแถวที่มีอยู่แล้ว (ทาง update)")
+    ap.add_argument("--skip-rowwise", action="store_true", help="ข้ามแบบทีละแถว (ช้ามากเมื่อ rows ใหญ่)")
+    a = ap.parse_args()
+    asyncio.run(run(a.rows, a.existing, a.skip_rowwise))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel
 import os, uuid, psycopg2
 from psycopg2.extras import RealDictCursor
@@ -19,11 +19,44 @@ class UserUpdate(BaseModel):
     password: str | None = None
     status: str | None = None
 
+# หน้าเดียว + roles ใน query เดียว; keyset: after = id ของแถวสุดท้ายหน้าก่อน (header X-Next-Cursor)
+# limit NULL = ทั้งหมด (ไม่ส่ง limit/after = พฤติกรรมเดิม)
+SQL_LIST_USERS = """
+    WITH page AS (
+      SELECT id, username, status
+        FROM users
+       WHERE (%(q)s::text IS NULL OR username ILIKE %(q)s OR email::text ILIKE %(q)s)
+         AND (%(after)s::uuid IS NULL
+              OR (lower(username), id) > (SELECT lower(username), id FROM users WHERE id = %(after)s::uuid))
+       ORDER BY lower(username), id
+       LIMIT %(limit)s
+    )
+    SELECT p.id, p.username, p.status,
+           COALESCE(array_agg(DISTINCT r.name ORDER BY r.name) FILTER (WHERE r.name IS NOT NULL), '{}') AS roles
+      FROM page p
+      LEFT JOIN user_roles ur ON ur.user_id = p.id
+      LEFT JOIN roles r ON r.id = ur.role_id
+     GROUP BY p.id, p.username, p.status
+     ORDER BY lower(p.username), p.id
+"""
+
 @router.get("/users")
-def list_users():
+def list_users(response: Response, q: str | None = None, limit: int | None = Query(None, ge=1, le=1000),
+               after: uuid.UUID | None = None):
+    q = (q or "").strip()
+    like = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" if q else None
+    if after is not None and limit is None:
+        limit = 200
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT id, username, status FROM users ORDER BY lower(username)")
-        return cur.fetchall()
+        if after is not None:
+            cur.execute("SELECT 1 FROM users WHERE id=%s", (str(after),))
+            if not cur.fetchone():
+                raise HTTPException(400, "Invalid cursor")
+        cur.execute(SQL_LIST_USERS, {"q": like, "after": str(after) if after else None, "limit": limit})
+        rows = cur.fetchall()
+    if limit is not None and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return rows
 
 @router.post("/users")
 def create_user(body: UserCreate):
@@ -0,0 +1,139 @@
+-- FILE: db/migrations/20261019_audit_logs_partitioned.sql
+-- audit_logs แบ่ง partition รายเดือนตาม created_at (เดือนตาม UTC)
+--   audit_logs_pYYYYMM : หนึ่งเดือนต่อ partition → query ช่วงเวลาอ่านเฉพาะเดือนที่เกี่ยว (partition pruning)
+--   audit_logs_default : กันเขียนไม่ได้ถ้ายังไม่มี partition ของเดือนนั้น (ปกติว่าง)
+--   ลบข้อมูลเก่า = DETACH + DROP ทั้ง partition (ไม่มี DELETE ทีละแถว → ไม่ bloat)
+-- backend สร้าง partition ล่วงหน้าและลบเดือนที่หมดอายุเป็นระยะ (services/audit_partitions.py)
+-- ตารางเดิม (ไม่แบ่ง) ถูกย้ายข้อมูลเข้า partition แล้วลบทิ้ง; PK เปลี่ยนเป็น (id, created_at)
+-- Idempotent: safe to re-run
+
+-- ===== 1) ตารางเดิมหลบทาง (ครั้งแรกเท่านั้น) =====
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('audit_logs') AND relkind = 'r') THEN
+    -- sequence ต้องไม่ถูก DROP ไปพร้อมตารางเดิม → id ต่อเนื่อง
+    ALTER SEQUENCE IF EXISTS audit_logs_id_seq OWNED BY NONE;
+    ALTER TABLE audit_logs RENAME TO audit_logs_legacy;
+    ALTER INDEX IF EXISTS audit_logs_pkey RENAME TO audit_logs_legacy_pkey;
+    ALTER INDEX IF EXISTS idx_audit_created RENAME TO idx_audit_legacy_created;
+  END IF;
+END $$;
+
+-- ===== 2) ตาราง partitioned =====
+CREATE SEQUENCE IF NOT EXISTS audit_logs_id_seq;
+
+CREATE TABLE IF NOT EXISTS audit_logs (
+  id          BIGINT      NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+  actor_id    UUID REFERENCES users(id),
+  action      TEXT        NOT NULL,
+  subject_id  UUID,
+  detail      JSONB,
+  ip_addr     INET,
+  created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id;
+
+CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT;
+
+-- index บนตารางแม่ → ทุก partition (รวมที่ attach ภายหลัง) ได้ index เดียวกันอัตโนมัติ
+CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_logs (created_at);
+CREATE INDEX IF NOT EXISTS ix_audit_actor_created ON audit_logs (actor_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS ix_audit_action_created ON audit_logs (action, created_at DESC);
+
+-- ===== 3) partition maintenance =====
+-- สร้าง partition ของเดือนที่มี p_month (ถ้ายังไม่มี) คืนชื่อ partition ที่สร้าง / NULL
+-- แถวของเดือนนั้นที่ตกไปอยู่ default ถูกย้ายเข้ามาก่อน ATTACH (ไม่งั้น ATTACH ล้ม)
+CREATE OR REPLACE FUNCTION audit_logs_ensure_partition(p_month DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+  m    DATE        := date_trunc('month', p_month)::date;
+  lo   TIMESTAMPTZ := m::timestamp AT TIME ZONE 'UTC';
+  hi   TIMESTAMPTZ := (m + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+  part TEXT        := 'audit_logs_p' || to_char(m, 'YYYYMM');
+BEGIN
+  IF to_regclass(part) IS NOT NULL THEN
+    RETURN NULL;
+  END IF;
+  EXECUTE format('CREATE TABLE %I (LIKE audit_logs INCLUDING DEFAULTS)', part);
+  -- CHECK ที่ตรงกับขอบเขต → ATTACH ไม่ต้อง scan ตารางใหม่ซ้ำ
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (created_at >= %L AND created_at < %L)',
+                 part, part || '_bound', lo, hi);
+  EXECUTE format('WITH moved AS (DELETE FROM audit_logs_default WHERE created_at >= $1 AND created_at < $2 RETURNING *)
+                  INSERT INTO %I SELECT * FROM moved', part) USING lo, hi;
+  EXECUTE format('ALTER TABLE audit_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+  EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', part, part || '_bound');
+  RETURN part;
+END $$;
+
+-- เดือนปัจจุบัน + ล่วงหน้า p_ahead เดือน; คืนเฉพาะ partition ที่สร้างใหม่
+CREATE OR REPLACE FUNCTION audit_logs_ensure_partitions(p_ahead INT) RETURNS SETOF TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+  cur  DATE := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+  part TEXT;
+BEGIN
+  FOR i IN 0..GREATEST(p_ahead, 0) LOOP
+    part := audit_logs_ensure_partition((cur + make_interval(months => i))::date);
+    IF part IS NOT NULL THEN
+      RETURN NEXT part;
+    END IF;
+  END LOOP;
+END $$;
+
+-- เก็บเดือนปัจจุบัน + ย้อนหลัง p_keep_months เดือน; ที่เก่ากว่า DETACH + DROP (p_keep_months <= 0 = เก็บตลอด)
+CREATE OR REPLACE FUNCTION audit_logs_drop_expired(p_keep_months INT) RETURNS SETOF TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+  cutoff DATE;
+  r      RECORD;
+BEGIN
+  IF p_keep_months IS NULL OR p_keep_months <= 0 THEN
+    RETURN;
+  END IF;
+  cutoff := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => p_keep_months))::date;
+  FOR r IN
+    SELECT c.relname
+      FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+     WHERE i.inhparent = 'audit_logs'::regclass
+       AND c.relname ~ '^audit_logs_p[0-9]{6}$'
+       AND to_date(substr(c.relname, 13), 'YYYYMM') < cutoff
+     ORDER BY c.relname
+  LOOP
+    EXECUTE format('ALTER TABLE audit_logs DETACH PARTITION %I', r.relname);
+    EXECUTE format('DROP TABLE %I', r.relname);
+    RETURN NEXT r.relname;
+  END LOOP;
+  DELETE FROM audit_logs_default WHERE created_at < cutoff::timestamp AT TIME ZONE 'UTC';
+END $$;
+
+-- ===== 4) ย้ายข้อมูลเดิมเข้า partition (ครั้งแรกเท่านั้น) =====
+DO $$
+DECLARE
+  m DATE;
+BEGIN
+  IF to_regclass('audit_logs_legacy') IS NOT NULL THEN
+    FOR m IN SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date FROM audit_logs_legacy LOOP
+      PERFORM audit_logs_ensure_partition(m);
+    END LOOP;
+    INSERT INTO audit_logs (id, actor_id, action, subject_id, detail, ip_addr, created_at)
+    SELECT id, actor_id, action, subject_id, detail, ip_addr, created_at FROM audit_logs_legacy;
+    PERFORM setval('audit_logs_id_seq', GREATEST((SELECT max(id) FROM audit_logs), 1));
+    DROP TABLE audit_logs_legacy;
+  END IF;
+END $$;
+
+SELECT audit_logs_ensure_partitions(3);
+
+-- ===== 5) สิทธิ์: audit:read (GET /admin/audit), audit:manage (สั่ง maintenance) =====
+INSERT INTO permissions (id, code, name, created_at)
+SELECT gen_random_uuid(), c, c, now()
+  FROM (VALUES ('audit:read'), ('audit:manage')) AS t(c)
+ON CONFLICT (code) DO NOTHING;
+
+INSERT INTO role_permissions (role_id, permission_id)
+SELECT r.id, p.id
+  FROM roles r JOIN permissions p ON p.code IN ('audit:read', 'audit:manage')
+ WHERE r.name IN ('sysop', 'superadmin')
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,10 @@
+-- FILE: db/migrations/20261019_dashboard_created_idx.sql
+-- dashboard นับเอกสาร/สินค้าด้วยช่วงเวลา created_at >= :a AND created_at < :b
+-- sales_orders / purchase_orders มี (created_at DESC, id DESC) จาก 20261019_docs_created_idx.sql แล้ว
+-- Idempotent: safe to re-run
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_quotations_created_id
+  ON quotations (created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_created_at
+  ON products (created_at);
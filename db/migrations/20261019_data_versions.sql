@@ -0,0 +1,28 @@
+-- FILE: db/migrations/20261019_data_versions.sql
+-- ตัวนับเวอร์ชันต่อตาราง: cache ในแอป (เช่น catalog suggest) ใช้ตรวจว่าข้อมูลเปลี่ยนหรือยัง
+-- trigger ระดับ statement → 1 ครั้งต่อคำสั่ง ไม่ใช่ต่อแถว (import ขนาดใหญ่ก็ bump ครั้งเดียว)
+-- Idempotent: safe to re-run
+
+CREATE TABLE IF NOT EXISTS data_versions (
+  table_name TEXT PRIMARY KEY,
+  version    BIGINT NOT NULL DEFAULT 0,
+  changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO data_versions (table_name, version, changed_at)
+  VALUES (TG_TABLE_NAME, 1, now())
+  ON CONFLICT (table_name) DO UPDATE
+  SET version = data_versions.version + 1, changed_at = now();
+  RETURN NULL;
+END $$;
+
+-- quote_catalog: เขียนไม่บ่อย (admin/import) จึงไม่ติดปัญหา lock แถวเดียวกันระหว่าง writer
+DROP TRIGGER IF EXISTS trg_quote_catalog_version ON quote_catalog;
+CREATE TRIGGER trg_quote_catalog_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON quote_catalog
+FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+
+INSERT INTO data_versions (table_name) VALUES ('quote_catalog') ON CONFLICT DO NOTHING;
@@ -0,0 +1,84 @@
+-- FILE: db/migrations/20261019_doc_daily_counts.sql
+-- rollup จำนวนเอกสารรายวัน (วันตามเวลาไทย) ต่อประเภท/ทีม สำหรับ /dashboard/timeseries
+--   doc_daily_deltas : trigger ระดับ statement เขียนต่อท้ายเท่านั้น (ไม่แย่ง lock แถวเดียวกันระหว่าง transaction)
+--   doc_daily_counts : ยอดสะสม — backend พับ deltas เข้ามาเป็นระยะ (services/doc_rollup.py)
+-- ผู้อ่านรวมทั้งสองตาราง จึงได้ค่าปัจจุบันเสมอแม้ยังไม่ได้พับ
+-- Idempotent: safe to re-run (rebuild rollup จากเอกสารจริงทุกครั้ง)
+
+CREATE TABLE IF NOT EXISTS doc_daily_counts (
+  day       DATE   NOT NULL,
+  doc_type  TEXT   NOT NULL CHECK (doc_type IN ('Q','PO','SO')),
+  team_code TEXT   NOT NULL DEFAULT '',
+  count     BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, doc_type, team_code)
+);
+
+CREATE TABLE IF NOT EXISTS doc_daily_deltas (
+  id        BIGSERIAL PRIMARY KEY,
+  day       DATE   NOT NULL,
+  doc_type  TEXT   NOT NULL,
+  team_code TEXT   NOT NULL DEFAULT '',
+  n         BIGINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_doc_daily_deltas_day ON doc_daily_deltas (day);
+
+-- ทีมจากเลขเอกสาร: <PREFIX><TEAM A-Z><YY><MM><SEQ>
+CREATE OR REPLACE FUNCTION doc_team_code(p_prefix TEXT, p_number TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT COALESCE(substring(p_number FROM '^' || p_prefix || '([A-Z]+)[0-9]'), '')
+$$;
+
+CREATE OR REPLACE FUNCTION doc_daily_track() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_type   TEXT := TG_ARGV[0];
+  v_prefix TEXT := TG_ARGV[1];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO doc_daily_deltas (day, doc_type, team_code, n)
+    SELECT (created_at AT TIME ZONE 'Asia/Bangkok')::date, v_type, doc_team_code(v_prefix, number), count(*)
+    FROM new_rows GROUP BY 1, 3;
+  ELSE
+    INSERT INTO doc_daily_deltas (day, doc_type, team_code, n)
+    SELECT (created_at AT TIME ZONE 'Asia/Bangkok')::date, v_type, doc_team_code(v_prefix, number), -count(*)
+    FROM old_rows GROUP BY 1, 3;
+  END IF;
+  RETURN NULL;
+END $$;
+
+BEGIN;
+-- กันเอกสารใหม่ระหว่างติดตั้ง trigger + rebuild (อ่านได้ตามปกติ)
+LOCK TABLE quotations, purchase_orders, sales_orders IN SHARE MODE;
+
+DROP TRIGGER IF EXISTS trg_quotations_daily_ins ON quotations;
+DROP TRIGGER IF EXISTS trg_quotations_daily_del ON quotations;
+CREATE TRIGGER trg_quotations_daily_ins AFTER INSERT ON quotations
+  REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION doc_daily_track('Q', 'Q');
+CREATE TRIGGER trg_quotations_daily_del AFTER DELETE ON quotations
+  REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION doc_daily_track('Q', 'Q');
+
+DROP TRIGGER IF EXISTS trg_purchase_orders_daily_ins ON purchase_orders;
+DROP TRIGGER IF EXISTS trg_purchase_orders_daily_del ON purchase_orders;
+CREATE TRIGGER trg_purchase_orders_daily_ins AFTER INSERT ON purchase_orders
+  REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION doc_daily_track('PO', 'PO');
+CREATE TRIGGER trg_purchase_orders_daily_del AFTER DELETE ON purchase_orders
+  REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION doc_daily_track('PO', 'PO');
+
+DROP TRIGGER IF EXISTS trg_sales_orders_daily_ins ON sales_orders;
+DROP TRIGGER IF EXISTS trg_sales_orders_daily_del ON sales_orders;
+CREATE TRIGGER trg_sales_orders_daily_ins AFTER INSERT ON sales_orders
+  REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION doc_daily_track('SO', 'SO');
+CREATE TRIGGER trg_sales_orders_daily_del AFTER DELETE ON sales_orders
+  REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION doc_daily_track('SO', 'SO');
+
+TRUNCATE doc_daily_counts, doc_daily_deltas;
+INSERT INTO doc_daily_counts (day, doc_type, team_code, count)
+SELECT day, doc_type, team_code, count(*) FROM (
+  SELECT (created_at AT TIME ZONE 'Asia/Bangkok')::date AS day, 'Q'  AS doc_type, doc_team_code('Q',  number) AS team_code FROM quotations
+  UNION ALL
+  SELECT (created_at AT TIME ZONE 'Asia/Bangkok')::date, 'PO', doc_team_code('PO', number) FROM purchase_orders
+  UNION ALL
+  SELECT (created_at AT TIME ZONE 'Asia/Bangkok')::date, 'SO', doc_team_code('SO', number) FROM sales_orders
+) d
+GROUP BY 1, 2, 3;
+COMMIT;
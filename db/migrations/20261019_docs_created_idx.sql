@@ -0,0 +1,11 @@
+-- FILE: db/migrations/20261019_docs_created_idx.sql
+-- list SO/PO เรียง created_at DESC, id DESC (ทั้ง OFFSET และ keyset cursor)
+-- → index composite ให้อ่านตามลำดับได้เลย ไม่ต้อง sort ทั้งตาราง
+-- CONCURRENTLY: ไม่ล็อกการเขียนระหว่างสร้าง (make db-migrate ส่งผ่าน psql แบบ autocommit)
+-- Idempotent: safe to re-run
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sales_orders_created_id
+  ON sales_orders (created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_purchase_orders_created_id
+  ON purchase_orders (created_at DESC, id DESC);
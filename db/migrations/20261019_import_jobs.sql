@@ -0,0 +1,46 @@
+-- FILE: db/migrations/20261019_import_jobs.sql
+-- background import jobs: ใช้ inv_import_jobs (svsops_schema.sql) เป็นคิว/สถานะ + progress
+-- Idempotent: safe to re-run
+
+CREATE TABLE IF NOT EXISTS inv_import_jobs (
+  id BIGSERIAL PRIMARY KEY,
+  job_type TEXT NOT NULL,
+  file_name TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'PENDING',
+  error_text TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  created_by BIGINT
+);
+
+-- ผู้ใช้ในระบบเป็น uuid → created_by (bigint) ไม่บังคับอีกต่อไป ใช้ requested_by แทน
+ALTER TABLE inv_import_jobs ALTER COLUMN created_by DROP NOT NULL;
+
+ALTER TABLE inv_import_jobs
+  ADD COLUMN IF NOT EXISTS requested_by   UUID REFERENCES users(id) ON DELETE SET NULL,
+  ADD COLUMN IF NOT EXISTS mode           TEXT NOT NULL DEFAULT 'upsert',
+  ADD COLUMN IF NOT EXISTS content        BYTEA,         -- ไฟล์ต้นฉบับ (ล้างทิ้งเมื่อจบงาน)
+  ADD COLUMN IF NOT EXISTS total_rows     INT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS processed_rows INT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS inserted_rows  INT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS updated_rows   INT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS skipped_rows   INT NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS started_at     TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS finished_at    TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS heartbeat_at   TIMESTAMPTZ,   -- worker ที่ถืองานอยู่ต่ออายุเป็นระยะ
+  ADD COLUMN IF NOT EXISTS attempts       INT NOT NULL DEFAULT 0;
+
+ALTER TABLE inv_import_jobs DROP CONSTRAINT IF EXISTS inv_import_jobs_job_type_check;
+ALTER TABLE inv_import_jobs ADD CONSTRAINT inv_import_jobs_job_type_check
+  CHECK (job_type IN ('OPENING_BALANCE','RECEIVE','ADJUST','MASTER_ITEM','QUOTE_CATALOG','PRODUCTS'));
+
+-- PENDING → VALIDATING (parse) → APPLYING (เขียนลง DB) → APPLIED | FAILED
+ALTER TABLE inv_import_jobs DROP CONSTRAINT IF EXISTS inv_import_jobs_status_check;
+ALTER TABLE inv_import_jobs ADD CONSTRAINT inv_import_jobs_status_check
+  CHECK (status IN ('PENDING','VALIDATING','APPLYING','FAILED','APPLIED'));
+
+CREATE INDEX IF NOT EXISTS idx_inv_import_jobs_pending
+  ON inv_import_jobs (id) WHERE status = 'PENDING';
+
+-- งานที่กำลังทำ (หา worker ที่ตายจาก heartbeat ที่หยุดต่ออายุ)
+CREATE INDEX IF NOT EXISTS idx_inv_import_jobs_running
+  ON inv_import_jobs (heartbeat_at) WHERE status IN ('VALIDATING','APPLYING');
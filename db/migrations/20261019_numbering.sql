@@ -0,0 +1,22 @@
+-- FILE: db/migrations/20261019_numbering.sql
+-- next_so_number (svsops_schema.sql): เลิกใช้ pg_advisory_xact_lock ที่ serialize ทุกคำขอใน scope เดียวกัน
+-- เลข SO/PO ฝั่งแอปย้ายไปที่ backend/app/services/numbering.py (increment ใน transaction แยกที่ commit ทันที)
+-- Idempotent: safe to re-run
+
+-- UPSERT เดียว (row lock ของตัวนับ) แทน advisory lock + INSERT/UPDATE แยกกัน
+-- lock อยู่จนจบ transaction ของผู้เรียก → ควรเรียกใน transaction สั้น ๆ ของตัวเอง
+-- ไม่ใช่กลาง transaction ที่สร้างเอกสาร
+CREATE OR REPLACE FUNCTION next_so_number(p_scope TEXT, p_prefix TEXT, p_y INT, p_m INT, p_width INT DEFAULT 5)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE v_seq INT;
+BEGIN
+  INSERT INTO so_number_counters(scope,y,m,prefix,last_seq)
+  VALUES(p_scope,p_y,p_m,p_prefix,1)
+  ON CONFLICT (scope,y,m,prefix) DO UPDATE
+     SET last_seq = so_number_counters.last_seq + 1
+  RETURNING last_seq INTO v_seq;
+
+  RETURN p_prefix || '-' || p_scope || '-' || to_char(make_date(p_y, p_m, 1), 'YYMM') || '-' || lpad(v_seq::text, p_width, '0');
+END $$;
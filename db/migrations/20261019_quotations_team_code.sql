@@ -0,0 +1,29 @@
+-- FILE: db/migrations/20261019_quotations_team_code.sql
+-- ทีมของใบเสนอราคาเก็บเป็นคอลัมน์ (เดิม list กรองด้วย substring(number from 2 for 3) → ใช้ index ไม่ได้
+-- และผิดเมื่อรหัสทีมไม่ใช่ 3 ตัว; TEAM_RE อนุญาต A-Z 2–12)
+--   backend ส่ง team_code มาพร้อม number จาก next_quote_number; trigger เติมจากเลขเอกสารให้ writer อื่น
+--   index (team_code, created_at DESC, id DESC) → list ต่อทีมเป็น range scan ตามลำดับที่แสดง
+-- CONCURRENTLY: ไม่ล็อกการเขียนระหว่างสร้าง (make db-migrate ส่งผ่าน psql แบบ autocommit)
+-- Idempotent: safe to re-run
+
+ALTER TABLE quotations ADD COLUMN IF NOT EXISTS team_code TEXT;
+
+-- เลขใบเสนอราคา: Q<TEAM A-Z><YY><MM><SEQ>
+CREATE OR REPLACE FUNCTION quotations_fill_team_code() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF NEW.team_code IS NULL OR TG_OP = 'UPDATE' THEN
+    NEW.team_code := COALESCE(substring(NEW.number FROM '^Q([A-Z]+)[0-9]'), NEW.team_code);
+  END IF;
+  RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_quotations_team_code ON quotations;
+CREATE TRIGGER trg_quotations_team_code BEFORE INSERT OR UPDATE OF number ON quotations
+  FOR EACH ROW EXECUTE FUNCTION quotations_fill_team_code();
+
+UPDATE quotations SET team_code = substring(number FROM '^Q([A-Z]+)[0-9]')
+ WHERE team_code IS NULL AND number ~ '^Q[A-Z]+[0-9]';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_quotations_team_created
+  ON quotations (team_code, created_at DESC, id DESC);
@@ -0,0 +1,14 @@
+-- FILE: db/migrations/20261019_sessions_gc_idx.sql
+-- index สำหรับ session GC (backend/app/services/session_gc.py)
+--   ix_sessions_gc   : session ที่จบแล้ว เรียงตามเวลาจบ → หา batch ที่เกิน retention ได้ทันที
+--   ix_sessions_idle : session ที่ยังเปิดอยู่ เรียงตาม last_seen_at → หา idle ได้ทันที (partial = เล็ก)
+-- CONCURRENTLY: ไม่ล็อกการเขียนระหว่างสร้าง (make db-migrate ส่งผ่าน psql แบบ autocommit)
+-- Idempotent: safe to re-run
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sessions_gc
+  ON sessions ((COALESCE(ended_at, created_at)))
+  WHERE revoked = TRUE OR ended_at IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sessions_idle
+  ON sessions (last_seen_at)
+  WHERE ended_at IS NULL AND revoked = FALSE;
@@ -0,0 +1,104 @@
+-- FILE: db/migrations/20261019_stock_kpis.sql
+-- KPI สต็อกที่อัปเดตทีละแถวตาม stock_levels สำหรับ /dashboard/stock (ไม่ต้อง aggregate ทั้งตาราง)
+--   stock_item_kpis  : ยอดรวมต่อ item (ทุกคลัง) + available; out-of-stock = partial index (available <= 0)
+--   stock_kpi_deltas : trigger เขียนต่อท้ายเท่านั้น (ไม่มีแถวรวมที่ทุก transaction ต้องแย่ง lock)
+--   stock_kpi_rollup : ยอดรวมทั้งระบบแถวเดียว — backend พับ deltas เข้ามาเป็นระยะ (services/stock_rollup.py)
+--   ผู้อ่าน = rollup + deltas ที่ยังไม่พับ จึงได้ค่าปัจจุบันเสมอ (อ่านแค่ deltas ตั้งแต่รอบพับล่าสุด)
+--   item ที่ไม่เหลือแถวใน stock_levels ถูกลบออกจาก KPI (เหมือน aggregate ตรงจาก stock_levels)
+-- trigger อยู่บน stock_levels เอง จึงครอบคลุมทุกทาง (upsert_stock_level, reserve/release SO, recompute_*)
+-- Idempotent: safe to re-run (rebuild KPI จาก stock_levels ทุกครั้ง)
+
+CREATE TABLE IF NOT EXISTS stock_item_kpis (
+  item_id   UUID PRIMARY KEY,
+  on_hand   NUMERIC(18,4) NOT NULL DEFAULT 0,
+  reserved  NUMERIC(18,4) NOT NULL DEFAULT 0,
+  available NUMERIC(18,4) GENERATED ALWAYS AS (on_hand - reserved) STORED
+);
+CREATE INDEX IF NOT EXISTS ix_stock_item_kpis_on_hand ON stock_item_kpis (on_hand DESC);
+CREATE INDEX IF NOT EXISTS ix_stock_item_kpis_oos ON stock_item_kpis (available, item_id) WHERE available <= 0;
+
+-- เวอร์ชันก่อนหน้าของ migration นี้เก็บยอดรวมแบ่ง slot (แย่ง lock ข้าม item ได้) → เลิกใช้
+DROP TABLE IF EXISTS stock_kpi_totals;
+DROP FUNCTION IF EXISTS stock_kpi_slot(UUID);
+
+CREATE TABLE IF NOT EXISTS stock_kpi_rollup (
+  id       BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  on_hand  NUMERIC(20,4) NOT NULL DEFAULT 0,
+  reserved NUMERIC(20,4) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stock_kpi_deltas (
+  id       BIGSERIAL PRIMARY KEY,
+  on_hand  NUMERIC(20,4) NOT NULL,
+  reserved NUMERIC(20,4) NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION stock_kpi_apply(p_item UUID, p_on NUMERIC, p_res NUMERIC) RETURNS VOID
+LANGUAGE sql AS $$
+  INSERT INTO stock_item_kpis AS k (item_id, on_hand, reserved) VALUES (p_item, p_on, p_res)
+  ON CONFLICT (item_id) DO UPDATE SET on_hand = k.on_hand + EXCLUDED.on_hand, reserved = k.reserved + EXCLUDED.reserved;
+$$;
+
+-- item ไม่เหลือแถวใน stock_levels แล้ว → ไม่ต้องมีใน KPI (ไม่โผล่เป็น out-of-stock)
+CREATE OR REPLACE FUNCTION stock_kpi_prune(p_item UUID) RETURNS VOID
+LANGUAGE sql AS $$
+  DELETE FROM stock_item_kpis
+   WHERE item_id = p_item AND NOT EXISTS (SELECT 1 FROM stock_levels WHERE item_id = p_item);
+$$;
+
+CREATE OR REPLACE FUNCTION stock_kpi_track() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_item UUID;
+  d_on   NUMERIC := 0;
+  d_res  NUMERIC := 0;
+  t_on   NUMERIC;
+  t_res  NUMERIC;
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    v_item := OLD.item_id;
+    d_on := d_on - OLD.on_hand;
+    d_res := d_res - OLD.reserved;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    -- UPDATE ที่เปลี่ยน item_id: ถอนจาก item เดิมก่อน แล้วบวกเข้า item ใหม่
+    IF TG_OP = 'UPDATE' AND NEW.item_id IS DISTINCT FROM OLD.item_id THEN
+      PERFORM stock_kpi_apply(OLD.item_id, -OLD.on_hand, -OLD.reserved);
+      PERFORM stock_kpi_prune(OLD.item_id);
+      d_on := 0;
+      d_res := 0;
+    END IF;
+    v_item := NEW.item_id;
+    d_on := d_on + NEW.on_hand;
+    d_res := d_res + NEW.reserved;
+  END IF;
+  -- ยอดรวมทั้งระบบ: ย้าย item ไม่เปลี่ยนยอดรวม เหลือแค่ผลต่างของแถวนี้
+  t_on := CASE WHEN TG_OP = 'DELETE' THEN 0 ELSE NEW.on_hand END - CASE WHEN TG_OP = 'INSERT' THEN 0 ELSE OLD.on_hand END;
+  t_res := CASE WHEN TG_OP = 'DELETE' THEN 0 ELSE NEW.reserved END - CASE WHEN TG_OP = 'INSERT' THEN 0 ELSE OLD.reserved END;
+  IF t_on <> 0 OR t_res <> 0 THEN
+    INSERT INTO stock_kpi_deltas (on_hand, reserved) VALUES (t_on, t_res);
+  END IF;
+  IF d_on <> 0 OR d_res <> 0 THEN
+    PERFORM stock_kpi_apply(v_item, d_on, d_res);
+  END IF;
+  IF TG_OP = 'DELETE' THEN
+    PERFORM stock_kpi_prune(OLD.item_id);
+  END IF;
+  RETURN NULL;
+END $$;
+
+BEGIN;
+-- กันการเขียน stock_levels ระหว่างติดตั้ง trigger + rebuild (อ่านได้ตามปกติ)
+LOCK TABLE stock_levels IN SHARE MODE;
+
+DROP TRIGGER IF EXISTS trg_stock_levels_kpi ON stock_levels;
+CREATE TRIGGER trg_stock_levels_kpi AFTER INSERT OR UPDATE OF item_id, on_hand, reserved OR DELETE ON stock_levels
+  FOR EACH ROW EXECUTE FUNCTION stock_kpi_track();
+
+TRUNCATE stock_item_kpis, stock_kpi_deltas;
+INSERT INTO stock_item_kpis (item_id, on_hand, reserved)
+SELECT item_id, sum(on_hand), sum(reserved) FROM stock_levels GROUP BY item_id;
+INSERT INTO stock_kpi_rollup AS r (id, on_hand, reserved)
+SELECT TRUE, COALESCE(sum(on_hand), 0), COALESCE(sum(reserved), 0) FROM stock_item_kpis
+ON CONFLICT (id) DO UPDATE SET on_hand = EXCLUDED.on_hand, reserved = EXCLUDED.reserved;
+COMMIT;
@@ -0,0 +1,64 @@
+-- FILE: db/migrations/20261019_stock_low_alerts.sql
+-- แจ้งเตือน LOW_STOCK แบบ event-driven: trigger บน stock_levels ตรวจเฉพาะ rule ของ (item, wh) ที่เปลี่ยน
+-- แล้วเข้าคิว notif_queue; ส่งออกโดย dispatcher ใน backend (services/notif_dispatcher.py)
+--   notif_rules.item_id/wh_id เดิมเป็น BIGINT (inv_*) แต่ stock_levels ใช้ UUID → เพิ่ม stock_item_id/stock_wh_id
+--   stock_wh_id NULL = ยอดรวมทุกคลังของ item (อ่านจาก stock_item_kpis — ต้องรัน 20261019_stock_kpis.sql ก่อน)
+--   firing = สถานะล่าสุด → เข้าคิวเฉพาะตอนข้ามเกณฑ์ลง (ไม่ส่งซ้ำทุก move จนกว่าจะกลับขึ้นเหนือเกณฑ์)
+-- Idempotent: safe to re-run
+
+ALTER TABLE notif_rules ADD COLUMN IF NOT EXISTS stock_item_id UUID;
+ALTER TABLE notif_rules ADD COLUMN IF NOT EXISTS stock_wh_id UUID;
+ALTER TABLE notif_rules ADD COLUMN IF NOT EXISTS firing BOOLEAN NOT NULL DEFAULT FALSE;
+-- ผู้ใช้ระบบใหม่เป็น UUID (users.id) — เก็บแยก ไม่บังคับ created_by BIGINT แบบเดิม
+ALTER TABLE notif_rules ADD COLUMN IF NOT EXISTS owner_id UUID;
+ALTER TABLE notif_rules ALTER COLUMN created_by DROP NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_notif_rules_low_stock ON notif_rules (stock_item_id)
+  WHERE rule_type = 'LOW_STOCK' AND is_active;
+
+ALTER TABLE notif_queue ADD COLUMN IF NOT EXISTS attempts INT NOT NULL DEFAULT 0;
+ALTER TABLE notif_queue ADD COLUMN IF NOT EXISTS last_error TEXT;
+-- PENDING: ส่งได้เมื่อถึง next_attempt_at (retry แบบ backoff)
+-- SENDING: dispatcher หยิบไปแล้ว (commit ก่อนส่ง ไม่ถือ lock ระหว่างรอ webhook);
+--          next_attempt_at = หมดเวลาเช่า → process ตายกลางทาง worker อื่นหยิบต่อได้
+ALTER TABLE notif_queue ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now();
+ALTER TABLE notif_queue DROP CONSTRAINT IF EXISTS notif_queue_status_check;
+ALTER TABLE notif_queue ADD CONSTRAINT notif_queue_status_check
+  CHECK (status IN ('PENDING','SENDING','SENT','FAILED'));
+DROP INDEX IF EXISTS ix_notif_queue_pending;
+CREATE INDEX IF NOT EXISTS ix_notif_queue_due ON notif_queue (next_attempt_at, id)
+  WHERE status IN ('PENDING', 'SENDING');
+
+CREATE OR REPLACE FUNCTION notif_low_stock_eval() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  WITH chk AS (
+    SELECT r.id, r.threshold, r.stock_wh_id,
+           CASE WHEN r.stock_wh_id IS NULL
+                THEN (SELECT k.available FROM stock_item_kpis k WHERE k.item_id = NEW.item_id)
+                ELSE NEW.on_hand - NEW.reserved END AS available
+      FROM notif_rules r
+     WHERE r.rule_type = 'LOW_STOCK' AND r.is_active
+       AND r.stock_item_id = NEW.item_id
+       AND (r.stock_wh_id IS NULL OR r.stock_wh_id = NEW.wh_id)
+  ),
+  flip AS (
+    UPDATE notif_rules r SET firing = (c.available <= c.threshold)
+      FROM chk c
+     WHERE r.id = c.id AND r.firing IS DISTINCT FROM (c.available <= c.threshold)
+    RETURNING r.id, r.firing, c.available, c.threshold, c.stock_wh_id
+  )
+  INSERT INTO notif_queue (rule_id, title, payload)
+  SELECT f.id,
+         'LOW_STOCK ' || i.sku,
+         jsonb_build_object('rule_id', f.id, 'item_id', NEW.item_id, 'sku', i.sku, 'name', i.item_name,
+                            'wh_id', f.stock_wh_id, 'available', f.available, 'threshold', f.threshold,
+                            'at', now())
+    FROM flip f JOIN items i ON i.item_id = NEW.item_id
+   WHERE f.firing;
+  RETURN NULL;
+END $$;
+
+-- ชื่อ trigger เรียงหลัง trg_stock_levels_kpi → stock_item_kpis อัปเดตแล้วเมื่อ rule ระดับ item ถูกตรวจ
+DROP TRIGGER IF EXISTS trg_stock_levels_low_stock ON stock_levels;
+CREATE TRIGGER trg_stock_levels_low_stock AFTER INSERT OR UPDATE OF on_hand, reserved ON stock_levels
+  FOR EACH ROW EXECUTE FUNCTION notif_low_stock_eval();
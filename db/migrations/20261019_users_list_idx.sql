@@ -0,0 +1,8 @@
+-- FILE: db/migrations/20261019_users_list_idx.sql
+-- GET /admin/users เรียง lower(username), id และแบ่งหน้าแบบ keyset
+-- → index ตามลำดับเดียวกัน อ่านหน้าถัดไปเป็น range scan ไม่ต้อง sort ทั้งตาราง
+-- CONCURRENTLY: ไม่ล็อกการเขียนระหว่างสร้าง (make db-migrate ส่งผ่าน psql แบบ autocommit)
+-- Idempotent: safe to re-run
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_lower_username_id
+  ON users (lower(username), id);
@@ -12,9 +12,38 @@ function resolveApiBase() {
 }
 const API = resolveApiBase();
 
+// รวม log เป็นชุดแล้วส่งครั้งเดียว (server สุ่มเก็บ/จำกัดอัตราเองที่ /debug/logs:batch)
+const FLUSH_MS = 1000;
+const FLUSH_MAX = 200;
+let pending: DebugEntry[] = [];
+let timer: ReturnType<typeof setTimeout> | null = null;
+
+async function gzipBody(text: string): Promise<Blob | null> {
+  const CS = (globalThis as any).CompressionStream;
+  if (!CS || text.length < 2048) return null;
+  try { return await new Response(new Blob([text]).stream().pipeThrough(new CS('gzip'))).blob(); } catch { return null; }
+}
+
+export async function flushLogs() {
+  if (timer) { clearTimeout(timer); timer = null; }
+  if (!pending.length) return;
+  const batch = pending; pending = [];
+  const text = JSON.stringify(batch);
+  const gz = await gzipBody(text);
+  const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+  if (gz) headers['Content-Encoding'] = 'gzip';
+  await fetch(`${API}/debug/logs:batch`, { method: 'POST', headers, body: gz ?? text, keepalive: !gz && text.length < 60000 }).catch(()=>{});
+}
+
 export async function sendLog(e: DebugEntry) {
   const body = { ts: e.ts ?? Date.now()/1000, level: e.level ?? 'info', source: e.source ?? 'fe', message: e.message, data: e.data, context: e.context };
-  await fetch(`${API}/debug/log`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body) }).catch(()=>{});
+  pending.push(body);
+  if (pending.length >= FLUSH_MAX) { await flushLogs(); return; }
+  if (!timer) timer = setTimeout(() => { void flushLogs(); }, FLUSH_MS);
+}
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', () => { void flushLogs(); });
 }
 
 export async function fetchLogs(limit=200): Promise<DebugEntry[]> {
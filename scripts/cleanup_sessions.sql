@@ -1,5 +1,5 @@
 -- ลบ session ที่ปิดแล้ว หรือ revoked แล้ว เกิน 30 วัน
+-- (backend ทำเองเป็นระยะแบบทีละ batch: services/session_gc.py — ไฟล์นี้ไว้ใช้ด้วยมือเท่านั้น)
 DELETE FROM sessions
 WHERE (revoked = TRUE OR ended_at IS NOT NULL)
   AND created_at < now() - interval '30 days';
-
@@ -111,24 +111,22 @@ CREATE TABLE IF NOT EXISTS so_number_counters (
   PRIMARY KEY (scope, y, m, prefix)
 );
 
+-- UPSERT เดียว (row lock ของตัวนับ) แทน advisory lock + INSERT/UPDATE แยกกัน
+-- lock อยู่จนจบ transaction ของผู้เรียก → ควรเรียกใน transaction สั้น ๆ ของตัวเอง
+-- ไม่ใช่กลาง transaction ที่สร้างเอกสาร
 CREATE OR REPLACE FUNCTION next_so_number(p_scope TEXT, p_prefix TEXT, p_y INT, p_m INT, p_width INT DEFAULT 5)
 RETURNS TEXT
 LANGUAGE plpgsql
 AS $$
-DECLARE v_seq INT; v_fmt TEXT;
+DECLARE v_seq INT;
 BEGIN
-  PERFORM pg_advisory_xact_lock(hashtext(CONCAT('SO:', p_scope, ':', p_prefix, ':', p_y, ':', p_m)));
   INSERT INTO so_number_counters(scope,y,m,prefix,last_seq)
-  VALUES(p_scope,p_y,p_m,p_prefix,0)
-  ON CONFLICT (scope,y,m,prefix) DO NOTHING;
+  VALUES(p_scope,p_y,p_m,p_prefix,1)
+  ON CONFLICT (scope,y,m,prefix) DO UPDATE
+     SET last_seq = so_number_counters.last_seq + 1
+  RETURNING last_seq INTO v_seq;
 
-  UPDATE so_number_counters
-     SET last_seq = last_seq + 1
-   WHERE scope = p_scope AND y = p_y AND m = p_m AND prefix = p_prefix
-   RETURNING last_seq INTO v_seq;
-
-  v_fmt := p_prefix || '-' || p_scope || '-' || to_char(make_date(p_y, p_m, 1), 'YYMM') || '-' || lpad(v_seq::text, p_width, '0');
-  RETURN v_fmt;
+  RETURN p_prefix || '-' || p_scope || '-' || to_char(make_date(p_y, p_m, 1), 'YYMM') || '-' || lpad(v_seq::text, p_width, '0');
 END $$;
 
 -- =============== NOTIFICATIONS ===============